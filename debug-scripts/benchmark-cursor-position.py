@@ -0,0 +1,72 @@
+"""Measure how many times per second the cursor position can be read.
+
+The original method of creating a new `pynput` controller for every
+call is compared against the persistent backend used by
+`get_cursor_pos`.
+
+On Linux, the speed is also measured while the display can't be
+reached, such as when the X server restarts, as the cursor is still
+polled every tick.
+
+Run from the repository root:
+    python debug-scripts/benchmark-cursor-position.py
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.utils.input import get_cursor_pos
+from mousetracks2.utils.system import CursorPosition
+
+
+DURATION = 2.0
+
+UNAVAILABLE_DISPLAY = ':999'
+"""Display that does not exist, to measure a lost connection."""
+
+
+def get_cursor_pos_pynput() -> tuple[int, int] | None:
+    """Get the cursor position with a new controller each call."""
+    # Import here as pynput requires a display when imported
+    import pynput  # pylint: disable=import-outside-toplevel
+    pos = pynput.mouse.Controller().position
+    if pos is None:
+        return None
+    return int(pos[0]), int(pos[1])
+
+
+def calls_per_second(func: Callable[[], tuple[int, int] | None]) -> float:
+    """Call a function repeatedly for a fixed duration."""
+    calls = 0
+    start = time.perf_counter()
+    end = start + DURATION
+    while time.perf_counter() < end:
+        func()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def main() -> None:
+    position = get_cursor_pos()
+    print(f'Current cursor position: {position}')
+    if position is None:
+        print('No cursor found, skipping the comparison')
+    else:
+        before = calls_per_second(get_cursor_pos_pynput)
+        after = calls_per_second(get_cursor_pos)
+        print(f'New controller per call: {before:>9.0f} calls per second')
+        print(f' Persistent backend: {after:>14.0f} calls per second ({after / before:.1f}x)')
+
+    if sys.platform == 'linux':
+        os.environ['DISPLAY'] = UNAVAILABLE_DISPLAY
+        lost = calls_per_second(CursorPosition().get)
+        print(f'Display unavailable: {lost:>14.0f} calls per second')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Compare the binary message encoding against pickle.
+
+This measures the encode and decode speed of each message type, the
+number of bytes sent per second at the normal tick rate, and the
+maximum throughput of a queue between two processes.
+
+Run from the repository root:
+    python debug-scripts/benchmark-ipc-codec.py
+"""
+
+import multiprocessing
+import multiprocessing.queues
+import pickle
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.components import codec, ipc
+from mousetracks2.constants import UPDATES_PER_SECOND
+
+
+QUEUE_MESSAGES = 100000
+
+
+def tick_batch() -> ipc.TickBatch:
+    """Create a batch for a typical tick with mouse and keyboard use."""
+    batch = ipc.TickBatch(123456, int(time.time()))
+    batch.add(ipc.MouseMove((1234, 567)))
+    batch.add(ipc.MouseHeld(1, (1234, 567)))
+    batch.add(ipc.KeyPress(1))
+    batch.add(ipc.KeyHeld(65))
+    batch.add(ipc.Active('Default', 1))
+    return batch
+
+
+MESSAGES: list[ipc.Message] = [
+    ipc.Tick(123456, int(time.time())),
+    ipc.MouseMove((1234, 567)),
+    ipc.MouseClick(1, (1234, 567)),
+    ipc.KeyPress(65),
+    ipc.KeyHeld(65),
+    ipc.ButtonPress(0, 4096),
+    ipc.ThumbstickMove(0, ipc.ThumbstickMove.Thumbstick.Left, (0.25, -0.5)),
+    ipc.DataTransfer('00:11:22:33:44:55', 123456, 654321),
+    tick_batch(),
+]
+
+
+def consumer(q: multiprocessing.queues.Queue, use_codec: bool) -> None:
+    """Read from the queue until `None` is received."""
+    while (data := q.get()) is not None:
+        if use_codec:
+            codec.decode(data)
+
+
+def queue_throughput(message: ipc.Message, use_codec: bool) -> float:
+    """Get the number of messages per second through a queue.
+    The same queue class is used either way, so the only difference is
+    whether the message is pickled, or encoded before being sent.
+    """
+    q: multiprocessing.queues.Queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=consumer, args=(q, use_codec))
+    process.start()
+    start = time.perf_counter()
+    for _ in range(QUEUE_MESSAGES):
+        q.put(codec.encode(message) if use_codec else message)
+    q.put(None)
+    process.join()
+    return QUEUE_MESSAGES / (time.perf_counter() - start)
+
+
+def main() -> None:
+    print(f'{"Message":>15} | {"Pickle bytes":>12} | {"Codec bytes":>11} | '
+          f'{"Pickle round trip":>17} | {"Codec round trip":>16}')
+    for message in MESSAGES:
+        pickled = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        encoded = codec.encode(message)
+        assert encoded is not None and codec.decode(encoded) == message
+
+        number = 20000
+        pickle_time = timeit.timeit(lambda: pickle.loads(pickle.dumps(message, pickle.HIGHEST_PROTOCOL)),
+                                    number=number) / number
+        codec_time = timeit.timeit(lambda: codec.decode(codec.encode(message)), number=number) / number  # type: ignore
+        print(f'{type(message).__name__:>15} | {len(pickled):>12} | {len(encoded):>11} | '
+              f'{pickle_time * 1e6:>14.2f} us | {codec_time * 1e6:>13.2f} us')
+
+    # The queue pickles the encoded bytes, so include that overhead
+    batch = tick_batch()
+    pickle_size = len(pickle.dumps(batch, pickle.HIGHEST_PROTOCOL))
+    codec_size = len(pickle.dumps(codec.encode(batch), pickle.HIGHEST_PROTOCOL))
+    print(f'\nQueue bytes per second at {UPDATES_PER_SECOND} ticks per second: '
+          f'{pickle_size * UPDATES_PER_SECOND} (pickle), {codec_size * UPDATES_PER_SECOND} (codec)')
+
+    print(f'\nSending {QUEUE_MESSAGES} tick batches between processes...')
+    pickle_rate = queue_throughput(batch, False)
+    codec_rate = queue_throughput(batch, True)
+    print(f'Pickle: {pickle_rate:.0f} messages per second, {pickle_rate * pickle_size / 1024:.0f} KB per second')
+    print(f' Codec: {codec_rate:.0f} messages per second, {codec_rate * codec_size / 1024:.0f} KB per second')
+
+
+if __name__ == '__main__':
+    main()
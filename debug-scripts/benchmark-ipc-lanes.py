@@ -0,0 +1,73 @@
+"""Measure how long a control message is delayed by bulk messages.
+
+A number of large renders are sent, followed by a stop request. With a
+single lane, the stop request has to wait for every render to be read
+first.
+
+Run from the repository root:
+    python debug-scripts/benchmark-ipc-lanes.py
+"""
+
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.components import Queue, ipc
+
+
+RENDERS = 5
+
+RESOLUTION = (1440, 2560, 3)
+
+
+def receiver(q: Queue, results: Queue) -> None:
+    """Record when the stop request was received, and how many
+    renders were read before it.
+    """
+    renders = 0
+    while True:
+        message = q.get()
+        if isinstance(message, ipc.StopTracking):
+            results.put((time.perf_counter(), renders))
+            break
+        renders += 1
+
+    # Drain the remaining renders
+    while renders < RENDERS:
+        q.get()
+        renders += 1
+
+
+def run(lanes: bool) -> tuple[float, int]:
+    """Get how long the stop request took to arrive."""
+    q: Queue = Queue(lanes=lanes)
+    results: Queue = Queue()
+    process = multiprocessing.Process(target=receiver, args=(q, results))
+    process.start()
+
+    render = ipc.Render(np.zeros(RESOLUTION, dtype=np.uint8), None)  # type: ignore[arg-type]
+    for _ in range(RENDERS):
+        q.put(render)
+    start = time.perf_counter()
+    q.put(ipc.StopTracking())
+
+    end, renders = results.get()
+    process.join()
+    return end - start, renders
+
+
+def main() -> None:
+    size = np.prod(RESOLUTION) / 1024 / 1024
+    print(f'Sending {RENDERS} renders of {size:.1f} MB, followed by a stop request...')
+    for name, lanes in (('Single lane', False), ('Lanes', True)):
+        delay, renders = run(lanes)
+        print(f'{name:>11}: received after {delay * 1000:.1f} ms, {renders} renders read before it')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Measure the memory and pickle size of every message type.
+
+Each message is created with placeholder values based on its type
+hints, so any newly added message is included automatically. Types
+that can't be created are listed at the end.
+
+The most frequently sent messages are expected to be slotted, and the
+script will exit with an error if any of them have a `__dict__`.
+
+Run from the repository root:
+    python debug-scripts/benchmark-ipc-messages.py
+"""
+
+import dataclasses
+import pickle
+import sys
+import tracemalloc
+import types
+import typing
+from enum import Enum
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.components import codec, ipc
+
+
+HOT_MESSAGES = (
+    ipc.Tick, ipc.MouseMove, ipc.MouseClick, ipc.MouseHeld, ipc.KeyPress, ipc.KeyHeld,
+    ipc.ButtonPress, ipc.ButtonHeld, ipc.ThumbstickMove, ipc.DataTransfer,
+    ipc.Active, ipc.Inactive, ipc.TickBatch,
+)
+
+INSTANCES = 1000
+
+
+def placeholder(hint: Any) -> Any:
+    """Create a value to match a type hint."""
+    origin = typing.get_origin(hint)
+    args = typing.get_args(hint)
+
+    if origin in (typing.Union, types.UnionType):
+        if type(None) in args:
+            return None
+        return placeholder(args[0])
+    if origin is tuple:
+        return tuple(placeholder(arg) for arg in args)
+    if origin in (list, dict, set):
+        return origin()
+    if origin is typing.Literal:
+        return args[0]
+    if origin is np.ndarray or hint is np.ndarray:
+        return np.zeros((8, 8, 4), dtype=np.uint8)
+
+    if hint is bool:
+        return True
+    if hint is int:
+        return 1
+    if hint is float:
+        return 1.0
+    if hint is str:
+        return 'placeholder'
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        return next(iter(hint))
+    if isinstance(hint, type) and issubclass(hint, BaseException):
+        return hint('placeholder')
+    if dataclasses.is_dataclass(hint):
+        return create(hint)  # type: ignore[arg-type]
+    return hint()
+
+
+def create(cls: type) -> Any:
+    """Create an instance of a dataclass with placeholder values."""
+    hints = typing.get_type_hints(cls)
+    kwargs = {}
+    for field in dataclasses.fields(cls):
+        if not field.init:
+            continue
+        if field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING:
+            kwargs[field.name] = placeholder(hints[field.name])
+    return cls(**kwargs)
+
+
+def allocated_size(cls: type) -> float:
+    """Get the average memory allocated per instance."""
+    message = create(cls)
+    args = {f.name: getattr(message, f.name) for f in dataclasses.fields(cls) if f.init}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = [cls(**args) for _ in range(INSTANCES)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del messages
+    return (after - before) / INSTANCES
+
+
+def main() -> int:
+    message_types = sorted((cls for cls in vars(ipc).values()
+                            if isinstance(cls, type) and issubclass(cls, ipc.Message) and cls is not ipc.Message),
+                           key=lambda cls: cls.__name__)
+
+    print(f'{"Message":>28} | {"Slots":>5} | {"Memory":>8} | {"Pickle":>6} | {"Codec":>5}')
+    failed: list[str] = []
+    unsupported: list[str] = []
+    for cls in message_types:
+        try:
+            message = create(cls)
+        except Exception:  # pylint: disable=broad-exception-caught
+            unsupported.append(cls.__name__)
+            continue
+
+        slotted = not hasattr(message, '__dict__')
+        if cls in HOT_MESSAGES and not slotted:
+            failed.append(cls.__name__)
+
+        pickled = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        assert type(pickle.loads(pickled)) is cls, cls.__name__
+        encoded = codec.encode(message)
+        print(f'{cls.__name__:>28} | {"yes" if slotted else "no":>5} | {allocated_size(cls):>6.0f} B | '
+              f'{len(pickled):>6} | {"-" if encoded is None else len(encoded):>5}')
+
+    if unsupported:
+        print(f'\nUnable to create: {", ".join(unsupported)}')
+    if failed:
+        print(f'\nFrequently sent messages without slots: {", ".join(failed)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Compare the latency of sending messages through the hub against
+sending them directly to the receiving component.
+
+Tracking writes messages directly to a ring buffer read by Processing
+and the GUI, and only uses the hub for control messages. This
+simulates both routes with the same components used by the application.
+
+Run from the repository root:
+    python debug-scripts/benchmark-ipc-routing.py
+"""
+
+import multiprocessing
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.components import Queue, ipc
+from mousetracks2.components.abstract import Component
+from mousetracks2.utils.shared_memory import RingBuffer
+
+
+MESSAGES_PER_TICK = 10
+
+TICKS = 600
+
+TICK_RATE = 1 / 60
+
+
+@dataclass
+class Ping(ipc.Message):
+    """Message to measure the time taken to arrive."""
+
+    target: int = field(default=ipc.Target.Processing | ipc.Target.GUI, init=False)
+    sent: float
+
+
+class Sender(Component):
+    """Send messages at the same rate as the tracking component."""
+
+    @property
+    def target(self) -> int:
+        return ipc.Target.Tracking
+
+    def run(self) -> None:
+        for _ in range(TICKS):
+            tick_start = time.perf_counter()
+            for _ in range(MESSAGES_PER_TICK):
+                self.send_data(Ping(time.perf_counter()))
+            time.sleep(max(0.0, TICK_RATE - (time.perf_counter() - tick_start)))
+        self.send_data(ipc.Exit())
+
+
+def hub(q_main: Queue, routes: dict[int, Queue]) -> None:
+    """Forward messages in the same way as `Hub._process_message`."""
+    while True:
+        message = q_main.get()
+        for target, q in routes.items():
+            if message.target & target:
+                q.put(message)
+        if isinstance(message, ipc.Exit):
+            return
+
+
+class Receiver(Component):
+    """Record how long each message took to arrive."""
+
+    def __init__(self, q_send: Queue, q_receive: Queue, ring_buffer: RingBuffer, target: int) -> None:
+        self._target = target
+        super().__init__(q_send, q_receive, ring_buffer)
+
+    @property
+    def target(self) -> int:
+        return self._target
+
+    def run(self) -> None:
+        latencies = []
+        for message in self.receive_data(timeout=None):
+            if isinstance(message, ipc.Exit):
+                break
+            latencies.append(time.perf_counter() - message.sent)
+        self._q_send.put(latencies)
+
+
+def receiver(q_results: Queue, q: Queue, ring_buffer: RingBuffer, target: int) -> None:
+    """Run a receiver in a new process."""
+    Receiver(q_results, q, ring_buffer, target).run()
+
+
+def run(direct: bool) -> list[float]:
+    """Run the benchmark and get the latency of every message."""
+    q_main: Queue = Queue()
+    q_sender: Queue = Queue()
+    q_results: Queue = Queue()
+    routes: dict[int, Queue] = {ipc.Target.Processing: Queue(), ipc.Target.GUI: Queue()}
+    ring_buffer = RingBuffer()
+    for target in routes:
+        ring_buffer.reset_reader(target)
+
+    processes = [multiprocessing.Process(target=receiver, args=(q_results, q, ring_buffer, target))
+                 for target, q in routes.items()]
+    for process in processes:
+        process.start()
+
+    # Exit goes through the hub, so it must be routed as well
+    processes.append(multiprocessing.Process(target=hub, args=(q_main, routes)))
+    if direct:
+        processes.append(multiprocessing.Process(target=Sender.launch, args=(q_main, q_sender, ring_buffer,
+                                                                             ipc.Target.Processing | ipc.Target.GUI)))
+    else:
+        processes.append(multiprocessing.Process(target=Sender.launch, args=(q_main, q_sender)))
+
+    for process in processes[len(routes):]:
+        process.start()
+    latencies = q_results.get() + q_results.get()
+    for process in processes:
+        process.join()
+    ring_buffer.close()
+    return latencies
+
+
+def main() -> None:
+    print(f'Sending {TICKS * MESSAGES_PER_TICK} messages at {MESSAGES_PER_TICK} per tick to 2 components...')
+    for name, direct in (('Hub', False), ('Ring buffer', True)):
+        latencies = sorted(run(direct))
+        median = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        print(f'{name:>11}: median {median:.3f} ms, p99 {p99:.3f} ms, max {latencies[-1] * 1000:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Compare the ring buffer against queues for sending tick batches.
+
+A single writer sends the same tick batch to two readers, in the same
+way that Tracking sends to Processing and the GUI. With queues each
+message is put twice, but with the ring buffer it's only written once.
+
+The writer never waits for the ring buffer readers, so the number of
+dropped messages is also reported.
+
+Run from the repository root:
+    python debug-scripts/benchmark-ring-buffer.py
+"""
+
+import multiprocessing
+import sys
+import time
+from multiprocessing.connection import wait
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.components import Queue, codec, ipc
+from mousetracks2.utils.shared_memory import RING_WAIT_LIMIT, RingBuffer
+
+
+MESSAGES = 100000
+
+READERS = (ipc.Target.Processing, ipc.Target.GUI)
+
+
+def tick_batch(tick: int) -> ipc.TickBatch:
+    """Create a batch for a typical tick with mouse and keyboard use."""
+    batch = ipc.TickBatch(tick, int(time.time()))
+    batch.add(ipc.MouseMove((1234, 567)))
+    batch.add(ipc.MouseHeld(1, (1234, 567)))
+    batch.add(ipc.KeyHeld(65))
+    batch.add(ipc.Active('Default', 1))
+    return batch
+
+
+def queue_reader(q: Queue, results: Queue) -> None:
+    """Read from a queue until `None` is received."""
+    count = 0
+    while q.get() is not None:
+        count += 1
+    results.put((count, 0))
+
+
+def ring_buffer_reader(ring_buffer: RingBuffer, reader: int, results: Queue) -> None:
+    """Read from the ring buffer until an `Exit` message is received."""
+    ring_reader = ring_buffer.reader(reader)
+    count = 0
+    while True:
+        for data in ring_reader.read():
+            if isinstance(codec.decode(data), ipc.Exit):
+                results.put((count, ring_reader.dropped))
+                ring_buffer.close()
+                return
+            count += 1
+        if ring_reader.prepare_wait():
+            wait([ring_reader.wake_connection], RING_WAIT_LIMIT)  # type: ignore[list-item]
+        ring_reader.finish_wait()
+
+
+def run_queues() -> tuple[float, list[tuple[int, int]]]:
+    """Send the messages through a queue per reader."""
+    results: Queue = Queue()
+    queues: list[Queue] = [Queue() for _ in READERS]
+    processes = [multiprocessing.Process(target=queue_reader, args=(q, results)) for q in queues]
+    for process in processes:
+        process.start()
+
+    start = time.perf_counter()
+    for tick in range(MESSAGES):
+        batch = tick_batch(tick)
+        for q in queues:
+            q.put(batch)
+    for q in queues:
+        q.put(None)
+    counts = [results.get() for _ in READERS]
+    elapsed = time.perf_counter() - start
+
+    for process in processes:
+        process.join()
+    return MESSAGES / elapsed, counts
+
+
+def run_ring_buffer() -> tuple[float, list[tuple[int, int]]]:
+    """Send the messages through a shared ring buffer."""
+    results: Queue = Queue()
+    ring_buffer = RingBuffer()
+    tag = 0
+    for reader in READERS:
+        ring_buffer.reset_reader(reader)
+        tag |= reader
+    processes = [multiprocessing.Process(target=ring_buffer_reader, args=(ring_buffer, reader, results))
+                 for reader in READERS]
+    for process in processes:
+        process.start()
+
+    start = time.perf_counter()
+    for tick in range(MESSAGES):
+        ring_buffer.write(codec.dumps(tick_batch(tick)), tag)
+    ring_buffer.write(codec.dumps(ipc.Exit()), tag)
+    counts = [results.get() for _ in READERS]
+    elapsed = time.perf_counter() - start
+
+    for process in processes:
+        process.join()
+    ring_buffer.close()
+    return MESSAGES / elapsed, counts
+
+
+def main() -> None:
+    print(f'Sending {MESSAGES} tick batches to {len(READERS)} readers...')
+    for name, func in (('Queue', run_queues), ('Ring buffer', run_ring_buffer)):
+        rate, counts = func()
+        received = ', '.join(f'{count} received/{dropped} dropped' for count, dropped in counts)
+        print(f'{name:>11}: {rate:.0f} messages per second ({received})')
+
+
+if __name__ == '__main__':
+    main()
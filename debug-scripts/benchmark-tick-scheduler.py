@@ -0,0 +1,53 @@
+"""Measure the timing accuracy of the tick scheduler.
+
+The scheduler is run for a few seconds at each rate, with a small
+amount of work done every tick, and the jitter, overrun and number of
+dropped ticks are reported.
+
+Run from the repository root:
+    python debug-scripts/benchmark-tick-scheduler.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.utils.scheduler import TickScheduler
+
+
+DURATION = 3.0
+
+RATES = (60, 120, 240, 500)
+
+WORK_TIME = 0.0005
+
+
+def run(ups: int) -> TickScheduler:
+    """Run the scheduler for a fixed duration."""
+    scheduler = TickScheduler(ups)
+    end = time.perf_counter() + DURATION
+    for _ in scheduler:
+        now = time.perf_counter()
+        if now >= end:
+            break
+        while time.perf_counter() < now + WORK_TIME:
+            pass
+    return scheduler
+
+
+def main() -> None:
+    print(f'{"Rate":>6} | {"Runs":>6} | {"Dropped":>7} | {"Jitter P50":>10} | {"Jitter P99":>10} | '
+          f'{"Jitter Max":>10} | {"Overrun Max":>11}')
+    for ups in RATES:
+        scheduler = run(ups)
+        print(f'{ups:>3} Hz | {scheduler.jitter.count:>6} | {scheduler.dropped:>7} | '
+              f'{scheduler.jitter.percentile(50) * 1000:>7.3f} ms | '
+              f'{scheduler.jitter.percentile(99) * 1000:>7.3f} ms | '
+              f'{scheduler.jitter.maximum * 1000:>7.3f} ms | '
+              f'{scheduler.overrun.maximum * 1000:>8.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
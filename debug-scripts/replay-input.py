@@ -0,0 +1,121 @@
+"""Replay recorded tracking data into the processing component.
+
+Record the data by launching the application with
+`--debug-record-input PATH`, then replay it here either as fast as
+possible, or at a multiple of the original speed. The throughput, the
+latency of each message, and a checksum of each profile are reported,
+so the same recording can be used to measure or check any changes to
+the processing. The monitor layout is taken from the recording, so no
+display is required.
+
+A new temporary data directory is used unless one is given, so that no
+existing profiles are loaded or saved over.
+
+Run from the repository root:
+    python debug-scripts/replay-input.py PATH [--speed N] [--data-dir PATH]
+"""
+
+import argparse
+import hashlib
+import io
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.context import CTX
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description='Replay recorded tracking data')
+    parser.add_argument('path', type=Path, help='recording to replay')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='multiple of the original speed to replay at, or 0 for as fast as possible')
+    parser.add_argument('--data-dir', type=Path, default=None,
+                        help='data directory to use instead of a temporary one')
+    return parser.parse_args()
+
+
+def main() -> None:
+    # pylint: disable=import-outside-toplevel,protected-access
+    args = parse_args()
+
+    # The data directory must be set before the profiles are imported
+    CTX.cli.data_dir = args.data_dir or Path(tempfile.mkdtemp(prefix='mousetracks-replay-'))
+    print(f'Data directory: {CTX.data_dir}')
+
+    from mousetracks2.components import Queue, ipc
+    from mousetracks2.components.processing import Processing
+    from mousetracks2.components.recording import read_recording
+    from mousetracks2.file import TrackingProfile
+    from mousetracks2.utils.histogram import Histogram
+
+    def checksum(profile: TrackingProfile) -> str:
+        """Get a checksum of everything recorded in a profile.
+        The times are ignored as they change on every run.
+        """
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as zf:
+            profile._write_to_zip(zf)
+        result = hashlib.sha256()
+        with zipfile.ZipFile(buffer) as zf:
+            for name in sorted(zf.namelist()):
+                if not name.startswith('metadata/time/'):
+                    result.update(name.encode('utf-8'))
+                    result.update(zf.read(name))
+        return result.hexdigest()[:16]
+
+    # Load everything first so that reading the file isn't measured
+    messages = [(sent, message) for sent, message in read_recording(args.path)
+                if message.target & ipc.Target.Processing]
+    if not messages:
+        print('No messages to replay')
+        return
+    events = sum(len(list(message)) if isinstance(message, ipc.TickBatch) else 1 for _, message in messages)
+    duration = messages[-1][0] - messages[0][0]
+    print(f'Loaded {len(messages)} messages ({events} events) covering {duration:.1f} seconds')
+
+    # Start with the recorded monitor layout, so that no display is needed
+    monitor_data = next((message.data for _, message in messages if isinstance(message, ipc.MonitorsChanged)), None)
+    if monitor_data is None:
+        print('No monitor layout was recorded, using the current one')
+
+    q_send: Queue = Queue()
+    q_receive: Queue = Queue()
+    processing = Processing(q_send, q_receive, monitor_data=monitor_data)
+
+    latency = Histogram()
+    first_sent = messages[0][0]
+    start = time.perf_counter()
+    for sent, message in messages:
+        if args.speed > 0:
+            scheduled = start + (sent - first_sent) / args.speed
+            remaining = scheduled - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+        else:
+            scheduled = time.perf_counter()
+        processing._process_message(message)
+        latency.add(time.perf_counter() - scheduled)
+    elapsed = time.perf_counter() - start
+
+    processing.on_exit()
+    q_send.cancel_join_thread()
+    q_receive.cancel_join_thread()
+
+    print(f'Replayed in {elapsed:.2f} seconds ({duration / elapsed:.1f}x speed)')
+    print(f'Throughput: {len(messages) / elapsed:.0f} messages per second, {events / elapsed:.0f} events per second')
+    print(f'Latency: mean {latency.mean * 1000:.3f} ms, p50 {latency.percentile(50) * 1000:.3f} ms, '
+          f'p99 {latency.percentile(99) * 1000:.3f} ms, max {latency.maximum * 1000:.3f} ms')
+    print('Profile checksums:')
+    for name in processing.all_profiles:
+        profile = processing.all_profiles[name]
+        print(f'    {checksum(profile)} {profile.name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""Find the highest rate of input that the application can keep up with.
+
+The Hub is launched as normal, but with the tracking component replaced
+by one that generates input. The cursor follows Bézier curves across the
+monitors, with bursts of clicks, rolls of key presses, thumbstick sweeps
+and switches between applications.
+
+The GUI is replaced by a component that only reads its messages, so
+that no display is needed, but the GUI queue and ring buffer reader are
+still part of the test.
+
+The rates are increased in stages. During each stage, the Hub is asked
+for the number of messages waiting for itself, processing and the GUI,
+which includes their queues and ring buffer readers. A stage is
+sustainable if none of these grow from the first half of the stage to
+the second half by more than `MAX_GROWTH` seconds worth of records,
+otherwise the backlog would keep growing until records start getting
+dropped. The test stops after the first stage that can't be sustained.
+
+Run from the repository root:
+    python debug-scripts/stress-pipeline.py [--stages 1,2,4] [--stage-duration 5]
+"""
+
+import argparse
+import math
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from statistics import fmean
+from typing import Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.components import Hub, ipc
+from mousetracks2.components.abstract import Component
+from mousetracks2.constants import DEFAULT_PROFILE_NAME, UPDATES_PER_SECOND
+from mousetracks2.exceptions import ExitRequest
+from mousetracks2.types import Rect, RectList
+from mousetracks2.utils import keycodes
+from mousetracks2.utils.monitor import MonitorData
+from mousetracks2.utils.scheduler import TickScheduler
+
+
+MAX_GROWTH = 0.1
+"""Maximum number of seconds worth of records that a backlog can grow by
+between the first and second half of a stage.
+"""
+
+SAMPLE_INTERVAL = 0.1
+"""Number of seconds between requesting the queue sizes."""
+
+BACKLOGS = ('Hub', 'Processing', 'GUI')
+
+APPLICATIONS = ('Synthetic Game', 'Synthetic Editor', 'Synthetic Browser')
+
+KEYS = tuple(range(0x41, 0x5B))
+
+THUMBSTICKS = (ipc.ThumbstickMove.Thumbstick.Left, ipc.ThumbstickMove.Thumbstick.Right)
+
+
+def parse_monitors(layout: str) -> RectList:
+    """Parse a monitor layout, such as `1920x1080+0+0,1920x1080+1920+0`."""
+    monitors = RectList()
+    for monitor in layout.split(','):
+        match = re.fullmatch(r'(\d+)x(\d+)([+-]\d+)([+-]\d+)', monitor.strip())
+        if match is None:
+            raise argparse.ArgumentTypeError(f'invalid monitor: {monitor!r}, expected WIDTHxHEIGHT+X+Y')
+        width, height, x, y = map(int, match.groups())
+        monitors.append(Rect.from_size(width, height, x, y))
+    return monitors
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line arguments.
+    This is also done by the generating component after it launches.
+    """
+    parser = argparse.ArgumentParser(description='Stress test the application with generated input')
+    parser.add_argument('--monitors', type=parse_monitors, default='1920x1080+0+0,2560x1440+1920-180',
+                        help='monitor layout as WIDTHxHEIGHT+X+Y, separated by commas')
+    parser.add_argument('--mouse-rate', type=float, default=250, help='mouse movements per second')
+    parser.add_argument('--click-rate', type=float, default=5, help='bursts of mouse clicks per second')
+    parser.add_argument('--key-rate', type=float, default=2, help='rolls of key presses per second')
+    parser.add_argument('--thumbstick-rate', type=float, default=60, help='thumbstick movements per second')
+    parser.add_argument('--focus-interval', type=float, default=5, help='seconds between switching applications')
+    parser.add_argument('--stages', type=lambda value: [float(i) for i in value.split(',')],
+                        default='1,2,4,8,16,32,64,128,256', help='multiples of the rates for each stage')
+    parser.add_argument('--stage-duration', type=float, default=5, help='seconds to run each stage for')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random number generator')
+    return parser.parse_known_args()[0]
+
+
+def random_point(rng: random.Random, monitors: RectList) -> tuple[int, int]:
+    """Get a random point on any monitor."""
+    monitor = rng.choice(monitors)
+    return rng.randrange(monitor.left, monitor.right), rng.randrange(monitor.top, monitor.bottom)
+
+
+def bezier_paths(rng: random.Random, monitors: RectList) -> Iterator[tuple[int, int]]:
+    """Move between random points on cubic Bézier curves.
+    Each movement speeds up and then slows down towards the end.
+    """
+    x0, y0 = random_point(rng, monitors)
+    while True:
+        (x1, y1), (x2, y2), (x3, y3) = (random_point(rng, monitors) for _ in range(3))
+        steps = rng.randint(20, 200)
+        for i in range(1, steps + 1):
+            t = (1 - math.cos(math.pi * i / steps)) / 2
+            u = 1 - t
+            yield (round(u ** 3 * x0 + 3 * u * u * t * x1 + 3 * u * t * t * x2 + t ** 3 * x3),
+                   round(u ** 3 * y0 + 3 * u * u * t * y1 + 3 * u * t * t * y2 + t ** 3 * y3))
+        x0, y0 = x3, y3
+
+
+class Workload:
+    """Generate the input for each tick."""
+
+    def __init__(self, options: argparse.Namespace, rng: random.Random) -> None:
+        self.options = options
+        self.rng = rng
+        self.position = random_point(rng, options.monitors)
+        self._mouse = bezier_paths(rng, options.monitors)
+        self._thumbstick_angle = 0.0
+        self._due: dict[str, float] = {}
+
+    def _count(self, name: str, rate: float) -> int:
+        """Get how many times something happens this tick."""
+        due = self._due.get(name, 0.0) + rate / UPDATES_PER_SECOND
+        count = int(due)
+        self._due[name] = due - count
+        return count
+
+    def _click_burst(self) -> Iterator[ipc.Message]:
+        """Click a button up to 3 times, sometimes holding the last click."""
+        button = self.rng.choice(keycodes.CLICK_CODES)
+        for _ in range(self.rng.randint(1, 3)):
+            yield ipc.MouseClick(button, self.position)
+            yield ipc.KeyPress(button)
+        if self.rng.random() < 0.25:
+            ticks = self.rng.randint(1, UPDATES_PER_SECOND)
+            yield ipc.MouseHeld(button, self.position, ticks)
+            yield ipc.KeyHeld(button, ticks)
+
+    def _key_roll(self) -> Iterator[ipc.Message]:
+        """Press several keys in a row, sometimes holding some."""
+        for keycode in self.rng.sample(KEYS, self.rng.randint(3, 8)):
+            yield ipc.KeyPress(keycode)
+            if self.rng.random() < 0.2:
+                yield ipc.KeyHeld(keycode, self.rng.randint(1, 10))
+
+    def _thumbstick_sweep(self) -> Iterator[ipc.Message]:
+        """Move both thumbsticks around in circles."""
+        self._thumbstick_angle += 0.1
+        radius = abs(math.sin(self._thumbstick_angle / 7))
+        for i, thumbstick in enumerate(THUMBSTICKS):
+            angle = self._thumbstick_angle + i * math.pi
+            yield ipc.ThumbstickMove(0, thumbstick, (radius * math.cos(angle), radius * math.sin(angle)))
+        if self.rng.random() < 0.05:
+            yield ipc.ButtonPress(0, self.rng.choice(keycodes.GAMEPAD_CODES))
+
+    def tick(self, multiplier: float) -> tuple[list[tuple[int, int]], list[ipc.Message]]:
+        """Get the mouse movements and other events for a tick."""
+        options = self.options
+        moves = [next(self._mouse) for _ in range(self._count('mouse', options.mouse_rate * multiplier))]
+        if moves:
+            self.position = moves[-1]
+
+        events: list[ipc.Message] = []
+        for _ in range(self._count('click', options.click_rate * multiplier)):
+            events.extend(self._click_burst())
+        for _ in range(self._count('key', options.key_rate * multiplier)):
+            events.extend(self._key_roll())
+        for _ in range(self._count('thumbstick', options.thumbstick_rate * multiplier)):
+            events.extend(self._thumbstick_sweep())
+        return moves, events
+
+
+def backlogs(sizes: ipc.QueueSize) -> tuple[int, ...]:
+    """Get the number of messages waiting for each of `BACKLOGS`."""
+    return sizes.hub + sizes.hub_bulk, sizes.processing + sizes.processing_bulk, sizes.gui + sizes.gui_bulk
+
+
+class SyntheticGUI(Component):
+    """Read the GUI messages without displaying anything."""
+
+    @property
+    def target(self) -> int:
+        return ipc.Target.GUI
+
+    def run(self) -> None:
+        for message in self.receive_data(None):
+            if isinstance(message, ipc.Exit):
+                raise ExitRequest
+
+
+class SyntheticTracking(Component):
+    """Send generated input instead of tracking it."""
+
+    @property
+    def target(self) -> int:
+        return ipc.Target.Tracking
+
+    def __post_init__(self) -> None:
+        self.options = parse_args()
+        self.rng = random.Random(self.options.seed)
+        self.workload = Workload(self.options, self.rng)
+        self.profile_name = DEFAULT_PROFILE_NAME
+        self.tick = self.poll = 0
+        self.samples: tuple[list[tuple[int, ...]], list[tuple[int, ...]]] = ([], [])
+        self.half: int | None = None
+
+    def _check_exit(self, timeout: float | None = 0.0) -> None:
+        """Stop if requested, optionally waiting for tracking to start."""
+        for message in self.receive_data(timeout):
+            match message:
+                case ipc.StartTracking() if timeout is None:
+                    return
+                case ipc.QueueSize() if self.half is not None:
+                    self.samples[self.half].append(backlogs(message))
+                case ipc.StopTracking() | ipc.Exit():
+                    raise ExitRequest
+
+    def _switch_application(self) -> None:
+        """Focus a different application with a random window."""
+        self.profile_name = self.rng.choice(APPLICATIONS)
+        monitor = self.rng.choice(self.options.monitors)
+        width = self.rng.randint(monitor.width // 4, monitor.width)
+        height = self.rng.randint(monitor.height // 4, monitor.height)
+        x = self.rng.randint(monitor.left, monitor.right - width)
+        y = self.rng.randint(monitor.top, monitor.bottom - height)
+        self.send_data(ipc.CurrentProfileChanged(self.profile_name, None, RectList([Rect.from_size(width, height, x, y)])))
+
+    def _send_tick(self, multiplier: float) -> tuple[int, int]:
+        """Send a tick of generated input, split into a batch per poll.
+        Returns the number of events and records sent.
+        """
+        self.tick += 1
+        moves, events = self.workload.tick(multiplier)
+        polls = max(1, len(moves))
+        records = 0
+        for i in range(polls):
+            self.poll += 1
+            batch = ipc.TickBatch(self.tick, int(time.time()), int(not i), polls * UPDATES_PER_SECOND, self.poll)
+            if moves:
+                batch.add(ipc.MouseMove(moves[i]))
+            if not i:
+                batch.add(ipc.Active(self.profile_name, 1))
+                for event in events:
+                    if batch.add(event):
+                        continue
+                    # Keep the order the same as the tracking component
+                    self.send_data(batch)
+                    records += 1
+                    batch = ipc.TickBatch(self.tick, batch.timestamp, 0, batch.rate, self.poll)
+                    if not batch.add(event):
+                        self.send_data(event)
+                        records += 1
+            self.send_data(batch)
+            records += 1
+        return len(moves) + len(events), records
+
+    def _run_stage(self, multiplier: float) -> tuple[int, int, list[tuple[float, ...]]]:
+        """Send input at a multiple of the rates for one stage.
+        Returns the number of events and records sent, and the average
+        of each backlog during the first and second half.
+        """
+        ticks = round(self.options.stage_duration * UPDATES_PER_SECOND)
+        focus_ticks = max(1, round(self.options.focus_interval * UPDATES_PER_SECOND))
+        sample_ticks = max(1, round(SAMPLE_INTERVAL * UPDATES_PER_SECOND))
+        self.samples = ([], [])
+        events = records = 0
+        for i, _ in enumerate(TickScheduler(UPDATES_PER_SECOND)):
+            if i >= ticks:
+                break
+            self.half = int(i >= ticks // 2)
+            self._check_exit()
+            if not self.tick % focus_ticks:
+                self._switch_application()
+            if not i % sample_ticks:
+                self.send_data(ipc.RequestQueueSize(ipc.Target.Tracking))
+            sent_events, sent_records = self._send_tick(multiplier)
+            events += sent_events
+            records += sent_records
+        self.half = None
+
+        averages = [tuple(map(fmean, zip(*samples))) if samples else (0.0,) * len(BACKLOGS)
+                    for samples in self.samples]
+        return events, records, list(zip(*averages))
+
+    def run(self) -> None:
+        self._check_exit(None)
+
+        self.send_data(ipc.MonitorsChanged(MonitorData(self.options.monitors, self.options.monitors)))
+
+        duration = self.options.stage_duration
+        sustainable = 0.0
+        print(f'{"Stage":>6} | {"Events/s":>9} | {"Records/s":>9} | '
+              f'{" | ".join(f"{name:>12}" for name in BACKLOGS)} | Sustainable')
+        for multiplier in self.options.stages:
+            events, records, averages = self._run_stage(multiplier)
+
+            # Only fail if a backlog is growing, not if it's just large
+            limit = records / duration * MAX_GROWTH
+            passed = all(late - early <= limit for early, late in averages)
+            trends = ' | '.join(f'{f"{early:.0f} -> {late:.0f}":>12}' for early, late in averages)
+            print(f'{multiplier:>5g}x | {events / duration:>9.0f} | {records / duration:>9.0f} | '
+                  f'{trends} | {"yes" if passed else "no"}')
+            if not passed:
+                break
+            sustainable = events / duration
+
+        print(f'Sustainable rate: {sustainable:.0f} events per second')
+        self.send_data(ipc.Exit())
+        while True:
+            self._check_exit(None)
+
+
+if __name__ == '__main__':
+    parse_args()  # Exit early on invalid arguments
+    Hub(tracking=SyntheticTracking, gui=SyntheticGUI).run()
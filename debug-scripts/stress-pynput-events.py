@@ -0,0 +1,139 @@
+"""Check that no input events are lost at high event rates.
+
+The tracking component is run with threads calling the pynput
+callbacks directly, sending key presses, mouse clicks and scroll events
+as fast as configured. Every message sent by the component is then
+counted and compared against what was generated.
+
+Each key and button is only pressed again after a few ticks, as a press
+on the very next tick is recorded as the key being held.
+
+Avoid using the mouse or keyboard while this runs, as the real input
+will also be recorded.
+
+Run from the repository root:
+    python debug-scripts/stress-pynput-events.py
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable
+
+import pynput
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mousetracks2.components import Queue, ipc
+from mousetracks2.components.tracking import Tracking
+from mousetracks2.utils import keycodes
+
+
+DURATION = 5.0
+
+KEY_RATE = 1000
+"""Number of key presses and releases per second."""
+
+CLICK_RATE = 100
+"""Number of mouse button presses and releases per second."""
+
+SCROLL_RATE = 1000
+"""Number of scroll events per second."""
+
+KEYS = tuple(range(0x30, 0x3A)) + tuple(range(0x41, 0x5B))
+
+BUTTONS = (pynput.mouse.Button.left, pynput.mouse.Button.middle, pynput.mouse.Button.right)
+
+SCROLLS = ((0, 1, keycodes.VK_SCROLL_UP), (0, -1, keycodes.VK_SCROLL_DOWN),
+           (1, 0, keycodes.VK_SCROLL_RIGHT), (-1, 0, keycodes.VK_SCROLL_LEFT))
+
+
+def generate(rate: int, event: Callable[[int], None]) -> None:
+    """Call a function at a constant rate with the event number."""
+    sent = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < DURATION:
+        while sent < elapsed * rate:
+            event(sent)
+            sent += 1
+        time.sleep(0.001)
+
+
+def main() -> None:
+    q_send: Queue = Queue()
+    q_receive: Queue = Queue()
+    setup: list[ipc.Message] = [ipc.DebugDisableAppDetection(True), ipc.DebugDisableMonitorCheck(True),
+                                ipc.SetGlobalGamepadTracking(False), ipc.SetGlobalNetworkTracking(False),
+                                ipc.Autosave(False), ipc.StartTracking()]
+    for message in setup:
+        q_receive.put(message)
+
+    tracking = Tracking(q_send, q_receive)
+    expected: Counter[int] = Counter()
+
+    def key_event(i: int) -> None:
+        key = pynput.keyboard.KeyCode.from_vk(KEYS[i // 2 % len(KEYS)])
+        if i % 2:
+            tracking._pynput_key_release(key)  # pylint: disable=protected-access
+        else:
+            tracking._pynput_key_press(key)  # pylint: disable=protected-access
+            expected[KEYS[i // 2 % len(KEYS)]] += 1
+
+    def click_event(i: int) -> None:
+        idx = i // 2 % len(BUTTONS)
+        tracking._pynput_mouse_click(0, 0, BUTTONS[idx], not i % 2)  # pylint: disable=protected-access
+        if not i % 2:
+            expected[keycodes.CLICK_CODES[idx]] += 1
+
+    def scroll_event(i: int) -> None:
+        dx, dy, keycode = SCROLLS[i % len(SCROLLS)]
+        tracking._pynput_mouse_scroll(0, 0, dx, dy)  # pylint: disable=protected-access
+        expected[keycode] += 1
+
+    def generate_all() -> None:
+        while tracking.state != ipc.TrackingState.Running:
+            time.sleep(0.01)
+        threads = [threading.Thread(target=generate, args=(KEY_RATE, key_event)),
+                   threading.Thread(target=generate, args=(CLICK_RATE, click_event)),
+                   threading.Thread(target=generate, args=(SCROLL_RATE, scroll_event))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Wait for the final events to be processed
+        time.sleep(0.1)
+        q_receive.put(ipc.StopTracking())
+
+    print(f'Sending {KEY_RATE + CLICK_RATE + SCROLL_RATE} events per second for {DURATION:g} seconds...')
+    generator = threading.Thread(target=generate_all)
+    generator.start()
+    tracking.run()
+    generator.join()
+    tracking.on_exit()
+
+    received: Counter[int] = Counter()
+    while not q_send.empty():
+        message = q_send.get()
+        for item in message if isinstance(message, ipc.TickBatch) else (message,):
+            match item:
+                case ipc.KeyPress():
+                    received[item.keycode] += 1
+                case ipc.KeyHeld() if item.keycode in keycodes.SCROLL_CODES:
+                    received[item.keycode] += item.ticks
+                case ipc.Traceback():
+                    print(item.traceback)
+
+    total = sum(expected.values())
+    lost = sum((expected - received).values())
+    extra = sum((received - expected).values())
+    print(f'Generated: {total} presses and scrolls')
+    print(f' Recorded: {sum(received.values())} presses and scrolls')
+    print(f'     Lost: {lost}')
+    print(f'    Extra: {extra}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""Render profiles from the command line without launching the GUI.
+
+Usage: `python -m mousetracks2 render [options] PROFILE [PROFILE ...]`
+
+Each profile is loaded and rendered in its own worker process, so only
+the paths are resolved up front and the profile data is never loaded in
+the main process.
+"""
+
+import argparse
+import math
+import os
+import re
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from glob import glob
+from typing import Sequence
+
+import numpy as np
+from PIL import Image
+
+from .components import ipc
+from .constants import UPDATES_PER_SECOND
+from .file import EXTENSION, PROFILE_DIR, TrackingProfile, get_profile_names, sanitise_profile_name
+from .gui.utils import format_ticks
+from .layers import LAYER_PRESETS, LayerOption
+from .profile_render import ProfileRender
+
+
+RENDER_TYPES: dict[str, ipc.RenderType] = {
+    'movement': ipc.RenderType.MouseMovement,
+    'speed': ipc.RenderType.MouseSpeed,
+    'position': ipc.RenderType.MousePosition,
+    'clicks': ipc.RenderType.SingleClick,
+    'double-clicks': ipc.RenderType.DoubleClick,
+    'held-clicks': ipc.RenderType.HeldClick,
+    'thumbstick-movement': ipc.RenderType.ThumbstickMovement,
+    'thumbstick-speed': ipc.RenderType.ThumbstickSpeed,
+    'thumbstick-position': ipc.RenderType.ThumbstickPosition,
+    'keyboard': ipc.RenderType.KeyboardHeatmap,
+}
+"""Command line names for each render type."""
+
+RENDER_NAMES: dict[ipc.RenderType, str] = {
+    ipc.RenderType.MouseMovement: 'Mouse Movement',
+    ipc.RenderType.MousePosition: 'Mouse Position',
+    ipc.RenderType.MouseSpeed: 'Mouse Speed',
+    ipc.RenderType.SingleClick: 'Mouse Clicks',
+    ipc.RenderType.DoubleClick: 'Mouse Double Clicks',
+    ipc.RenderType.HeldClick: 'Mouse Held Clicks',
+    ipc.RenderType.ThumbstickMovement: 'Gamepad Thumbstick Movement',
+    ipc.RenderType.ThumbstickPosition: 'Gamepad Thumbstick Position',
+    ipc.RenderType.ThumbstickSpeed: 'Gamepad Thumbstick Speed',
+    ipc.RenderType.KeyboardHeatmap: 'Keyboard Heatmap',
+}
+"""Names used when saving images, matching the GUI."""
+
+PRESETS: dict[str, str] = {name.lower().replace(' ', '-'): name for name in LAYER_PRESETS}
+"""Command line names for each layer preset."""
+
+
+@dataclass
+class RenderJob:
+    """Hold everything required to render and save a single image."""
+
+    name: str
+    """Name of the render, used in the filename."""
+
+    layers: list[ipc.RenderLayer] = field(default_factory=list)
+    """Layers to blend, ordered from the bottom layer to the top."""
+
+
+def parse_args(args: Sequence[str] | None = None) -> argparse.Namespace:
+    """Parse the arguments for the render command."""
+    parser = argparse.ArgumentParser(prog='mousetracks2 render', description='Render profiles to PNG files.')
+    parser.add_argument('profiles', nargs='+', metavar='PROFILE',
+                        help='profile names or paths to profile files, wildcards are supported')
+    parser.add_argument('-t', '--type', dest='types', action='append', choices=RENDER_TYPES,
+                        help='type of render, may be given multiple times (default: movement)')
+    parser.add_argument('-p', '--preset', dest='presets', action='append', choices=PRESETS,
+                        help='layer preset to render, may be given multiple times')
+    parser.add_argument('-c', '--colour', dest='colours', action='append', metavar='COLOUR',
+                        help='colour map for each render type, may be given multiple times (default: same as the GUI)')
+    parser.add_argument('--width', type=int, default=None, help='width of the render (default: recorded resolution)')
+    parser.add_argument('--height', type=int, default=None, help='height of the render (default: recorded resolution)')
+    parser.add_argument('--sampling', type=int, default=4, help='render at a higher resolution and downscale (default: %(default)s)')
+    parser.add_argument('--no-lock-aspect', dest='lock_aspect', action='store_false',
+                        help='stretch the render to fit the width and height')
+    parser.add_argument('-o', '--output', default='.', help='folder to save the images to (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='maximum number of profiles to render at once (default: number of CPUs)')
+    result = parser.parse_args(args)
+
+    if not result.types and not result.presets:
+        result.types = ['movement']
+    return result
+
+
+def find_profiles(patterns: Sequence[str]) -> dict[str, str]:
+    """Find the profile files matching a list of patterns.
+
+    A pattern containing a path separator or the profile extension is
+    treated as a file path, otherwise it is matched against the names
+    of the saved profiles.
+
+    Returns:
+        Dict of `{path: profile_name}`.
+    """
+    profile_names = get_profile_names()
+
+    result: dict[str, str] = {}
+    for pattern in patterns:
+        if os.sep in pattern or '/' in pattern or pattern.endswith(f'.{EXTENSION}'):
+            for path in sorted(glob(pattern)):
+                name = TrackingProfile.get_name(path)
+                if name is not None:
+                    result[os.path.abspath(path)] = name
+
+        else:
+            for filename, name in profile_names.items():
+                if fnmatch(name.lower(), pattern.lower()) or fnmatch(filename, sanitise_profile_name(pattern)):
+                    result[os.path.join(PROFILE_DIR, f'{filename}.{EXTENSION}')] = name
+    return result
+
+
+def _layer_request(option: LayerOption, args: argparse.Namespace, profile_name: str,
+                   colour_map: str | None = None) -> ipc.RenderLayer:
+    """Convert the layer options into a render layer."""
+    render_type = option.render_type
+    request = ipc.RenderRequest(
+        type=render_type,
+        width=args.width,
+        height=args.height,
+        lock_aspect=args.lock_aspect,
+        profile=sanitise_profile_name(profile_name),
+        file_path=args.output,  # Mark the request as an export
+        colour_map=colour_map or option.render_colour.get(render_type),
+        padding=option.padding.get(render_type),
+        sampling=args.sampling,
+        contrast=option.contrast.get(render_type),
+        clipping=option.clipping.get(render_type),
+        blur=option.blur.get(render_type),
+        linear=option.linear.get(render_type),
+        invert=option.invert.get(render_type),
+        show_left_clicks=option.show_left_clicks,
+        show_middle_clicks=option.show_middle_clicks,
+        show_right_clicks=option.show_right_clicks,
+    )
+    return ipc.RenderLayer(request, option.blend_mode, option.channels, option.opacity)
+
+
+def build_jobs(args: argparse.Namespace, profile_name: str) -> list[RenderJob]:
+    """Build the list of renders to do for a profile."""
+    jobs: list[RenderJob] = []
+
+    for type_name in args.types or ():
+        option = LayerOption(RENDER_TYPES[type_name])
+        for colour_map in args.colours or [None]:
+            layer = _layer_request(option, args, profile_name, colour_map)
+            jobs.append(RenderJob(f'{RENDER_NAMES[option.render_type]} ({layer.request.colour_map})', [layer]))
+
+    for preset in args.presets or ():
+        name = PRESETS[preset]
+        layers = [_layer_request(option, args, profile_name) for option in LAYER_PRESETS[name]()]
+        jobs.append(RenderJob(name, layers))
+
+    return jobs
+
+
+def render_profile(path: str, jobs: list[RenderJob], output_dir: str) -> list[str]:
+    """Load a profile and save each render as an image.
+    This is designed to run in a worker process.
+
+    Returns:
+        List of the saved image paths.
+    """
+    profile = TrackingProfile.load(path)
+    renderer = ProfileRender(profile)
+
+    # Generate the image name prefix in the same format as the GUI
+    profile_safe = re.sub(r'[^\w_.)( -]', '', profile.name)
+    sort_key = f'{math.isqrt(round(profile.elapsed / UPDATES_PER_SECOND)):05}'
+    ticks_str = format_ticks(profile.elapsed, UPDATES_PER_SECOND)
+
+    saved: list[str] = []
+    for job in jobs:
+        request = job.layers[-1].request
+
+        if request.type == ipc.RenderType.KeyboardHeatmap:
+            array = renderer.request(request)
+        else:
+            layer_blend = renderer.layers(job.layers)
+            if layer_blend is None:
+                continue
+            array = layer_blend.to_uint8()
+
+        if not array.any():
+            print(f'[Render] No data available for {profile.name} - {job.name}')
+            continue
+
+        # Downscale from the sampled resolution
+        height, width = array.shape[:2]
+        target_width = round(width / (request.sampling or 1))
+        target_height = round(height / (request.sampling or 1))
+        im = Image.fromarray(np.ascontiguousarray(array))
+        im = im.resize((target_width, target_height), Image.Resampling.LANCZOS)
+
+        file_path = os.path.join(output_dir, f'{profile_safe} - {job.name} - {sort_key} - {ticks_str}.png')
+        im.save(file_path)
+        saved.append(file_path)
+
+    return saved
+
+
+def run(args: Sequence[str] | None = None) -> int:
+    """Run the render command.
+
+    Returns:
+        The exit code.
+    """
+    parsed = parse_args(args)
+
+    profiles = find_profiles(parsed.profiles)
+    if not profiles:
+        print('[Render] No matching profiles found', file=sys.stderr)
+        return 1
+
+    os.makedirs(parsed.output, exist_ok=True)
+    max_workers = min(len(profiles), parsed.jobs or os.cpu_count() or 1)
+
+    exit_code = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(render_profile, path, build_jobs(parsed, name), parsed.output): name
+                   for path, name in profiles.items()}
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                saved = future.result()
+            except Exception:  # pylint: disable=broad-exception-caught
+                print(f'[Render] Failed to render {name}', file=sys.stderr)
+                traceback.print_exc()
+                exit_code = 1
+            else:
+                for file_path in saved:
+                    print(f'[Render] Saved {file_path}')
+    return exit_code
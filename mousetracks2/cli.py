@@ -55,10 +55,16 @@ def parse_args(args: Sequence[str] | None = None, strict: bool = False) -> argpa
     parser.add_argument('--verify-executable', metavar='PATH', help=argparse.SUPPRESS)
 
     parser.add_argument('--debug-get-autostart', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--debug-record-input', default=None, help=argparse.SUPPRESS)
     parser.add_argument('--debug-remap-autostart', action='store_true', help=argparse.SUPPRESS)
 
+    parser.add_argument('command', nargs=argparse.REMAINDER, metavar='render ...',
+                        help='render profiles without launching the application, see "render -h"')
+
     if strict:
         result = parser.parse_args(args)
+        if result.command and result.command[0] != 'render':
+            parser.error(f'unrecognized command: {result.command[0]}')
     else:
         result, _unknown = parser.parse_known_args(args)
     return result
@@ -191,6 +197,7 @@ class CLI:
             self.post_install = False
             self.portable = False
             self.disable_temp_warning = False
+            self.record_input = None
 
         finally:
             self._soft_load = False
@@ -227,6 +234,8 @@ class CLI:
             self.portable = True
         if args.disable_temp_warning:
             self.disable_temp_warning = True
+        if args.debug_record_input is not None:
+            self.record_input = Path(args.debug_record_input)
 
         return args
 
@@ -407,6 +416,19 @@ class CLI:
         """Set if the temp drive warning is disabled."""
         self._set('MT_DISABLE_TMP_WARNING', bool2str(value))
 
+    @property
+    def record_input(self) -> Path | None:
+        """Get the path to record the tracking data to."""
+        record_input = self.env['MT_RECORD_INPUT']
+        if record_input:
+            return Path(record_input)
+        return None
+
+    @record_input.setter
+    def record_input(self, value: Path | None) -> None:
+        """Set the path to record the tracking data to."""
+        self._set('MT_RECORD_INPUT', str(value) if value else '')
+
 
 def run_cli_function(cli: CLI) -> bool:
     # pylint: disable=import-outside-toplevel
@@ -455,6 +477,10 @@ def run_cli_function(cli: CLI) -> bool:
             result = remap_autostart()
             print(f'Remapped autostart: {result}')
 
+        case argparse.Namespace(command=['render', *args]):
+            from .batch import run
+            sys.exit(run(args))
+
         case _:
             return False
     return True
@@ -16,29 +16,49 @@ import traceback
 import multiprocessing
 import multiprocessing.queues
 import queue
+from contextlib import suppress
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, Generic, TypeVar
+from multiprocessing.connection import Connection, wait
+from typing import TYPE_CHECKING, Any, Generic, TypeVar, cast
 
-from . import ipc
+from . import codec, ipc
+from .supervisor import ComponentSupervisor, StateCache
+from .tracing import stamp_forward
 from ..config import GlobalConfig
 from ..constants import UPDATES_PER_SECOND
 from ..exceptions import ExitRequest
 from ..gui.utils import should_minimise_on_start
 from ..runtime import IS_EXE
+from ..utils.shared_memory import RingBuffer, start_resource_tracker
 
 if TYPE_CHECKING:
     from multiprocessing.sharedctypes import Synchronized
+    from .abstract import Component
     from ..utils.system.windows import WindowHandle
 
 
 T = TypeVar('T')
 
+RING_BUFFER_BYTES_PER_POLL = 128
+"""Estimated size of the records written for each poll of input."""
+
+MAX_RING_BUFFER_SIZE = 0x4000000
+"""Maximum size of the ring buffer, as it's held in memory."""
+
 
 class Queue(multiprocessing.queues.Queue, Generic[T]):
     """Custom implementation of a queue to ensure `qsize()` works.
 
     If it is not available, then `multiprocessing.Value` will be used
     instead as the counter.
+
+    Frequently sent messages are converted to a compact binary format
+    before being added, and any others are pickled as normal. Because
+    of this, `bytes` objects cannot be sent directly.
+
+    Messages in the bulk lane are sent through a separate queue, and
+    are only read once the control lane is empty. This means a large
+    render can't delay something like a stop request.
     """
 
     @dataclass
@@ -48,8 +68,15 @@ class Queue(multiprocessing.queues.Queue, Generic[T]):
         original: Any
         counter: Synchronized[int]
         use_counter: bool
+        bulk: Queue | None
+
+    def __init__(self, lanes: bool = True) -> None:
+        """Create the queue.
 
-    def __init__(self) -> None:
+        Parameters:
+            lanes: Create a separate queue for the bulk lane.
+                If disabled, all messages share the same lane.
+        """
         self._use_custom_counter = False
         super().__init__(ctx=multiprocessing.get_context())
         try:
@@ -57,51 +84,156 @@ class Queue(multiprocessing.queues.Queue, Generic[T]):
         except NotImplementedError:
             self._use_custom_counter = True
         self._counter: Synchronized[int] = multiprocessing.Value('i', 0)
+        self._bulk: Queue[T] | None = Queue(lanes=False) if lanes else None
 
     def __getstate__(self) -> State:
-        return self.State(super().__getstate__(), self._counter, self._use_custom_counter)
+        return self.State(super().__getstate__(), self._counter, self._use_custom_counter, self._bulk)
 
     def __setstate__(self, state: State) -> None:
         self._counter = state.counter
         self._use_custom_counter = state.use_counter
+        self._bulk = state.bulk
         super().__setstate__(state.original)  # type: ignore
 
+    @property
+    def readers(self) -> list[Connection]:
+        """Get the connections that can be waited on for new items."""
+        if self._bulk is None:
+            return [self._reader]  # type: ignore[attr-defined]
+        return [self._reader, self._bulk._reader]  # type: ignore[attr-defined]  # pylint: disable=protected-access
+
+    def lane_sizes(self) -> tuple[int, int]:
+        """Get the size of the control and bulk lanes."""
+        if self._use_custom_counter:
+            control = self._counter.value
+        else:
+            control = super().qsize()
+        return control, 0 if self._bulk is None else self._bulk.qsize()
+
     def qsize(self) -> int:
         """Get the queue size."""
-        if self._use_custom_counter:
-            return self._counter.value
-        return super().qsize()
+        return sum(self.lane_sizes())
+
+    def empty(self) -> bool:
+        """Determine if both lanes are empty."""
+        return super().empty() and (self._bulk is None or self._bulk.empty())
 
     def put(self, obj: T, block: bool = True, timeout: float | None = None) -> Any:
         """Add an item to the queue."""
-        super().put(obj, block, timeout)
+        if self._bulk is not None and isinstance(obj, ipc.Message) and obj.lane == ipc.Lane.Bulk:
+            self._bulk.put(obj, block, timeout)
+            return
+
+        encoded = codec.encode(obj)
+        super().put(obj if encoded is None else encoded, block, timeout)
         if self._use_custom_counter:
             with self._counter.get_lock():
                 self._counter.value += 1
 
-    def get(self, block: bool = True, timeout: float | None = None) -> T:
-        """Get an item from the queue."""
+    def _get_control(self, block: bool, timeout: float | None) -> T:
+        """Get an item from the control lane."""
+        item = super().get(block, timeout)
         if self._use_custom_counter:
             with self._counter.get_lock():
                 self._counter.value -= 1
-        return super().get(block, timeout)
+        if isinstance(item, bytes):
+            return cast(T, codec.decode(item))
+        return item
+
+    def get(self, block: bool = True, timeout: float | None = None) -> T:
+        """Get an item from the queue.
+        The bulk lane is only read if the control lane is empty.
+        """
+        if self._bulk is None:
+            return self._get_control(block, timeout)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            # Each non-blocking read does a single poll of its lane
+            with suppress(queue.Empty):
+                return self._get_control(False, None)
+            with suppress(queue.Empty):
+                return self._bulk.get(False)
+            if not block:
+                raise queue.Empty
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise queue.Empty
+            wait(self.readers, remaining)
+
+    def close(self) -> None:
+        """Close both lanes."""
+        super().close()
+        if self._bulk is not None:
+            self._bulk.close()
+
+    def cancel_join_thread(self) -> None:
+        """Discard any data left in both lanes on exit."""
+        super().cancel_join_thread()
+        if self._bulk is not None:
+            self._bulk.cancel_join_thread()
 
 
 class Hub:
     """Set up individual components with queues for communication."""
 
-    def __init__(self, use_gui: bool = True) -> None:
-        """Initialise the hub with queues and processes."""
+    _q_tracking: Queue[ipc.Message]
+    _q_processing: Queue[ipc.Message]
+    _q_app_detection: Queue[ipc.Message]
+    _q_gui: Queue[ipc.Message]
+    _p_tracking: multiprocessing.Process
+    _p_processing: multiprocessing.Process
+    _p_app_detection: multiprocessing.Process
+    _p_gui: multiprocessing.Process
+
+    def __init__(self, use_gui: bool = True, tracking: type[Component] | None = None,
+                 gui: type[Component] | None = None) -> None:
+        """Initialise the hub with queues and processes.
+
+        Parameters:
+            use_gui: Launch the GUI component.
+            tracking: Component to launch instead of `Tracking`.
+                This is for sending generated data through the
+                application, such as when stress testing.
+            gui: Component to launch instead of `GUI`.
+                This is for reading the GUI data without a display.
+        """
         self.state = ipc.TrackingState.Paused
         self.use_gui = use_gui
+        self._tracking_component = tracking
+        self._gui_component = gui
         self._previous_component_check: float = 0.0
 
+        # Restart individual components if they fail
+        self._supervisors = {
+            ipc.Target.Tracking: ComponentSupervisor('Tracking'),
+            ipc.Target.Processing: ComponentSupervisor('Processing'),
+            ipc.Target.AppDetection: ComponentSupervisor('Application Detection'),
+            ipc.Target.GUI: ComponentSupervisor('GUI'),
+        }
+        self._state_cache = StateCache()
+        self._checkpoints: dict[int, list[ipc.Message]] = {}
+
         self._wait_to_load = {ipc.Target.AppDetection, ipc.Target.Tracking, ipc.Target.Processing}
         if self.use_gui:
             self._wait_to_load.add(ipc.Target.GUI)
 
         self._q_main: Queue[ipc.Message] = Queue()
 
+        # Every component must share the resource tracker to use shared memory
+        start_resource_tracker()
+
+        # Tracking sends most of the messages, so skip the hub and write directly
+        # Only control messages for the hub or other components go through `_q_main`
+        # It's sized to hold everything between autosaves, so a failed
+        # processing component can read it all again after restarting
+        polls = GlobalConfig.save_frequency * max(GlobalConfig.polling_rate, UPDATES_PER_SECOND)
+        self._ring_buffer = RingBuffer(size=min(MAX_RING_BUFFER_SIZE,
+                                                max(0x100000, int(polls * RING_BUFFER_BYTES_PER_POLL))))
+
         self._create_tracking_processes(first_run=True)
 
         # Disable show/hide if console is already hidden
@@ -184,32 +316,139 @@ class Hub:
         If these are shut down, then a new process needs to be created.
         """
         print('[Hub] Creating tracking processes...')
+        if first_run:
+            self._ring_buffer.reset_reader(ipc.Target.GUI)
+            if self.use_gui:
+                self._start_component(ipc.Target.GUI)
+            else:
+                self._q_gui = Queue()
+
+        self._ring_buffer.reset_reader(ipc.Target.Processing)
+        self._start_component(ipc.Target.Tracking)
+        self._start_component(ipc.Target.Processing)
+        self._start_component(ipc.Target.AppDetection)
+
+    def _start_component(self, target: int, restore: list[ipc.Message] | None = None) -> None:
+        """Create a new queue and process for a component.
+        Any ring buffer reader must be reset before this is called.
+        """
         from .app_detection import AppDetection
         from .gui import GUI
         from .processing import Processing
         from .tracking import Tracking
 
-        if first_run:
-            self._q_gui: Queue[ipc.Message] = Queue()
-            self._p_gui = multiprocessing.Process(target=GUI.launch, args=(self._q_main, self._q_gui))
-            self._p_gui.daemon = True
-            if self.use_gui:
-                self._p_gui.start()
-
-        self._q_tracking: Queue[ipc.Message] = Queue()
-        self._p_tracking = multiprocessing.Process(target=Tracking.launch, args=(self._q_main, self._q_tracking))
-        self._p_tracking.daemon = True
-        self._p_tracking.start()
+        process: multiprocessing.Process
+        match target:
+            case ipc.Target.Tracking:
+                tracking = self._tracking_component or Tracking
+                self._q_tracking = Queue(lanes=False)
+                process = self._p_tracking = multiprocessing.Process(
+                    target=tracking.launch, args=(self._q_main, self._q_tracking, self._ring_buffer,
+                                                  ipc.Target.Processing | ipc.Target.GUI, restore))
+
+            case ipc.Target.Processing:
+                self._q_processing = Queue()
+                process = self._p_processing = multiprocessing.Process(
+                    target=Processing.launch, args=(self._q_main, self._q_processing, self._ring_buffer, 0, restore))
+
+            case ipc.Target.AppDetection:
+                self._q_app_detection = Queue(lanes=False)
+                process = self._p_app_detection = multiprocessing.Process(
+                    target=AppDetection.launch, args=(self._q_main, self._q_app_detection, None, 0, restore))
+
+            case ipc.Target.GUI:
+                gui = self._gui_component or GUI
+                self._q_gui = Queue()
+                process = self._p_gui = multiprocessing.Process(
+                    target=gui.launch, args=(self._q_main, self._q_gui, self._ring_buffer, 0, restore))
+
+            case _:
+                raise NotImplementedError(target)
+
+        process.daemon = True
+        process.start()
+        self._supervisors[target].restarted()
+
+    def _get_process(self, target: int) -> multiprocessing.Process:
+        """Get the process of a component."""
+        match target:
+            case ipc.Target.Tracking:
+                return self._p_tracking
+            case ipc.Target.Processing:
+                return self._p_processing
+            case ipc.Target.AppDetection:
+                return self._p_app_detection
+            case ipc.Target.GUI:
+                return self._p_gui
+        raise NotImplementedError(target)
+
+    def _get_queue(self, target: int) -> Queue[ipc.Message]:
+        """Get the queue of a component."""
+        match target:
+            case ipc.Target.Tracking:
+                return self._q_tracking
+            case ipc.Target.Processing:
+                return self._q_processing
+            case ipc.Target.AppDetection:
+                return self._q_app_detection
+            case ipc.Target.GUI:
+                return self._q_gui
+        raise NotImplementedError(target)
+
+    def _restore_messages(self, target: int) -> list[ipc.Message]:
+        """Get the messages to restore the state of a restarted component."""
+        messages: list[ipc.Message] = []
+        running = self.state == ipc.TrackingState.Running
+
+        match target:
+            case ipc.Target.Tracking:
+                if running:
+                    messages.append(ipc.StartTracking())
+
+            case ipc.Target.GUI:
+                messages.append(ipc.AllComponentsLoaded())
+                messages.append(ipc.TrackingStarted() if running else ipc.PauseTracking())
+
+        # Processing will continue from its last save if possible
+        if target == ipc.Target.Processing:
+            replay = self._ring_buffer.rewind_reader(target)
+            if replay is None:
+                print('[Hub] Data since the last save is no longer available')
+            else:
+                print(f'[Hub] Continuing from the last save, {replay} messages will be read again')
+                return messages + self._checkpoints.get(target, []) + self._state_cache.restore_messages(target)
+        elif target == ipc.Target.GUI:
+            self._ring_buffer.reset_reader(target)
+
+        application = self._state_cache.application
+        if application is not None and target & (ipc.Target.Processing | ipc.Target.GUI):
+            messages.append(ipc.CurrentProfileChanged(application.name, application.process_id, application.rects))
+        return messages + self._state_cache.messages(target)
+
+    def _restart_component(self, target: int) -> None:
+        """Restart a single component that has failed."""
+        print(f'[Hub] Restarting {self._supervisors[target].name} component...')
+        previous_queue = self._get_queue(target)
+        self._start_component(target, self._restore_messages(target))
+
+        # Move over anything sent while the component was down
+        # The timeout allows the feeder thread to finish writing
+        new_queue = self._get_queue(target)
+        while True:
+            try:
+                new_queue.put(previous_queue.get(timeout=0.1))
+            except queue.Empty:
+                break
+        previous_queue.close()
+        previous_queue.cancel_join_thread()
 
-        self._q_processing: Queue[ipc.Message] = Queue()
-        self._p_processing = multiprocessing.Process(target=Processing.launch, args=(self._q_main, self._q_processing))
-        self._p_processing.daemon = True
-        self._p_processing.start()
+        self._process_message(ipc.ComponentRestarted(target))
 
-        self._q_app_detection: Queue[ipc.Message] = Queue()
-        self._p_app_detection = multiprocessing.Process(target=AppDetection.launch, args=(self._q_main, self._q_app_detection))
-        self._p_app_detection.daemon = True
-        self._p_app_detection.start()
+    def _is_supervised(self, target: int) -> bool:
+        """Determine if a component should be restarted if it fails."""
+        if target == ipc.Target.GUI:
+            return self.use_gui
+        return self.state == ipc.TrackingState.Running
 
     def _startup_tracking_processes(self) -> None:
         """Ensure the tracking processes exist.
@@ -254,17 +493,33 @@ class Hub:
                     raise ExitRequest
 
                 case ipc.Traceback():
-                    message.reraise()
+                    if message.source in self._supervisors and self._is_supervised(message.source):
+                        print(message.traceback)
+                        self._supervisors[message.source].fail()
+                    else:
+                        message.reraise()
+
+                case ipc.Checkpoint():
+                    self._checkpoints[message.source] = message.messages
+                    self._state_cache.clear_saved(message.source)
 
                 case ipc.DebugRaiseError():
                     raise RuntimeError('[Hub] Test Exception')
 
                 case ipc.RequestQueueSize():
-                    self._q_main.put(ipc.QueueSize(self._q_main.qsize(),
-                                                   self._q_tracking.qsize(),
-                                                   self._q_processing.qsize(),
-                                                   self._q_gui.qsize(),
-                                                   self._q_app_detection.qsize()))
+                    hub, hub_bulk = self._q_main.lane_sizes()
+                    tracking, tracking_bulk = self._q_tracking.lane_sizes()
+                    processing, processing_bulk = self._q_processing.lane_sizes()
+                    gui, gui_bulk = self._q_gui.lane_sizes()
+                    app_detection, app_detection_bulk = self._q_app_detection.lane_sizes()
+                    sizes = ipc.QueueSize(
+                        hub, tracking,
+                        processing + self._ring_buffer.lag(ipc.Target.Processing),
+                        gui + self._ring_buffer.lag(ipc.Target.GUI),
+                        app_detection, hub_bulk, tracking_bulk, processing_bulk, gui_bulk, app_detection_bulk,
+                    )
+                    sizes.target = message.source
+                    self._q_main.put(sizes)
 
                 case ipc.ToggleConsole():
                     self._toggle_console(message.show)
@@ -273,13 +528,18 @@ class Hub:
                     self._q_main.put(ipc.SendPID(source=ipc.Target.Hub, pid=os.getpid()))
 
                 case ipc.ComponentLoaded():
-                    self._wait_to_load.discard(message.component)
-                    if not self._wait_to_load:
-                        self._q_main.put(ipc.AllComponentsLoaded())
+                    if message.component in self._wait_to_load:
+                        self._wait_to_load.discard(message.component)
+                        if not self._wait_to_load:
+                            self._q_main.put(ipc.AllComponentsLoaded())
 
                 case ipc.AllComponentsLoaded():
                     self.start_tracking()
 
+        if message.target & ~ipc.Target.Hub:
+            stamp_forward(message)
+            self._state_cache.update(message, self._ring_buffer.count)
+
         # Forward messages to the tracking process
         if message.target & ipc.Target.Tracking:
             self._q_tracking.put(message)
@@ -313,25 +573,37 @@ class Hub:
         else:
             handle.hide()
 
-    def _test_components(self) -> None:
+    def _supervise_components(self) -> None:
         """Check that all components are running.
-        If this fails an error will be raised.
+        Any that have failed will be restarted after a delay, and if
+        they keep failing then an error will be raised.
         """
         current_time = time.time()
         if self._previous_component_check + GlobalConfig.component_check_frequency > current_time:
             return
-
-        if self.state == ipc.TrackingState.Running:
-            if not self._p_tracking.is_alive():
-                raise RuntimeError('[Hub] Unexpected shutdown of Tracking component')
-            if not self._p_processing.is_alive():
-                raise RuntimeError('[Hub] Unexpected shutdown of Processing component')
-            if not self._p_app_detection.is_alive():
-                raise RuntimeError('[Hub] Unexpected shutdown of Application Detection component')
-            if self.use_gui and not self._p_gui.is_alive():
-                raise RuntimeError('[Hub] Unexpected shutdown of GUI component')
         self._previous_component_check = current_time
 
+        for target, supervisor in self._supervisors.items():
+            if not self._is_supervised(target):
+                continue
+            process = self._get_process(target)
+
+            if not supervisor.failed:
+                if not process.is_alive():
+                    supervisor.fail()
+                continue
+
+            # Give the component a chance to shut down by itself
+            if process.is_alive():
+                if not supervisor.should_terminate():
+                    continue
+                print(f'[Hub] {supervisor.name} component did not shut down, terminating...')
+                process.terminate()
+
+            if supervisor.should_restart():
+                process.join()
+                self._restart_component(target)
+
     def run(self) -> None:
         """Setup the tracking."""
         print('[Hub] Launching application...')
@@ -345,9 +617,13 @@ class Hub:
             # Listen for events
             print('[Hub] Queue handler started.')
             while running or not self._q_main.empty():
-                self._test_components()
+                if running:
+                    self._supervise_components()
                 try:
-                    self._process_message(self._q_main.get())
+                    self._process_message(self._q_main.get(timeout=GlobalConfig.component_check_frequency))
+
+                except queue.Empty:
+                    pass
 
                 except ExitRequest:
                     print('[Hub] Exit requested, triggering shut down...')
@@ -373,7 +649,7 @@ class Hub:
                     self._p_gui.join()
                     print('[Hub] GUI shut down')
                 self._q_gui.cancel_join_thread()
-
+            self._ring_buffer.close()
 
         print('[Hub] Application exit')
 
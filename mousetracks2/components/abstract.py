@@ -1,33 +1,71 @@
+from __future__ import annotations
+
 import multiprocessing
 import os
+import queue
 import time
 import traceback
-from typing import TYPE_CHECKING, Callable, Iterator
+from collections import deque
+from multiprocessing.connection import wait
+from typing import TYPE_CHECKING, Any, Callable, Iterator
 
 import psutil
 
-from . import ipc
+from . import codec, ipc
+from .tracing import TRACER
 from ..constants import DEFAULT_PROFILE_NAME
 from ..context import CTX
 from ..exceptions import ExitRequest
 from ..types import RectList, Application
+from ..utils.histogram import Histogram
 from ..utils.math import calculate_line
 from ..utils.monitor import MonitorData
-from ..utils.system import UserResizeAppListener
+from ..utils.shared_memory import RING_WAIT_LIMIT, RingBuffer, RingBufferReader
+from ..utils.system import UserResizeAppListener, notify_on_parent_exit
 from ..utils.system.base import EventListener
 
 if TYPE_CHECKING:
-    import multiprocessing.queues
+    from . import Queue
+
+
+HUB_CHECK_INTERVAL = 1.0
+"""Maximum number of seconds between checks if the Hub is running."""
 
 
 class Component:
-    def __init__(self, q_send: multiprocessing.queues.Queue, q_receive: multiprocessing.queues.Queue) -> None:
+    def __init__(self, q_send: Queue, q_receive: Queue, ring_buffer: RingBuffer | None = None,
+                 ring_buffer_targets: int = 0, restore: list[ipc.Message] | None = None) -> None:
+        """Setup the component.
+
+        Parameters:
+            q_send: Queue to send messages to the Hub.
+            q_receive: Queue to receive messages from the Hub.
+            ring_buffer: Shared ring buffer created by the Hub.
+            ring_buffer_targets: Write messages for these targets to the
+                ring buffer instead of sending them through the Hub.
+                If not set, then messages for this component will be
+                read from the ring buffer.
+            restore: Messages to process before anything else.
+                This is used to restore the state after a restart.
+        """
+        self._parent_pid = os.getppid()
+        self._hub_exited = False
+        self._hub_check_time = 0.0
+        if notify_on_parent_exit(self._on_hub_exit) and os.getppid() != self._parent_pid:
+            self._hub_exited = True
+
         self._q_send = q_send
         self._q_recv = q_receive
+        self._ring_buffer = ring_buffer
+        self._ring_buffer_targets = ring_buffer_targets
+        self._ring_buffer_reader: RingBufferReader | None = None
+        self._ring_buffer_dropped = 0
+        self._restore = deque(restore or ())
         self.name = type(self).__name__
         self._register_mixin()
         self.__post_init__()
-        self._parent_pid = os.getppid()
+        if self._ring_buffer is not None and not ring_buffer_targets:
+            self._ring_buffer_reader = self._ring_buffer.reader(self.target)
 
     def _register_mixin(self) -> None:
         """Subclass to implement custom mixin code."""
@@ -61,31 +99,127 @@ class Component:
             case _:
                 raise NotImplementedError(self.name)
 
+    def _on_hub_exit(self) -> None:
+        """Run when notified that the Hub has exited."""
+        self._hub_exited = True
+
     def is_hub_running(self) -> bool:
         """Determine if the Hub is still running.
         If it is not running, then attempting to read from a queue will
         lock the entire process.
+
+        This is called for every message, so it only uses the result of
+        the parent exit notification or the parent sentinel if either
+        are available. As a fallback, the process ID is checked at most
+        once every `HUB_CHECK_INTERVAL` seconds.
         """
-        return psutil.pid_exists(self._parent_pid)
+        if self._hub_exited:
+            return False
+
+        now = time.monotonic()
+        if now >= self._hub_check_time:
+            self._hub_check_time = now + HUB_CHECK_INTERVAL
+            if not psutil.pid_exists(self._parent_pid):
+                self._hub_exited = True
+                return False
+        return True
 
     def send_data(self, message: ipc.Message) -> None:
-        self._q_send.put(message)
+        """Send a message to other components.
+
+        If every target reads from the ring buffer, then the message
+        skips the Hub and is written straight to the buffer.
+        """
+        if TRACER.enabled or message.trace is not None:
+            TRACER.stamp(message)
+        if self._ring_buffer_targets and not message.target & ~self._ring_buffer_targets:
+            self._ring_buffer.write(codec.dumps(message), message.target)  # type: ignore[union-attr]
+        else:
+            self._q_send.put(message)
+
+    def checkpoint(self, *messages: ipc.Message) -> None:
+        """Mark everything read from the ring buffer so far as saved.
+        If the component is restarted, it will continue reading from
+        this point, after processing `messages` to restore its state.
+        """
+        if self._ring_buffer_reader is not None:
+            self._ring_buffer_reader.checkpoint()
+            self.send_data(ipc.Checkpoint(self.target, list(messages)))
+
+    def _read_ring_buffer(self, limit: int | None = None) -> Iterator[ipc.Message]:
+        """Read any messages from the ring buffer.
+        If `limit` is set, then only read up to that record.
+        """
+        if self._ring_buffer_reader is None:
+            return
+        for data in self._ring_buffer_reader.read(limit):
+            message = codec.decode(data)
+            if TRACER.enabled:
+                TRACER.received(message)
+            yield message
+
+        dropped = self._ring_buffer_reader.dropped
+        if dropped != self._ring_buffer_dropped:
+            print(f'[{self.name}] Ring buffer overflowed, {dropped - self._ring_buffer_dropped} messages dropped')
+            self._ring_buffer_dropped = dropped
+
+    def _wait_for_data(self, timeout: float | None) -> None:
+        """Wait until there is data to read, or the timeout is reached.
+
+        The parent sentinel is included so that the wait ends as soon
+        as the Hub exits. It is not reliable if the other components
+        were forked from the Hub, as they will hold the pipe open, so
+        the wait is also limited to `HUB_CHECK_INTERVAL`, which is the
+        longest it takes `is_hub_running` to detect the exit.
+
+        When waiting on the ring buffer, the wait is limited further to
+        `RING_WAIT_LIMIT`, as the writer may miss the request to wake up.
+        """
+        if timeout is None or timeout > HUB_CHECK_INTERVAL:
+            timeout = HUB_CHECK_INTERVAL
 
-    def receive_data(self, polling_rate: float = 0.0) -> Iterator[ipc.Message]:
+        handles: list[Any] = list(self._q_recv.readers)
+        parent = multiprocessing.parent_process()
+        if parent is not None:
+            handles.append(parent.sentinel)
+
+        reader = self._ring_buffer_reader
+        if reader is not None and reader.wake_connection is not None:
+            if not reader.prepare_wait():
+                return
+            handles.append(reader.wake_connection)
+            timeout = min(timeout, RING_WAIT_LIMIT)
+
+        try:
+            if parent is not None and parent.sentinel in wait(handles, timeout):
+                self._hub_exited = True
+        finally:
+            if reader is not None:
+                reader.finish_wait()
+
+    def receive_data(self, timeout: float | None = 0.0) -> Iterator[ipc.Message]:
         """Receive any available data as an iterator.
 
         Parameters:
-            polling_rate: Wait for more data instead of returning.
-                If this is set, then the loop will continue, waiting for
-                this amount of time before checking for more items.
-                If not set, then the loop will run once.
-
-        This does not use timeouts, as the Hub process shutting down
-        would cause locks if a read was mid-timeout. Instead, a check
-        is first done to ensure the Hub is still running, then a check
-        is done if the queue is empty or not. The Hub check is done per
-        queue item so that a backlog of commands won't cause issues.
+            timeout: Wait for more data instead of returning.
+                If `None`, then the loop will continue forever, waking
+                up as soon as any data is available.
+                If set, then it will wait for up to that many seconds in
+                total before returning.
+                If 0, then it will return once there is no data left.
+
+        Reading from the queue with a timeout is avoided, as the Hub
+        process shutting down would cause locks if a read was
+        mid-timeout. Instead, a check is first done to ensure the Hub is
+        still running, then the queue is read without blocking.
+        The Hub check is done per queue item so that a backlog of
+        commands won't cause issues, and is cheap enough to do so.
+
+        Anything in the ring buffer is read before each queue item.
+        Messages to restore the state are read before either, unless
+        they need to wait for the ring buffer to catch up.
         """
+        deadline = None if timeout is None else time.perf_counter() + timeout
         while True:
             # Trigger an emergecy shutdown if the hub is not running
             if not self.is_hub_running():
@@ -94,26 +228,55 @@ class Component:
                 self._q_recv.close()
                 self._q_send.cancel_join_thread()
                 self._q_recv.cancel_join_thread()
+                if self._ring_buffer is not None:
+                    self._ring_buffer.close()
+                    self._ring_buffer = self._ring_buffer_reader = None
                 yield ipc.Exit()
                 return
 
-            # Check if the queue is empty
-            if self._q_recv.empty():
-                if not polling_rate:
-                    return
-                time.sleep(polling_rate)
-                continue
+            if self._restore:
+                message = self._restore.popleft()
+
+                # Catch up to where the message was originally received
+                if isinstance(message, ipc.Restore):
+                    yield from self._read_ring_buffer(message.count)
+                    message = message.message
 
-            # Read from the queue
-            message = self._q_recv.get()
+            else:
+                yield from self._read_ring_buffer()
+
+                # Read from the queue, or wait for data if it's empty
+                try:
+                    message = self._q_recv.get(block=False)
+                except queue.Empty:
+                    if deadline is None:
+                        self._wait_for_data(None)
+                        continue
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        return
+                    self._wait_for_data(remaining)
+                    continue
+
+                if TRACER.enabled:
+                    TRACER.received(message)
 
             # Intercept message if required, otherwise yield
             match message:
                 case ipc.RequestPID():
                     self.send_data(ipc.SendPID(source=self.target, pid=os.getpid()))
+                case ipc.DebugSetTracing():
+                    print(f'[{self.name}] Message tracing {"enabled" if message.enable else "disabled"}.')
+                    TRACER.enable(message.enable)
+                case ipc.DebugRequestTraceStats():
+                    self.send_data(ipc.DebugTraceStats(self.target, self.trace_histograms()))
                 case _:
                     yield message
 
+    def trace_histograms(self) -> dict[tuple[str, str], Histogram]:
+        """Get the histograms to send when tracing results are requested."""
+        return TRACER.histograms
+
     def run(self) -> None:
         """Run the component."""
 
@@ -123,17 +286,18 @@ class Component:
         """
 
     @classmethod
-    def launch(cls, q_send: multiprocessing.queues.Queue, q_receive: multiprocessing.queues.Queue) -> None:
+    def launch(cls, q_send: Queue, q_receive: Queue, ring_buffer: RingBuffer | None = None,
+               ring_buffer_targets: int = 0, restore: list[ipc.Message] | None = None) -> None:
         # Attempt to initialise the class
         try:
-            self = cls(q_send, q_receive)
+            self = cls(q_send, q_receive, ring_buffer, ring_buffer_targets, restore)
 
         # If an error happens on load, then stop here
-        # A shutdown is triggered for all other components
+        # The Hub will restart the component after a delay
         except Exception as e:  # pylint: disable=broad-exception-caught
-            q_send.put(ipc.Traceback(e, traceback.format_exc()))
             self = Component(q_send, q_receive)
             self.name = cls.__name__
+            q_send.put(ipc.Traceback(e, traceback.format_exc(), self.target))
             print(f'[{self.name}] Error shut down: {e}')
 
         # Run the component with extra error handling
@@ -154,7 +318,7 @@ class Component:
 
             except Exception as e:  # pylint: disable=broad-exception-caught
                 print(f'[{self.name}] Error shut down: {e}')
-                q_send.put(ipc.Traceback(e, traceback.format_exc()))
+                q_send.put(ipc.Traceback(e, traceback.format_exc(), self.target))
 
             finally:
                 self.on_exit()
@@ -222,8 +386,18 @@ class MonitorComponent(Component):
 
     _monitor_data: MonitorData
 
+    def __init__(self, *args: Any, monitor_data: MonitorData | None = None, **kwargs: Any) -> None:
+        """Setup the component.
+
+        Parameters:
+            monitor_data: Monitor layout to start with.
+                If not set, then the current layout is loaded.
+        """
+        self.__initial_monitor_data = monitor_data
+        super().__init__(*args, **kwargs)
+
     def _register_mixin(self) -> None:
-        self._monitor_data = MonitorData()
+        self._monitor_data = self.__initial_monitor_data or MonitorData()
         super()._register_mixin()
 
     def __focused_app_rects(self) -> RectList:
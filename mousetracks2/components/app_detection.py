@@ -8,6 +8,7 @@ import psutil
 
 from . import ipc
 from .abstract import Component
+from .tracing import trace_handler
 from ..applications import AppList, LOCAL_PATH
 from ..constants import APP_BORDER_TOLERANCE, DEFAULT_PROFILE_NAME, TRACKING_IGNORE
 from ..exceptions import ExitRequest
@@ -175,6 +176,7 @@ class AppDetection(Component):
         if focus_changed:
             self.send_data(ipc.ApplicationFocusChanged(exe, title, current_app is not None))
 
+    @trace_handler
     def _process_message(self, message: ipc.Message) -> None:
         """Process an item of data."""
         match message:
@@ -193,5 +195,5 @@ class AppDetection(Component):
 
     def run(self) -> None:
         """Listen for events to process."""
-        for message in self.receive_data(polling_rate=0.25):
+        for message in self.receive_data(timeout=None):
             self._process_message(message)
@@ -0,0 +1,324 @@
+"""Compact binary encoding for the most frequently sent messages.
+
+Pickling a message stores its full class path and a dict of its
+fields, which is a lot of overhead for something as small as a mouse
+position. The messages sent every tick are instead packed into a type
+ID followed by a fixed struct layout.
+
+Any message without an encoding is left as it is, and will be pickled
+by the queue as normal.
+
+Neither the struct layouts nor the pickled messages include the trace
+stamps, so traced messages are wrapped with the stamps in front.
+"""
+
+import pickle
+import struct
+from functools import lru_cache
+from typing import Any, Callable, TypeVar
+
+from . import ipc
+
+
+MessageT = TypeVar('MessageT', bound=ipc.Message)
+
+Encoder = Callable[[Any], bytes]
+
+Decoder = Callable[[memoryview], ipc.Message]
+
+_ENCODERS: dict[type[ipc.Message], Encoder] = {}
+
+_DECODERS: dict[int, Decoder] = {}
+
+_TYPE_ID = struct.Struct('<B')
+
+_PICKLE_TYPE_ID = 0
+
+_TRACE_TYPE_ID = 255
+
+
+def register(message_type: type[MessageT], type_id: int,
+             encoder: Callable[[MessageT], bytes], decoder: Callable[[memoryview], MessageT]) -> None:
+    """Register an encoding for a message type.
+
+    Parameters:
+        message_type: The exact class to encode.
+        type_id: Unique ID stored as the first byte of the data.
+        encoder: Convert a message to bytes, excluding the type ID.
+        decoder: Convert the bytes back to a message.
+    """
+    if type_id in _DECODERS or type_id in (_PICKLE_TYPE_ID, _TRACE_TYPE_ID):
+        raise ValueError(f'type ID {type_id} is already registered')
+    prefix = _TYPE_ID.pack(type_id)
+    _ENCODERS[message_type] = lambda message: prefix + encoder(message)
+    _DECODERS[type_id] = decoder
+
+
+def register_struct(message_type: type[MessageT], type_id: int, fmt: str,
+                    to_tuple: Callable[[MessageT], tuple[Any, ...]],
+                    from_tuple: Callable[..., MessageT]) -> None:
+    """Register an encoding for a message with a fixed layout.
+
+    Parameters:
+        message_type: The exact class to encode.
+        type_id: Unique ID stored as the first byte of the data.
+        fmt: Struct format of the values.
+        to_tuple: Get the values to pack from the message.
+        from_tuple: Create the message from the unpacked values.
+    """
+    packer = struct.Struct(fmt)
+    register(message_type, type_id,
+             lambda message: packer.pack(*to_tuple(message)),
+             lambda data: from_tuple(*packer.unpack(data)))
+
+
+def _encode(message: object) -> bytes | None:
+    """Encode a message without its trace stamps."""
+    encoder = _ENCODERS.get(type(message))  # type: ignore[arg-type]
+    if encoder is None:
+        return None
+    return encoder(message)
+
+
+def _dumps(message: object) -> bytes:
+    """Encode any message without its trace stamps."""
+    encoded = _encode(message)
+    if encoded is None:
+        return _TYPE_ID.pack(_PICKLE_TYPE_ID) + pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    return encoded
+
+
+def encode(message: object) -> bytes | None:
+    """Encode a message.
+    Returns `None` if there is no encoding for its type and it is not
+    being traced.
+    """
+    trace = getattr(message, 'trace', None)
+    if trace is None:
+        return _encode(message)
+    num_stamps = len(trace)
+    return (_TYPE_ID.pack(_TRACE_TYPE_ID) + _struct(f'<B{num_stamps}d').pack(num_stamps, *trace)
+            + _dumps(message))
+
+
+def dumps(message: ipc.Message) -> bytes:
+    """Encode any message, pickling it if there is no encoding."""
+    encoded = encode(message)
+    if encoded is None:
+        return _dumps(message)
+    return encoded
+
+
+def decode(data: bytes | memoryview) -> ipc.Message:
+    """Decode a message."""
+    view = memoryview(data)
+    type_id = view[0]
+    if type_id == _PICKLE_TYPE_ID:
+        return pickle.loads(view[1:])
+    if type_id == _TRACE_TYPE_ID:
+        num_stamps = view[1]
+        message = decode(view[2 + num_stamps * 8:])
+        message.trace = list(_struct(f'<{num_stamps}d').unpack_from(view, 2))
+        return message
+    return _DECODERS[type_id](view[1:])
+
+
+def _encode_str(text: str) -> bytes:
+    """Encode a string with its length."""
+    data = text.encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+
+def _decode_str(data: memoryview, offset: int) -> tuple[str, int]:
+    """Decode a string, and get the offset after it."""
+    length, = struct.unpack_from('<H', data, offset)
+    offset += 2
+    return str(data[offset:offset + length], 'utf-8'), offset + length
+
+
+def _encode_data_transfer(message: ipc.DataTransfer) -> bytes:
+    return _encode_str(message.mac_address) + struct.pack('<qq', message.bytes_sent, message.bytes_recv)
+
+
+def _decode_data_transfer(data: memoryview) -> ipc.DataTransfer:
+    mac_address, offset = _decode_str(data, 0)
+    bytes_sent, bytes_recv = struct.unpack_from('<qq', data, offset)
+    return ipc.DataTransfer(mac_address, bytes_sent, bytes_recv)
+
+
+@lru_cache(maxsize=256)
+def _struct(fmt: str) -> struct.Struct:
+    """Get a cached struct for a variable length format."""
+    return struct.Struct(fmt)
+
+
+_TICK_BATCH_HEADER = struct.Struct('<qqIHqqqB6H')
+
+_TICK_BATCH_MOUSE = 1 << 0
+
+_TICK_BATCH_CLICK = 1 << 1
+
+_TICK_BATCH_PROFILE = 1 << 2
+
+
+@lru_cache(maxsize=256)
+def _tick_batch_layout(flags: int, num_clicks: int, num_keys: int, num_buttons: int,
+                       num_thumbsticks: int, name_length: int) -> struct.Struct:
+    """Get the struct to pack the events of a tick batch with.
+    Everything except network transfers is packed in a single call.
+    """
+    fmt = '<'
+    if flags & _TICK_BATCH_MOUSE:
+        fmt += '2i'
+    if flags & _TICK_BATCH_CLICK:
+        fmt += '2i'
+    return struct.Struct(f'{fmt}{num_clicks}i{num_clicks}I{num_keys}i{num_keys}I'
+                         f'{num_buttons}B{num_buttons}I{num_buttons}I'
+                         f'{num_thumbsticks}B{num_thumbsticks}B{num_thumbsticks * 2}d{name_length}s')
+
+
+def _encode_tick_batch(message: ipc.TickBatch) -> bytes:
+    flags = 0
+    positions: list[int] = []
+    if message.mouse_position is not None:
+        flags |= _TICK_BATCH_MOUSE
+        positions.extend(message.mouse_position)
+    if message.click_position is not None:
+        flags |= _TICK_BATCH_CLICK
+        positions.extend(message.click_position)
+    name = b''
+    if message.profile_name is not None:
+        flags |= _TICK_BATCH_PROFILE
+        name = message.profile_name.encode('utf-8')
+
+    num_clicks = len(message.click_buttons)
+    num_keys = len(message.keycodes)
+    num_buttons = len(message.button_keycodes)
+    num_thumbsticks = len(message.thumbstick_positions)
+    num_transfers = len(message.transfer_addresses)
+    layout = _tick_batch_layout(flags, num_clicks, num_keys, num_buttons, num_thumbsticks, len(name))
+
+    data = _TICK_BATCH_HEADER.pack(message.tick, message.timestamp, message.ticks, message.rate, message.poll,
+                                   message.active, message.inactive, flags, num_clicks, num_keys,
+                                   num_buttons, num_thumbsticks, num_transfers, len(name))
+    data += layout.pack(*positions, *message.click_buttons, *message.click_held,
+                        *message.keycodes, *message.keys_held,
+                        *message.button_gamepads, *message.button_keycodes, *message.buttons_held,
+                        *message.thumbstick_gamepads, *message.thumbstick_sides,
+                        *(value for position in message.thumbstick_positions for value in position), name)
+
+    for mac_address, bytes_sent, bytes_recv in zip(message.transfer_addresses, message.transfer_sent,
+                                                   message.transfer_recv):
+        data += _encode_str(mac_address) + struct.pack('<qq', bytes_sent, bytes_recv)
+    return data
+
+
+def _decode_tick_batch(data: memoryview) -> ipc.TickBatch:
+    (tick, timestamp, ticks, rate, poll, active, inactive, flags, num_clicks, num_keys,
+     num_buttons, num_thumbsticks, num_transfers, name_length) = _TICK_BATCH_HEADER.unpack_from(data)
+    layout = _tick_batch_layout(flags, num_clicks, num_keys, num_buttons, num_thumbsticks, name_length)
+    values = layout.unpack_from(data, _TICK_BATCH_HEADER.size)
+
+    i = 0
+    mouse_position = click_position = profile_name = None
+    if flags & _TICK_BATCH_MOUSE:
+        mouse_position = values[0:2]
+        i = 2
+    if flags & _TICK_BATCH_CLICK:
+        click_position = values[i:i + 2]
+        i += 2
+    if flags & _TICK_BATCH_PROFILE:
+        profile_name = str(values[-1], 'utf-8')
+
+    # Most batches only have a few kinds of event, so skip slicing the rest
+    click_buttons: list[int] = []
+    click_held: list[int] = []
+    if num_clicks:
+        click_buttons = list(values[i:i + num_clicks])
+        click_held = list(values[i + num_clicks:i + num_clicks * 2])
+        i += num_clicks * 2
+
+    keycodes: list[int] = []
+    keys_held: list[int] = []
+    if num_keys:
+        keycodes = list(values[i:i + num_keys])
+        keys_held = list(values[i + num_keys:i + num_keys * 2])
+        i += num_keys * 2
+
+    button_gamepads: list[int] = []
+    button_keycodes: list[int] = []
+    buttons_held: list[int] = []
+    if num_buttons:
+        button_gamepads = list(values[i:i + num_buttons])
+        button_keycodes = list(values[i + num_buttons:i + num_buttons * 2])
+        buttons_held = list(values[i + num_buttons * 2:i + num_buttons * 3])
+        i += num_buttons * 3
+
+    thumbstick_gamepads: list[int] = []
+    thumbstick_sides: list[int] = []
+    thumbstick_positions: list[tuple[float, float]] = []
+    if num_thumbsticks:
+        thumbstick_gamepads = list(values[i:i + num_thumbsticks])
+        thumbstick_sides = list(values[i + num_thumbsticks:i + num_thumbsticks * 2])
+        positions = values[i + num_thumbsticks * 2:i + num_thumbsticks * 4]
+        thumbstick_positions = list(zip(positions[::2], positions[1::2]))
+
+    transfer_addresses: list[str] = []
+    transfer_sent: list[int] = []
+    transfer_recv: list[int] = []
+    offset = _TICK_BATCH_HEADER.size + layout.size
+    for _ in range(num_transfers):
+        mac_address, offset = _decode_str(data, offset)
+        bytes_sent, bytes_recv = struct.unpack_from('<qq', data, offset)
+        offset += 16
+        transfer_addresses.append(mac_address)
+        transfer_sent.append(bytes_sent)
+        transfer_recv.append(bytes_recv)
+
+    # Pass every field so that none of the default factories are called
+    return ipc.TickBatch(tick, timestamp, ticks, rate, poll, mouse_position, click_position,  # type: ignore[arg-type]
+                         click_buttons, click_held, keycodes, keys_held,
+                         button_gamepads, button_keycodes, buttons_held,
+                         thumbstick_gamepads, thumbstick_sides, thumbstick_positions,
+                         transfer_addresses, transfer_sent, transfer_recv, profile_name, active, inactive)
+
+
+register_struct(ipc.Tick, 1, '<qqIHq',
+                lambda message: (message.tick, message.timestamp, message.ticks, message.rate, message.poll),
+                ipc.Tick)
+
+register_struct(ipc.MouseMove, 2, '<ii',
+                lambda message: message.position,
+                lambda x, y: ipc.MouseMove((x, y)))
+
+register_struct(ipc.MouseClick, 3, '<iii',
+                lambda message: (message.button, *message.position),
+                lambda button, x, y: ipc.MouseClick(button, (x, y)))
+
+register_struct(ipc.MouseHeld, 4, '<iiiI',
+                lambda message: (message.button, *message.position, message.ticks),
+                lambda button, x, y, ticks: ipc.MouseHeld(button, (x, y), ticks))
+
+register_struct(ipc.KeyPress, 5, '<i',
+                lambda message: (message.keycode,),
+                ipc.KeyPress)
+
+register_struct(ipc.KeyHeld, 6, '<iI',
+                lambda message: (message.keycode, message.ticks),
+                ipc.KeyHeld)
+
+register_struct(ipc.ButtonPress, 7, '<BI',
+                lambda message: (message.gamepad, message.keycode),
+                ipc.ButtonPress)
+
+register_struct(ipc.ButtonHeld, 8, '<BII',
+                lambda message: (message.gamepad, message.keycode, message.ticks),
+                ipc.ButtonHeld)
+
+register_struct(ipc.ThumbstickMove, 9, '<BBdd',
+                lambda message: (message.gamepad, message.thumbstick.value, *message.position),
+                lambda gamepad, side, x, y: ipc.ThumbstickMove(gamepad, ipc.ThumbstickMove.Thumbstick(side), (x, y)))
+
+register(ipc.DataTransfer, 10, _encode_data_transfer, _decode_data_transfer)
+
+register(ipc.TickBatch, 11, _encode_tick_batch, _decode_tick_batch)
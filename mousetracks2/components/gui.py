@@ -1,5 +1,4 @@
 import sys
-import time
 from typing import cast
 
 from PySide6 import QtCore, QtGui, QtWidgets
@@ -14,7 +13,7 @@ from ..utils.system import prepare_application_icon
 
 
 class QueueWorker(QtCore.QObject):
-    """Worker for polling the queue in a background thread."""
+    """Worker for reading the queue in a background thread."""
 
     message_received = QtCore.Signal(ipc.Message)
     ready = QtCore.Signal()
@@ -25,9 +24,11 @@ class QueueWorker(QtCore.QObject):
         self.running = True
 
     def run(self) -> None:
-        """Continuously poll the queue for messages."""
-        while True:
-            for message in self.component.receive_data():
+        """Continuously read the queue for messages.
+        The timeout is only to check if the worker has been stopped.
+        """
+        while self.running:
+            for message in self.component.receive_data(timeout=0.5):
                 self.message_received.emit(message)
                 match message:
                     case ipc.Exit():
@@ -35,11 +36,6 @@ class QueueWorker(QtCore.QObject):
                     case ipc.AllComponentsLoaded():
                         self.ready.emit()
 
-            time.sleep(0.01)
-
-            if not self.running:
-                break
-
     def stop(self) -> None:
         """Stop the worker."""
         self.running = False
@@ -1,16 +1,19 @@
 """Standard format for data to be sent through communication queues."""
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from enum import Enum, auto
-from typing import Literal
+from typing import Any, ClassVar, Hashable, Iterator, Literal
 
 import numpy as np
 import numpy.typing as npt
 
 from ..config import ProfileConfig
+from ..constants import UPDATES_PER_SECOND
 from ..enums import BlendMode, Channel
 from ..types import RectList
+from ..utils.histogram import Histogram
 from ..utils.monitor import MonitorData
+from ..utils.shared_memory import SharedArray
 
 
 class Target:
@@ -23,6 +26,15 @@ class Target:
     AppDetection = 2 ** 4
 
 
+class Lane:
+    """Priority lanes of a queue.
+    The control lane is always read before the bulk lane.
+    """
+
+    Control = 0
+    Bulk = 1
+
+
 class RenderType(Enum):
     """Possible types of renders."""
 
@@ -52,7 +64,7 @@ class TrackingState(Enum):
     Stopped = auto()
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     """Represents an item to be passed through a communication queue.
 
@@ -60,29 +72,73 @@ class Message:
         target: The intended recipient component of the message.
         type: The type of message being sent.
         data: Optional data payload associated with the message.
+
+    The most frequently sent messages use `slots=True` to avoid
+    creating a `__dict__` for every instance. They can't be frozen, as
+    a frozen dataclass can't inherit from this.
+
+    Messages with large payloads should set `lane` to `Lane.Bulk`.
+
+    If tracing is enabled, `trace` holds the time the message was sent,
+    followed by the time the Hub forwarded it. A default factory is
+    used, as subclasses without slots would otherwise not set it.
     """
 
     target: int = field(default=0)
+    trace: list[float] | None = field(default_factory=lambda: None, init=False, repr=False, compare=False)
+    lane: ClassVar[int] = Lane.Control
 
 
-@dataclass
+_INIT_FIELD_NAMES: dict[type[Message], tuple[str, ...]] = {}
+
+
+def _reduce_message(message: Message) -> tuple[type[Message], tuple[Any, ...]]:
+    """Pickle a message as its class and `__init__` arguments.
+    This skips the field names and the `target` value, making it
+    smaller than the default pickle of a dataclass.
+    """
+    message_type = type(message)
+    try:
+        names = _INIT_FIELD_NAMES[message_type]
+    except KeyError:
+        names = _INIT_FIELD_NAMES[message_type] = tuple(f.name for f in fields(message) if f.init)
+    return message_type, tuple(getattr(message, name) for name in names)
+
+
+@dataclass(slots=True)
 class Tick(Message):
-    """Send the current tick."""
+    """Send the current tick.
+
+    This is sent with the events of each poll, and periodically if
+    there are no events to keep the elapsed time in sync. It is also
+    sent before tracking is paused or the profile changes, so that the
+    elapsed time always matches the active and inactive time.
+    """
 
     target: int = field(default=Target.Processing | Target.GUI, init=False)
     tick: int
     timestamp: int
+    ticks: int = 1
+    """Number of ticks since the previous message."""
+    rate: int = UPDATES_PER_SECOND
+    """Number of polls per second."""
+    poll: int = 0
+    """Number of polls since tracking was loaded."""
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class MouseMove(Message):
     """Mouse has moved to a new location on the screen."""
 
     target: int = field(default=Target.Processing | Target.GUI, init=False)
     position: tuple[int, int]
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class MouseClick(Message):
     """Mouse has been clicked."""
 
@@ -90,35 +146,53 @@ class MouseClick(Message):
     button: int
     position: tuple[int, int]
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class MouseHeld(Message):
-    """Mouse button is being held."""
+    """Mouse button has been held at a position.
+    This is sent when the button is released, when the mouse moves, and
+    periodically during long holds.
+    """
 
     target: int = field(default=Target.Processing | Target.GUI, init=False)
     button: int
     position: tuple[int, int]
+    ticks: int = 1
+    """Number of ticks held for since the last message."""
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class KeyPress(Message):
     """Key has been pressed."""
 
     target: int = field(default=Target.Processing | Target.GUI, init=False)
     keycode: int
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class KeyHeld(Message):
-    """Key is being held.
-    This does not trigger on the first press.
+    """Key has been held.
+    This is sent when the key is released, and periodically during
+    long holds. The first tick is counted by the press instead.
+    Scroll events are also sent as this, with `ticks` as the number of
+    scroll events during the tick.
     """
 
     target: int = field(default=Target.Processing | Target.GUI, init=False)
     keycode: int
+    ticks: int = 1
+    """Number of ticks held for since the last message."""
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class ButtonPress(Message):
     """Gamepad button has been pressed."""
 
@@ -126,17 +200,26 @@ class ButtonPress(Message):
     gamepad: int
     keycode: int
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class ButtonHeld(Message):
-    """Gamepad button is being held."""
+    """Gamepad button has been held.
+    This is sent when the button is released, and periodically during
+    long holds.
+    """
 
     target: int = field(default=Target.Processing, init=False)
     gamepad: int
     keycode: int
+    ticks: int = 1
+    """Number of ticks held for since the last message."""
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class ThumbstickMove(Message):
     """Thumbstic location."""
 
@@ -149,14 +232,20 @@ class ThumbstickMove(Message):
     thumbstick: Thumbstick
     position: tuple[float, float]
 
+    __reduce__ = _reduce_message
+
 
 @dataclass
 class Traceback(Message):
-    """Send data when a traceback is raised."""
+    """Send data when a traceback is raised.
+    If the source is a component, then the Hub will restart it instead
+    of shutting down.
+    """
 
     target: int = field(default=Target.Hub, init=False)
     exception: Exception
     traceback: str
+    source: int = Target.Hub
 
     def reraise(self) -> None:
         """Re-raise the exception.
@@ -236,15 +325,43 @@ class RenderRequest(Message):
     def __post_init__(self) -> None:
         assert self.show_count != self.show_time
 
+    def data_key(self) -> tuple[Hashable, ...]:
+        """Get the parameters that affect the data of the render.
+        Requests with matching keys will generate the same normalised
+        array, and only differ in how it is coloured.
+        """
+        return (self.type, self.profile, self.sampling, self.padding, self.contrast,
+                self.clipping, self.blur, self.linear, self.show_left_clicks,
+                self.show_middle_clicks, self.show_right_clicks, self.interpolation_order)
+
 
 @dataclass
 class Render(Message):
-    """A render has been completed."""
+    """A render has been completed.
+
+    Large arrays are sent through shared memory. Once the GUI has
+    finished with the array, it must send `RenderBufferRelease` so that
+    the buffer can be reused.
+
+    If progressive, the array is a low resolution render that must be
+    scaled up to the requested resolution, and will be followed by the
+    full render.
+    """
 
     target: int = field(default=Target.GUI, init=False)
-    array: npt.NDArray[np.uint8]
+    lane: ClassVar[int] = Lane.Bulk
+    array: npt.NDArray[np.uint8] | SharedArray
     request: RenderRequest
+    request_id: int = 0
+    progressive: bool = False
+
+
+@dataclass
+class RenderBufferRelease(Message):
+    """Mark a shared render buffer as free to reuse."""
 
+    target: int = field(default=Target.Processing, init=False)
+    name: str
 
 
 @dataclass
@@ -325,6 +442,48 @@ class Save(Message):
     profile_name: str | None = None
 
 
+@dataclass
+class Checkpoint(Message):
+    """Notify the Hub that everything read from the ring buffer so far
+    has been saved.
+
+    If the component is restarted, it will read the ring buffer again
+    from this point, after first processing `messages` to restore the
+    state it had at the time.
+    """
+
+    target: int = field(default=Target.Hub, init=False)
+    source: int
+    messages: list[Message] = field(default_factory=list)
+
+
+@dataclass
+class Restore(Message):
+    """Restore the state of a restarted component in order with the
+    ring buffer.
+
+    The records before `count` are read before `message` is processed,
+    so that the replayed input is handled with the settings it was
+    originally handled with.
+    """
+
+    target: int = field(default=0, init=False)
+    count: int
+    """Total number of records written to the ring buffer when the
+    message was originally received."""
+    message: Message
+
+
+@dataclass
+class ComponentRestarted(Message):
+    """Notify the GUI that a component was restarted.
+    Any requests it was handling at the time will have been lost.
+    """
+
+    target: int = field(default=Target.GUI, init=False)
+    component: int
+
+
 @dataclass
 class SaveComplete(Message):
     """After a profile has been saved."""
@@ -352,6 +511,7 @@ class ProfileData(Message):
     """Information about a profile."""
 
     target: int = field(default=Target.GUI, init=False)
+    lane: ClassVar[int] = Lane.Bulk
     profile_name: str
     distance: float
     cursor_counter: int
@@ -371,7 +531,7 @@ class ProfileData(Message):
     multi_monitor: bool | None
 
 
-@dataclass
+@dataclass(slots=True)
 class DataTransfer(Message):
     """Upload and download data since the previous message."""
 
@@ -380,22 +540,151 @@ class DataTransfer(Message):
     bytes_sent: int
     bytes_recv: int
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class Active(Message):
 
     target: int = field(default=Target.Processing | Target.GUI, init=False)
     profile_name: str
     ticks: int
 
+    __reduce__ = _reduce_message
 
-@dataclass
+
+@dataclass(slots=True)
 class Inactive(Message):
 
     target: int = field(default=Target.Processing | Target.GUI, init=False)
     profile_name: str
     ticks: int
 
+    __reduce__ = _reduce_message
+
+
+@dataclass(slots=True)
+class TickBatch(Message):
+    """Send all the tracking events for a single poll.
+
+    The events are stored as a struct of arrays instead of individual
+    messages, so that only one item is put in the queue per tick.
+    Iterating over the batch recreates the original messages, grouped
+    by their type.
+
+    The `*_held` lists store the number of ticks held for, or 0 if it
+    was a press.
+    """
+
+    target: int = field(default=Target.Processing | Target.GUI, init=False)
+    tick: int
+    timestamp: int
+    ticks: int = 1
+    rate: int = UPDATES_PER_SECOND
+    poll: int = 0
+    mouse_position: tuple[int, int] | None = None
+    click_position: tuple[int, int] | None = None
+    click_buttons: list[int] = field(default_factory=list)
+    click_held: list[int] = field(default_factory=list)
+    keycodes: list[int] = field(default_factory=list)
+    keys_held: list[int] = field(default_factory=list)
+    button_gamepads: list[int] = field(default_factory=list)
+    button_keycodes: list[int] = field(default_factory=list)
+    buttons_held: list[int] = field(default_factory=list)
+    thumbstick_gamepads: list[int] = field(default_factory=list)
+    thumbstick_sides: list[int] = field(default_factory=list)
+    thumbstick_positions: list[tuple[float, float]] = field(default_factory=list)
+    transfer_addresses: list[str] = field(default_factory=list)
+    transfer_sent: list[int] = field(default_factory=list)
+    transfer_recv: list[int] = field(default_factory=list)
+    profile_name: str | None = None
+    active: int = 0
+    inactive: int = 0
+
+    __reduce__ = _reduce_message
+
+    @property
+    def is_empty(self) -> bool:
+        """Determine if the batch has no events."""
+        return (self.mouse_position is None and self.click_position is None and not self.keycodes
+                and not self.button_keycodes and not self.thumbstick_positions and not self.transfer_addresses
+                and self.profile_name is None)
+
+    def add(self, message: Message) -> bool:
+        """Add a message to the batch.
+        Returns False if the message cannot be batched.
+        """
+        match message:
+            case MouseMove() if self.mouse_position is None:
+                self.mouse_position = message.position
+
+            case MouseClick() | MouseHeld() if self.click_position in (None, message.position):
+                self.click_position = message.position
+                self.click_buttons.append(message.button)
+                self.click_held.append(message.ticks if isinstance(message, MouseHeld) else 0)
+
+            case KeyPress() | KeyHeld():
+                self.keycodes.append(message.keycode)
+                self.keys_held.append(message.ticks if isinstance(message, KeyHeld) else 0)
+
+            case ButtonPress() | ButtonHeld():
+                self.button_gamepads.append(message.gamepad)
+                self.button_keycodes.append(message.keycode)
+                self.buttons_held.append(message.ticks if isinstance(message, ButtonHeld) else 0)
+
+            case ThumbstickMove():
+                self.thumbstick_gamepads.append(message.gamepad)
+                self.thumbstick_sides.append(message.thumbstick.value)
+                self.thumbstick_positions.append(message.position)
+
+            case DataTransfer():
+                self.transfer_addresses.append(message.mac_address)
+                self.transfer_sent.append(message.bytes_sent)
+                self.transfer_recv.append(message.bytes_recv)
+
+            case Active() | Inactive() if self.profile_name in (None, message.profile_name):
+                self.profile_name = message.profile_name
+                if isinstance(message, Active):
+                    self.active += message.ticks
+                else:
+                    self.inactive += message.ticks
+
+            case _:
+                return False
+        return True
+
+    def __iter__(self) -> Iterator[Message]:
+        """Get the individual messages."""
+        yield Tick(self.tick, self.timestamp, self.ticks, self.rate, self.poll)
+
+        if self.mouse_position is not None:
+            yield MouseMove(self.mouse_position)
+
+        if self.click_position is not None:
+            for button, held in zip(self.click_buttons, self.click_held):
+                if held:
+                    yield MouseHeld(button, self.click_position, held)
+                else:
+                    yield MouseClick(button, self.click_position)
+
+        for keycode, held in zip(self.keycodes, self.keys_held):
+            yield KeyHeld(keycode, held) if held else KeyPress(keycode)
+
+        for gamepad, keycode, held in zip(self.button_gamepads, self.button_keycodes, self.buttons_held):
+            yield ButtonHeld(gamepad, keycode, held) if held else ButtonPress(gamepad, keycode)
+
+        for gamepad, side, position in zip(self.thumbstick_gamepads, self.thumbstick_sides, self.thumbstick_positions):
+            yield ThumbstickMove(gamepad, ThumbstickMove.Thumbstick(side), position)
+
+        for mac_address, bytes_sent, bytes_recv in zip(self.transfer_addresses, self.transfer_sent, self.transfer_recv):
+            yield DataTransfer(mac_address, bytes_sent, bytes_recv)
+
+        if self.profile_name is not None:
+            if self.active:
+                yield Active(self.profile_name, self.active)
+            if self.inactive:
+                yield Inactive(self.profile_name, self.inactive)
+
 
 @dataclass
 class SetProfileMouseTracking(Message):
@@ -461,6 +750,36 @@ class DebugDisableMonitorCheck(Message):
     disable: bool
 
 
+@dataclass
+class DebugSetTracing(Message):
+    """Enable or disable message tracing.
+    Any previous results are cleared when enabled.
+    """
+
+    target: int = field(default=Target.Tracking | Target.Processing | Target.GUI | Target.AppDetection,
+                        init=False)
+    enable: bool
+
+
+@dataclass
+class DebugRequestTraceStats(Message):
+    """Request the message tracing results from each component."""
+
+    target: int = field(default=Target.Tracking | Target.Processing | Target.GUI | Target.AppDetection,
+                        init=False)
+
+
+@dataclass
+class DebugTraceStats(Message):
+    """Message tracing results from a component.
+    The histograms are stored by message type and stage.
+    """
+
+    target: int = field(default=Target.GUI, init=False)
+    source: int
+    histograms: dict[tuple[str, str], Histogram]
+
+
 @dataclass
 class DeleteMouseData(Message):
     target: int = field(default=Target.Processing, init=False)
@@ -493,23 +812,35 @@ class DeleteProfile(Message):
 
 @dataclass
 class Autosave(Message):
-    target: int = field(default=Target.Tracking, init=False)
+    target: int = field(default=Target.Tracking | Target.Processing, init=False)
     enabled: bool
 
 
 @dataclass
 class RequestQueueSize(Message):
     target: int = field(default=Target.Hub, init=False)
+    source: int = Target.GUI
+    """Component to send the sizes to."""
 
 
 @dataclass
 class QueueSize(Message):
+    """Number of messages waiting for each component.
+    The bulk sizes are only for the bulk lane, and the others are for
+    the control lane.
+    """
+
     target: int = field(default=Target.GUI, init=False)
     hub: int
     tracking: int
     processing: int
     gui: int
     app_detection: int
+    hub_bulk: int = 0
+    tracking_bulk: int = 0
+    processing_bulk: int = 0
+    gui_bulk: int = 0
+    app_detection_bulk: int = 0
 
 
 @dataclass
@@ -659,10 +990,15 @@ class RenderLayerRequest(Message):
     Note that this is only meant to be a wrapper over the rendering, so
     for example this is why the resolution is stored per render request,
     rather than once per render layer request.
+
+    If progressive, a low resolution render will be sent first so that
+    the preview can update quickly, followed by the full render.
     """
 
     target: int = field(default=Target.Processing, init=False)
     layers: list[RenderLayer]
+    request_id: int = 0
+    progressive: bool = False
 
 
 @dataclass
@@ -1,30 +1,35 @@
 import math
 import time
-from collections import defaultdict
+from collections import deque
 from contextlib import suppress
 from dataclasses import dataclass
-from typing import Iterator, Literal
+from functools import partial
 
 import numpy as np
-import numpy.typing as npt
 from send2trash import send2trash
 
 from . import ipc
 from .abstract import AppComponent, MonitorComponent
+from .tracing import trace_handler
 from ..config import GlobalConfig
 from ..context import CTX
 from ..exceptions import ExitRequest
 from ..export import Export
-from ..file import ArrayResolutionMap, MovementMaps, TrackingProfile, TrackingProfileLoader, get_filename
-from ..legacy import keyboard
+from ..file import MovementMaps, TrackingProfile, TrackingProfileLoader, get_filename
 from ..types import Application
 from ..utils import keycodes
 from ..utils.math import calculate_distance
 from ..utils.input import get_cursor_pos
 from ..utils.interface import Interfaces
+from ..utils.shared_memory import SharedArrayPool
 from ..utils.system import hide_child_process
 from ..constants import UPDATES_PER_SECOND, DOUBLE_CLICK_MS, DOUBLE_CLICK_TOL, RADIAL_ARRAY_SIZE, DEBUG
-from ..render import render, EmptyRenderError, LayerBlend
+from ..profile_render import ProfileRender, downscale_layers
+from ..render import RenderCancelledError
+
+
+PROGRESSIVE_RENDER_BUDGET = 0.05
+"""Target time in seconds for the low resolution pass of a progressive render."""
 
 
 @dataclass
@@ -45,11 +50,19 @@ class PreviousMouseClick:
         return self.message.position
 
 
+def _is_preview_request(message: ipc.Message) -> bool:
+    """Determine if a message is a request to render the preview."""
+    return (isinstance(message, ipc.RenderLayerRequest) and bool(message.layers)
+            and message.layers[0].request.file_path is None)
+
+
 class Processing(AppComponent, MonitorComponent):
     def __post_init__(self) -> None:
         hide_child_process()
 
         self.tick = 0
+        self.poll = 0
+        self.polling_rate = UPDATES_PER_SECOND
         self._timestamp = -1
 
         self.previous_mouse_click: PreviousMouseClick | None = None
@@ -58,6 +71,22 @@ class Processing(AppComponent, MonitorComponent):
         # Load in the default profile
         self.all_profiles = TrackingProfileLoader()
 
+        # Reusable buffers to send renders to the GUI
+        self._render_buffers = SharedArrayPool()
+
+        # Seconds per pixel of the last preview render
+        self._render_cost: float | None = None
+
+        # Messages read while checking for newer render requests
+        self._message_backlog: deque[ipc.Message] = deque()
+        self._queued_previews = 0
+
+        # Saving early is skipped if autosave is disabled
+        self.autosave = True
+
+        # Number of unsaved ring buffer bytes to save early at
+        self._early_save_at: int | None = None
+
         # Reset the cursor position on focused application change
         def on_application_change(app: Application) -> None:
             self.profile.cursor_map.position = None
@@ -175,13 +204,16 @@ class Processing(AppComponent, MonitorComponent):
         old_position = position
         new_position = data.position
 
-        # If the ticks match then overwrite the old data
-        if self.tick == data.tick:
+        # If the polls match then overwrite the old data
+        if self.poll == data.poll:
             data.position = position
 
         distance = calculate_distance(position, data.position)
         data.distance += distance
-        moving = self.tick == data.tick + 1
+        moving = self.poll == data.poll + 1
+
+        # Speed is measured per tick, regardless of the polling rate
+        speed = round(100 * distance * self.polling_rate / UPDATES_PER_SECOND)
 
         # Add the pixels to an array
         for current_monitor, pixel in self.iter_pixel_line(old_position, new_position, force_monitor):
@@ -189,13 +221,13 @@ class Processing(AppComponent, MonitorComponent):
             data.sequential_arrays[current_monitor][index] = data.counter
             data.density_arrays[current_monitor][index] += 1
             if distance and moving:
-                data.speed_arrays[current_monitor][index] = max(data.speed_arrays[current_monitor][index], round(100 * distance))
+                data.speed_arrays[current_monitor][index] = max(data.speed_arrays[current_monitor][index], speed)
 
         # Update the saved data
         data.position = position
         data.counter += 1
         data.ticks += 1
-        data.tick = self.tick
+        data.poll = self.poll
 
         if data.requires_compression():
             print('[Processing] Tracking threshold reached, reducing values...')
@@ -204,138 +236,74 @@ class Processing(AppComponent, MonitorComponent):
 
         return distance
 
-    def _arrays_for_rendering(self, profile: TrackingProfile, render_type: ipc.RenderType,
-                              left_clicks: bool = True, middle_clicks: bool = True, right_clicks: bool = True,
-                              ) -> dict[tuple[int, int], list[np.typing.ArrayLike]]:
-        """Get a list of arrays to use for a render."""
-        def get_arrays(array_map: ArrayResolutionMap) -> Iterator[np.typing.ArrayLike]:
-            for resolution, arrays in array_map.items():
-                if resolution not in profile.config.disabled_resolutions:
-                    yield arrays
-
-        arrays: dict[tuple[int, int], list[np.typing.ArrayLike]] = defaultdict(list)
-        match render_type:
-            case ipc.RenderType.MouseMovement:
-                arrays[0, 0].extend(get_arrays(profile.cursor_map.sequential_arrays))
-
-            case ipc.RenderType.MousePosition:
-                arrays[0, 0].extend(get_arrays(profile.cursor_map.density_arrays))
-
-            case ipc.RenderType.MouseSpeed:
-                arrays[0, 0].extend(get_arrays(profile.cursor_map.speed_arrays))
-
-            case ipc.RenderType.SingleClick:
-                for keycode, res_map in profile.mouse_single_clicks.items():
-                    if keycode == keycodes.VK_LBUTTON and not left_clicks:
-                        continue
-                    if keycode == keycodes.VK_MBUTTON and not middle_clicks:
-                        continue
-                    if keycode == keycodes.VK_RBUTTON and not right_clicks:
-                        continue
-                    arrays[0, 0].extend(get_arrays(res_map))
-
-            case ipc.RenderType.DoubleClick:
-                for keycode, res_map in profile.mouse_double_clicks.items():
-                    if keycode == keycodes.VK_LBUTTON and not left_clicks:
-                        continue
-                    if keycode == keycodes.VK_MBUTTON and not middle_clicks:
-                        continue
-                    if keycode == keycodes.VK_RBUTTON and not right_clicks:
-                        continue
-                    arrays[0, 0].extend(get_arrays(res_map))
-
-            case ipc.RenderType.HeldClick:
-                for keycode, res_map in profile.mouse_held_clicks.items():
-                    if keycode == keycodes.VK_LBUTTON and not left_clicks:
-                        continue
-                    if keycode == keycodes.VK_MBUTTON and not middle_clicks:
-                        continue
-                    if keycode == keycodes.VK_RBUTTON and not right_clicks:
-                        continue
-                    arrays[0, 0].extend(get_arrays(res_map))
-
-            case ipc.RenderType.ThumbstickMovement:
-                if left_clicks:
-                    for gamepad_maps in profile.thumbstick_l_map.values():
-                        resolution_map = gamepad_maps.sequential_arrays
-                        arrays[0, 0].extend(resolution_map.values())
-                if right_clicks:
-                    for gamepad_maps in profile.thumbstick_r_map.values():
-                        resolution_map = gamepad_maps.sequential_arrays
-                        arrays[int(left_clicks), 0].extend(resolution_map.values())
-
-            case ipc.RenderType.ThumbstickSpeed:
-                if left_clicks:
-                    for gamepad_maps in profile.thumbstick_l_map.values():
-                        resolution_map = gamepad_maps.speed_arrays
-                        arrays[0, 0].extend(resolution_map.values())
-                if right_clicks:
-                    for gamepad_maps in profile.thumbstick_r_map.values():
-                        resolution_map = gamepad_maps.speed_arrays
-                        arrays[int(left_clicks), 0].extend(resolution_map.values())
-
-            case ipc.RenderType.ThumbstickPosition:
-                if left_clicks:
-                    for gamepad_maps in profile.thumbstick_l_map.values():
-                        resolution_map = gamepad_maps.density_arrays
-                        arrays[0, 0].extend(resolution_map.values())
-                if right_clicks:
-                    for gamepad_maps in profile.thumbstick_r_map.values():
-                        resolution_map = gamepad_maps.density_arrays
-                        arrays[int(left_clicks), 0].extend(resolution_map.values())
+    def _send_render(self, array: np.ndarray, request: ipc.RenderRequest,
+                     request_id: int = 0, progressive: bool = False) -> None:
+        """Send a completed render to the GUI.
+        Shared memory is used where possible to avoid pickling the array.
+        """
+        shared = self._render_buffers.store(array)
+        self.send_data(ipc.Render(array if shared is None else shared, request, request_id, progressive))
 
-            case _:
-                raise NotImplementedError(render_type)
-
-        return arrays
-
-    def _render_array(self, profile: TrackingProfile, render_type: ipc.RenderType,
-                      width: int | None, height: int | None, colour_map: str, sampling: int = 1,
-                      padding: int = 0, contrast: float = 1.0, lock_aspect: bool = True,
-                      clipping: float = 0.0, blur: float = 0.0, linear: bool = False, invert: bool = False,
-                      left_clicks: bool = True, middle_clicks: bool = True, right_clicks: bool = True,
-                      interpolation_order: Literal[0, 1, 2, 3, 4, 5] = 0) -> npt.NDArray[np.uint8]:
-        """Render an array (tracks / heatmaps)."""
-        # Get the arrays to render
-        positional_arrays = self._arrays_for_rendering(profile, render_type, left_clicks=left_clicks,
-                                                       middle_clicks=middle_clicks, right_clicks=right_clicks)
-
-        # Add extra padding
-        if padding is not None:
-            for position, arrays in positional_arrays.items():
-                positional_arrays[position] = [np.pad(array, padding) for array in arrays]
-
-        # Adjust width/height if not locking the aspect ratio
-        if positional_arrays and not lock_aspect and width is not None and height is not None:
-            width_items = max(x for x, y in positional_arrays) - min(x for x, y in positional_arrays) + 1
-            height_items = max(y for x, y in positional_arrays) - min(y for x, y in positional_arrays) + 1
-            width = round(width / width_items)
-            height = round(height / height_items)
-
-        # Do the render
-        try:
-            image = render(colour_map, positional_arrays, width, height, sampling,
-                           lock_aspect=lock_aspect, linear=linear, invert=invert,
-                           blur=blur, contrast=contrast, clipping=clipping,
-                           interpolation_order=interpolation_order)
-        except EmptyRenderError:
-            image = np.ndarray([0, 0, 4], dtype=np.uint8)
-
-        return image
-
-    def _render_keyboard(self, profile: TrackingProfile, colour_map: str, data_set: str, sampling: int = 1) -> np.ndarray:
-        """Render a keyboard image."""
-        keyboard.GLOBALS.data_set = data_set
-        keyboard.GLOBALS.colour_map = colour_map
-        keyboard.GLOBALS.multiplier = max(1, sampling)
-
-        pressed = {i: profile.key_presses[i] for i in map(int, keycodes.KEYBOARD_CODES)}
-        held = {i: profile.key_held[i] for i in map(int, keycodes.KEYBOARD_CODES)}
-
-        image = keyboard.DrawKeyboard(profile.name, profile.active, pressed, held).draw_image()
-
-        # Convert back to array to send to GUI
-        return np.asarray(image)
+    def _read_backlog(self) -> None:
+        """Read any waiting messages into the backlog.
+        They will be processed once the current message is finished.
+        """
+        for message in self.receive_data():
+            self._message_backlog.append(message)
+            if _is_preview_request(message):
+                self._queued_previews += 1
+
+    def _check_ring_buffer_space(self) -> None:
+        """Save early if the ring buffer is filling up.
+
+        A restart reads everything since the last checkpoint again, but
+        only while it's still in the ring buffer. If the input since the
+        last autosave is close to filling it, then save everything now
+        so that a new checkpoint is made.
+        """
+        reader = self._ring_buffer_reader
+        if reader is None or not self.autosave:
+            return
+        size = reader.buffer.size
+        if self._early_save_at is None:
+            self._early_save_at = size // 2
+        if reader.unsaved < self._early_save_at:
+            return
+
+        print('[Processing] Ring buffer is filling up, saving early...')
+        self._process_message(ipc.Save())
+
+        # If no checkpoint was made, then wait a while before trying again
+        unsaved = reader.unsaved
+        self._early_save_at = size // 2 if unsaved < size // 2 else unsaved + size // 8
+
+    def _is_render_superseded(self, request: ipc.RenderLayerRequest) -> bool:
+        """Check if a newer preview render has been requested.
+
+        Only the latest preview is required, so any older ones can be
+        dropped before or during rendering. Exports are always rendered.
+        """
+        if not _is_preview_request(request):
+            return False
+        self._read_backlog()
+        return self._queued_previews > 0
+
+    def _progressive_scale(self, request: ipc.RenderRequest) -> int:
+        """Get how much to downscale the first pass of a progressive render.
+
+        The scale is estimated from the speed of the previous render so
+        that the first pass fits within `PROGRESSIVE_RENDER_BUDGET`.
+        Returns 1 if the full render is expected to be fast enough.
+        """
+        if request.width is None or request.height is None:
+            return 1
+        if self._render_cost is None:
+            return 4
+
+        pixels = request.width * request.height
+        if self._render_cost * pixels * request.sampling ** 2 < PROGRESSIVE_RENDER_BUDGET * 2:
+            return 1
+        return max(2, math.ceil(math.sqrt(self._render_cost * pixels / PROGRESSIVE_RENDER_BUDGET)))
 
     def _get_tick_diff(self, profile_name: str) -> int:
         """Get the difference between elapsed ticks and recorded ticks.
@@ -427,19 +395,26 @@ class Processing(AppComponent, MonitorComponent):
         print(f'[Processing] Failed to save {profile_name}')
         return False
 
+    @trace_handler
     def _process_message(self, message: ipc.Message) -> None:
         """Process an item of data."""
         match message:
+            case ipc.TickBatch():
+                for item in message:
+                    self._process_message(item)
+
             case ipc.Tick():
                 # Set variables
                 self.tick = message.tick
+                self.poll = message.poll
+                self.polling_rate = message.rate
                 self.timestamp = message.timestamp
 
                 # Update profile data
-                self.profile.elapsed += 1
-                self.profile.daily_ticks[self.profile_age_days, 0] += 1
+                self.profile.elapsed += message.ticks
+                self.profile.daily_ticks[self.profile_age_days, 0] += message.ticks
 
-                # This message triggers once per tick, so the current profile is always "modified"
+                # This message is sent regularly while tracking, so the current profile is always "modified"
                 self.profile.is_modified = True
 
             case ipc.Active():
@@ -455,28 +430,8 @@ class Processing(AppComponent, MonitorComponent):
                 else:
                     profile = self.profile
 
-                if message.type == ipc.RenderType.KeyboardHeatmap:
-                    # Double the sampling, since the default render is too small
-                    sampling = message.sampling
-                    if message.file_path is not None:
-                        sampling *= 2
-
-                    assert message.show_count != message.show_time  # TODO: Remove mutually exclusive options
-                    data_set = 'count' if message.show_count else 'time'
-
-                    image = self._render_keyboard(profile, message.colour_map, data_set, sampling)
-
-                else:
-                    image = self._render_array(profile, message.type, message.width, message.height,
-                                               message.colour_map, sampling=message.sampling,
-                                               padding=message.padding, contrast=message.contrast,
-                                               lock_aspect=message.lock_aspect, clipping=message.clipping,
-                                               blur=message.blur, linear=message.linear, invert=message.invert,
-                                               left_clicks=message.show_left_clicks,
-                                               middle_clicks=message.show_middle_clicks,
-                                               right_clicks=message.show_right_clicks,
-                                               interpolation_order=message.interpolation_order)
-                self.send_data(ipc.Render(image, message))
+                image = ProfileRender(profile).request(message)
+                self._send_render(image, message)
 
                 print('[Processing] Render request completed')
 
@@ -485,97 +440,60 @@ class Processing(AppComponent, MonitorComponent):
                 if not message.layers:
                     return
 
+                # Skip if the preview has already been replaced
+                cancelled = partial(self._is_render_superseded, message)
+                if cancelled():
+                    print('[Processing] Render request superseded, skipping')
+                    return
+
                 if message.layers[0].request.profile:
                     profile = self.all_profiles[message.layers[0].request.profile]
                 else:
                     profile = self.profile
+                renderer = ProfileRender(profile)
 
                 # Intercept if a keyboard render
                 for layer in message.layers:
                     if layer.request.type == ipc.RenderType.KeyboardHeatmap:
-                        self.send_data(layer.request)
+                        self._send_render(renderer.request(layer.request), layer.request, message.request_id)
+                        print('[Processing] Render request completed')
                         return
 
-                layer_blend = None
-
-                for i, layer in enumerate(message.layers):
-                    request = layer.request
-
-                    # Use the resolution of the first layer
-                    if layer_blend is None:
-                        width = request.width
-                        height = request.height
-                        lock_aspect = request.lock_aspect
-                    # Reuse the same resolution
-                    else:
-                        height, width = layer_blend.image.shape[:2]
-                        width //= max(1, request.sampling)
-                        height //= max(1, request.sampling)
-                        lock_aspect = False
-
-                    # Render the layer
-                    if request.layer_visible:
-                        _image = self._render_array(
-                            profile=profile,
-                            render_type=request.type,
-                            colour_map=request.colour_map,
-                            width=width,
-                            height=height,
-                            lock_aspect=lock_aspect,
-                            sampling=request.sampling,
-                            padding=request.padding,
-                            contrast=request.contrast,
-                            clipping=request.clipping,
-                            blur=request.blur,
-                            linear=request.linear,
-                            invert=request.invert,
-                            left_clicks=request.show_left_clicks,
-                            middle_clicks=request.show_middle_clicks,
-                            right_clicks=request.show_right_clicks,
-                            interpolation_order=request.interpolation_order,
-                        )
-
-                    # If not visible, skip here unless there aren't any other visible layers
-                    elif i or any(_layer.request.layer_visible for _layer in message.layers):
-                        continue
-
-                    # If a single invisible layer, then do a quick render to get the resolution
-                    else:
-                        _image = self._render_array(
-                            profile=profile,
-                            render_type=request.type,
-                            colour_map='BlackToWhite',
-                            width=width,
-                            height=height,
-                            lock_aspect=lock_aspect,
-                            blur=0,
-                            left_clicks=False,
-                            middle_clicks=False,
-                            right_clicks=False,
-                        )
-                    image = np.divide(_image.astype(np.float64), 255)
-
-                    # Setup the base layer
-                    if layer_blend is None:
-                        layer_blend = LayerBlend(np.zeros(image.shape, dtype=np.float64))
-
-                    # Add the new layer
-                    if request.layer_visible:
-                        # Ensure initial layer has alpha
-                        if not i:
-                            layer.channels |= ipc.Channel.A
-                        layer_blend.blend(layer.blend_mode, image, opacity=layer.opacity / 100.0, channels=layer.channels)
+                is_preview = message.layers[0].request.file_path is None
+                try:
+                    # Send a low resolution render first
+                    if message.progressive and is_preview:
+                        scale = self._progressive_scale(message.layers[0].request)
+                        if scale > 1:
+                            layer_blend = renderer.layers(downscale_layers(message.layers, scale), cancelled)
+                            if layer_blend is not None:
+                                square_size = max(1, 16 // (scale * message.layers[0].request.sampling))
+                                layer_blend.add_checkerbox(square_size)
+                                self._send_render(layer_blend.to_uint8(), message.layers[-1].request,
+                                                  message.request_id, progressive=True)
+
+                    start = time.perf_counter()
+                    layer_blend = renderer.layers(message.layers, cancelled)
+
+                except RenderCancelledError:
+                    print('[Processing] Render request superseded, cancelled')
+                    return
 
                 if layer_blend is None:
                     return
 
                 # Add checkerboards to preview render backgrounds
-                if message.layers[0].request.file_path is None:
+                if is_preview:
                     layer_blend.add_checkerbox()
+                    height, width = layer_blend.image.shape[:2]
+                    self._render_cost = (time.perf_counter() - start) / max(1, width * height)
 
-                self.send_data(ipc.Render(layer_blend.to_uint8(), request))
+                self._send_render(layer_blend.to_uint8(), message.layers[-1].request, message.request_id)
                 print('[Processing] Render request completed')
 
+            case ipc.RenderBufferRelease():
+                self._render_buffers.release(message.name)
+
             case ipc.MouseMove():
                 if not self.profile.config.track_mouse or self.app_resizing:
                     return
@@ -591,7 +509,7 @@ class Processing(AppComponent, MonitorComponent):
                 if result is not None:
                     current_monitor, pixel = result
                     index = (pixel[1], pixel[0])
-                    self.profile.mouse_held_clicks[message.button][current_monitor][index] += 1
+                    self.profile.mouse_held_clicks[message.button][current_monitor][index] += message.ticks
 
             case ipc.MouseClick():
                 if not self.profile.config.track_mouse:
@@ -641,8 +559,8 @@ class Processing(AppComponent, MonitorComponent):
 
                 if message.keycode in keycodes.SCROLL_CODES:
                     print(f'[Processing] {keycodes.KeyCode(message.keycode)} triggered.')
-                    self.profile.daily_scrolls[self.profile_age_days] += 1
-                self.profile.key_held[message.keycode] += 1
+                    self.profile.daily_scrolls[self.profile_age_days] += message.ticks
+                self.profile.key_held[message.keycode] += message.ticks
 
             case ipc.ButtonPress():
                 if not self.profile.config.track_gamepad:
@@ -657,7 +575,7 @@ class Processing(AppComponent, MonitorComponent):
                 if not self.profile.config.track_gamepad:
                     return
 
-                self.profile.button_held[message.gamepad][int(math.log2(message.keycode))] += 1
+                self.profile.button_held[message.gamepad][int(math.log2(message.keycode))] += message.ticks
 
             case ipc.MonitorsChanged():
                 print('[Processing] Monitors changed.')
@@ -719,6 +637,14 @@ class Processing(AppComponent, MonitorComponent):
                         failed.append(profile_name)
                 self.send_data(ipc.SaveComplete(succeeded, failed))
 
+                # Everything read so far is now on disk, so a restart doesn't need it again
+                # Anything in the backlog was read after this message, so it must wait
+                if message.profile_name is None and not failed and not self._message_backlog:
+                    self.checkpoint(ipc.CurrentProfileChanged(self.focused_app.name, None, self.focused_app.rects))
+
+            case ipc.Autosave():
+                self.autosave = message.enabled
+
             case ipc.DataTransfer():
                 if not self.profile.config.track_network:
                     return
@@ -843,7 +769,22 @@ class Processing(AppComponent, MonitorComponent):
             case _:
                 raise NotImplementedError(message)
 
+    def on_exit(self) -> None:
+        """Delete the shared render buffers."""
+        self._render_buffers.close()
+
     def run(self) -> None:
         """Listen for events to process."""
-        for message in self.receive_data(polling_rate=1 / UPDATES_PER_SECOND):
-            self._process_message(message)
+        while True:
+            # Process anything that was read during a render
+            while self._message_backlog:
+                message = self._message_backlog.popleft()
+                if _is_preview_request(message):
+                    self._queued_previews -= 1
+                self._process_message(message)
+
+            for message in self.receive_data(timeout=None):
+                self._process_message(message)
+                self._check_ring_buffer_space()
+                if self._message_backlog:
+                    break
@@ -0,0 +1,96 @@
+"""Record the messages sent by the tracking component to a file.
+
+Each message is stored with the time it was sent, so that it can be
+replayed later at the same speed. The messages are stored with the same
+encoding as the ring buffer.
+
+If the file already exists then it is appended to, so that restarting
+the tracking component continues the same recording. Any frame that
+was only partially written when the previous process ended is removed
+first.
+"""
+
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from . import codec, ipc
+
+
+MAGIC = b'MTREC\x02'
+"""Header to identify a recording and its version."""
+
+_FRAME = struct.Struct('<dI')
+
+
+def _read_frames(f: BinaryIO) -> Iterator[tuple[float, bytes]]:
+    """Read each complete frame after the header.
+    The recording may have been interrupted mid write, so a partial
+    frame at the end is ignored.
+
+    Raises:
+        ValueError: If the file is not a recording.
+    """
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f'{f.name} is not a recording')
+
+    while len(header := f.read(_FRAME.size)) == _FRAME.size:
+        sent, size = _FRAME.unpack(header)
+        data = f.read(size)
+        if len(data) < size:
+            return
+        yield sent, data
+
+
+class InputRecorder:
+    """Write messages to a recording file."""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Find the end of the last complete frame
+        # Anything after it will have been cut off by the process ending
+        end = 0
+        if self.path.exists() and self.path.stat().st_size:
+            with open(self.path, 'rb') as f:
+                end = len(MAGIC)
+                for _, data in _read_frames(f):
+                    end += _FRAME.size + len(data)
+
+        # Write without buffering so nothing is lost if terminated
+        self._file: BinaryIO | None = open(self.path, 'ab', buffering=0)  # pylint: disable=consider-using-with
+        self._file.truncate(end)
+        if not end:
+            self._file.write(MAGIC)
+        self._lock = threading.Lock()
+
+    def write(self, message: ipc.Message) -> None:
+        """Write a message to the recording.
+        This may be called from multiple threads.
+        """
+        data = codec.dumps(message)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(_FRAME.pack(time.time(), len(data)) + data)
+
+    def close(self) -> None:
+        """Close the recording."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_recording(path: Path | str) -> Iterator[tuple[float, ipc.Message]]:
+    """Read each message from a recording.
+    This yields the time the message was sent, and the message.
+
+    Raises:
+        ValueError: If the file is not a recording.
+    """
+    with open(path, 'rb') as f:
+        for sent, data in _read_frames(f):
+            yield sent, codec.decode(data)
@@ -0,0 +1,135 @@
+"""Restart individual components after they fail.
+
+Instead of shutting down the whole application, the Hub restarts just
+the component that failed, with an increasing delay if it keeps
+failing. Any state the component needs is sent to it again before it
+reads anything else.
+"""
+
+import time
+
+from . import ipc
+from ..config import GlobalConfig
+
+
+MAX_RESTART_DELAY = 60.0
+"""Maximum number of seconds to wait before restarting a component."""
+
+STABLE_TIME = 60.0
+"""Number of seconds a component must run for to reset the delay."""
+
+TERMINATE_DELAY = 5.0
+"""Number of seconds to wait for a failed component to exit by itself."""
+
+
+class ComponentSupervisor:
+    """Decide when a single component should be restarted."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.failures = 0
+        """Number of failures since the component was last stable."""
+        self.failed_time: float | None = None
+        self.started_time = time.monotonic()
+
+    @property
+    def failed(self) -> bool:
+        """Determine if the component is waiting to be restarted."""
+        return self.failed_time is not None
+
+    @property
+    def restart_delay(self) -> float:
+        """Get how long to wait after the failure before restarting."""
+        return min(MAX_RESTART_DELAY, GlobalConfig.component_restart_delay * 2 ** (self.failures - 1))
+
+    def fail(self) -> None:
+        """Mark the component as failed.
+
+        Raises:
+            RuntimeError: If the component keeps failing.
+        """
+        if self.failed_time is not None:
+            return
+        now = time.monotonic()
+        if now - self.started_time > STABLE_TIME:
+            self.failures = 0
+        self.failures += 1
+        if self.failures > GlobalConfig.component_restart_limit:
+            raise RuntimeError(f'[Hub] {self.name} component failed {self.failures} times in a row')
+        self.failed_time = now
+        print(f'[Hub] {self.name} component failed, restarting in {self.restart_delay:g} seconds...')
+
+    def should_terminate(self) -> bool:
+        """Determine if the failed component has had long enough to exit."""
+        return self.failed_time is not None and time.monotonic() >= self.failed_time + TERMINATE_DELAY
+
+    def should_restart(self) -> bool:
+        """Determine if the failed component is due to be restarted."""
+        return self.failed_time is not None and time.monotonic() >= self.failed_time + self.restart_delay
+
+    def restarted(self) -> None:
+        """Mark the component as running again."""
+        self.failed_time = None
+        self.started_time = time.monotonic()
+
+
+def _state_key(message: ipc.Message) -> tuple[str, ...] | None:
+    """Get the key to store a state message under.
+    Messages that don't set any state return `None`.
+    """
+    match message:
+        case (ipc.SetGlobalMouseTracking() | ipc.SetGlobalKeyboardTracking() | ipc.SetGlobalGamepadTracking()
+              | ipc.SetGlobalNetworkTracking() | ipc.Autosave() | ipc.DebugDisableAppDetection()
+              | ipc.DebugDisableMonitorCheck() | ipc.DebugSetTracing() | ipc.TrackedApplicationDetected()):
+            return (type(message).__name__,)
+
+        case (ipc.SetProfileMouseTracking() | ipc.SetProfileKeyboardTracking() | ipc.SetProfileGamepadTracking()
+              | ipc.SetProfileNetworkTracking()):
+            return type(message).__name__, message.profile_name
+
+        case ipc.ToggleProfileMultiMonitor():
+            return type(message).__name__, message.profile
+
+    return None
+
+
+class StateCache:
+    """Store the latest messages that set the state of components.
+
+    Each message is stored with the number of records written to the
+    ring buffer when it was received, so that a component reading the
+    ring buffer again can process it at the same point.
+    """
+
+    def __init__(self) -> None:
+        self._messages: dict[tuple[str, ...], tuple[int, ipc.Message]] = {}
+
+    def update(self, message: ipc.Message, count: int = 0) -> None:
+        """Store the message if it sets any state."""
+        key = _state_key(message)
+        if key is not None:
+            self._messages.pop(key, None)
+            self._messages[key] = (count, message)
+
+    def clear_saved(self, target: int) -> None:
+        """Remove messages that only set state saved by a component."""
+        self._messages = {key: (count, message) for key, (count, message) in self._messages.items()
+                          if message.target != target}
+
+    def messages(self, target: int) -> list[ipc.Message]:
+        """Get the messages for a component."""
+        return [message for _, message in self._messages.values() if message.target & target]
+
+    def restore_messages(self, target: int) -> list[ipc.Message]:
+        """Get the messages for a component that is reading the ring
+        buffer again, in the order they were received.
+        """
+        return [ipc.Restore(count, message) for count, message in self._messages.values() if message.target & target]
+
+    @property
+    def application(self) -> ipc.TrackedApplicationDetected | None:
+        """Get the last tracked application to be detected."""
+        item = self._messages.get((ipc.TrackedApplicationDetected.__name__,))
+        if item is not None and isinstance(item[1], ipc.TrackedApplicationDetected):
+            return item[1]
+        return None
@@ -0,0 +1,132 @@
+"""Opt-in tracing of messages between components.
+
+When enabled, each message sent by a component is stamped with the
+current time, and the Hub adds another stamp when forwarding it. The
+receiving component uses the stamps to record the latency of each hop
+per message type, along with how long each message took to handle.
+
+The stamps use `time.perf_counter`, as it is shared between processes
+and is monotonic on every supported platform, but unlike
+`time.monotonic` it has a high enough resolution on Windows.
+"""
+
+import os
+import time
+from functools import wraps
+from typing import Any, Callable, Iterator, TypeVar
+
+from . import ipc
+from ..utils.histogram import BUCKET_COUNT, Histogram, bucket_limit
+
+
+T = TypeVar('T')
+
+SelfT = TypeVar('SelfT')
+
+
+class Stage:
+    """Stages of a message that are recorded."""
+
+    SenderToHub = 'Sender to Hub'
+    HubToReceiver = 'Hub to Receiver'
+    Total = 'Total'
+    Handler = 'Handler'
+
+
+class Tracer:
+    """Record the latency and handler duration of messages.
+    There is one instance per process, as `TRACER`.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+
+    def enable(self, enabled: bool) -> None:
+        """Enable or disable tracing.
+        Any previous results are cleared when enabled.
+        """
+        if enabled:
+            self.histograms = {}
+        self.enabled = enabled
+
+    def _histogram(self, message: ipc.Message, stage: str) -> Histogram:
+        """Get the histogram for a message type and stage."""
+        key = (type(message).__name__, stage)
+        try:
+            return self.histograms[key]
+        except KeyError:
+            histogram = self.histograms[key] = Histogram()
+            return histogram
+
+    def stamp(self, message: ipc.Message) -> None:
+        """Stamp a message as it is sent.
+        If not enabled, any existing stamps are removed.
+        """
+        message.trace = [time.perf_counter()] if self.enabled else None
+
+    def received(self, message: ipc.Message) -> None:
+        """Record the latency of a received message."""
+        trace = message.trace
+        if trace is None or not self.enabled:
+            return
+        now = time.perf_counter()
+        self._histogram(message, Stage.Total).add(now - trace[0])
+        if len(trace) > 1:
+            self._histogram(message, Stage.SenderToHub).add(trace[1] - trace[0])
+            self._histogram(message, Stage.HubToReceiver).add(now - trace[-1])
+
+    def handled(self, message: ipc.Message, duration: float) -> None:
+        """Record how long it took to handle a message."""
+        if self.enabled:
+            self._histogram(message, Stage.Handler).add(duration)
+
+
+TRACER = Tracer()
+
+
+def stamp_forward(message: ipc.Message) -> None:
+    """Stamp a message as it is forwarded by the Hub.
+    This is only done if the sender stamped it.
+    """
+    if message.trace is not None:
+        message.trace.append(time.perf_counter())
+
+
+def trace_handler(func: Callable[[SelfT, ipc.Message], T]) -> Callable[[SelfT, ipc.Message], T]:
+    """Record the duration of a message handler while tracing."""
+    @wraps(func)
+    def wrapper(self: SelfT, message: ipc.Message) -> T:
+        if not TRACER.enabled:
+            return func(self, message)
+        start = time.perf_counter()
+        try:
+            return func(self, message)
+        finally:
+            TRACER.handled(message, time.perf_counter() - start)
+    return wrapper
+
+
+def _csv_rows(results: dict[str, dict[tuple[str, str], Histogram]]) -> Iterator[tuple[Any, ...]]:
+    """Iterate over the rows of the tracing results."""
+    buckets = [f'< {bucket_limit(i) * 1000:g} ms' for i in range(BUCKET_COUNT - 1)]
+    yield ('Component', 'Message', 'Stage', 'Count', 'Mean (ms)', 'P50 (ms)', 'P90 (ms)', 'P99 (ms)', 'Max (ms)',
+           *buckets, f'>= {bucket_limit(BUCKET_COUNT - 2) * 1000:g} ms')
+    for component, histograms in results.items():
+        for (message_type, stage), histogram in sorted(histograms.items()):
+            yield (component, message_type, stage, histogram.count,
+                   round(histogram.mean * 1000, 4),
+                   round(histogram.percentile(50) * 1000, 4),
+                   round(histogram.percentile(90) * 1000, 4),
+                   round(histogram.percentile(99) * 1000, 4),
+                   round(histogram.maximum * 1000, 4),
+                   *histogram.counts)
+
+
+def export_csv(path: str | os.PathLike, results: dict[str, dict[tuple[str, str], Histogram]]) -> None:
+    """Save a CSV file of the tracing results from each component."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, data in enumerate(_csv_rows(results)):
+            if i:
+                f.write('\n')
+            f.write(','.join(map(str, data)))
@@ -1,9 +1,10 @@
+import math
+import threading
 import time
 import traceback
-from collections import defaultdict
+from collections import defaultdict, deque
 from contextlib import contextmanager
 from dataclasses import dataclass, field
-from itertools import count
 from typing import Iterator
 
 import psutil
@@ -15,6 +16,7 @@ except IOError:
 
 from . import ipc
 from .abstract import Component
+from .recording import InputRecorder
 from ..config import GlobalConfig
 from ..constants import UPDATES_PER_SECOND, DEFAULT_PROFILE_NAME
 from ..context import CTX
@@ -22,10 +24,20 @@ from ..exceptions import ExitRequest
 from ..utils import keycodes
 from ..utils.monitor import MonitorData
 from ..utils.input import get_cursor_pos
+from ..utils.histogram import Histogram
 from ..utils.interface import Interfaces
+from ..utils.scheduler import TickScheduler
 from ..utils.system import MonitorEventListener, ControllerEventListener, ForegroundAppListener, hide_child_process
 
 
+HELD_CHECKPOINT_TICKS = UPDATES_PER_SECOND
+"""Maximum number of ticks to hold something for before sending it."""
+
+ELAPSED_SYNC_TICKS = UPDATES_PER_SECOND
+"""Maximum number of ticks before sending the elapsed time.
+It is otherwise only sent along with other events.
+"""
+
 if XInput is None:
     XINPUT_OPCODES = {}
 else:
@@ -33,31 +45,6 @@ else:
                       if isinstance(v, int) and hasattr(keycodes, k)}
 
 
-def ticks(ups: int) -> Iterator[int]:
-    """Count up at a constant speed.
-
-    If any delay occurs, it will account for this and will continue to
-    count at a constant rate, resuming from the previous tick.
-    For example, if a PC gets put to sleep, then waking it up should
-    resume from the tick it was put to sleep at.
-    """
-    start = time.time()
-    for tick in count():
-        yield tick
-
-        # Calculate the expected time for the next tick
-        expected = start + (tick + 1) / ups
-        remaining = expected - time.time()
-
-        # Adjust the start time to account for missed time
-        if remaining < 0:
-            missed_ticks = -int(remaining * ups)
-            start += missed_ticks / ups
-            continue
-
-        time.sleep(remaining)
-
-
 def _getConnectedGamepads() -> tuple[bool, bool, bool, bool]:
     """Determine which gamepad indexes are connected."""
     if XInput is None:
@@ -84,7 +71,9 @@ class DataState:
     gamepad_stick_l_position: dict[int, tuple[int, int]] = field(default_factory=dict)
     gamepad_stick_r_position: dict[int, tuple[int, int]] = field(default_factory=dict)
     key_presses: dict[int, tuple[int, int]] = field(default_factory=dict)
+    key_held: dict[int, tuple[int, tuple[int, int] | None]] = field(default_factory=dict)
     button_presses: dict[int, tuple[int, int]] = field(default_factory=dict)
+    button_held: dict[tuple[int, int], int] = field(default_factory=dict)
     bytes_sent_previous: dict[str, int] = field(default_factory=lambda: defaultdict(int))
     bytes_recv_previous: dict[str, int] = field(default_factory=lambda: defaultdict(int))
     bytes_sent: dict[str, int] = field(default_factory=dict)
@@ -114,6 +103,20 @@ class Tracking(Component):
         self.update_apps = True
         self.update_monitors = True
         self.data = DataState(0)
+        self._batch: ipc.TickBatch | None = None
+        self._poll = 0
+        self._unsent_ticks = 0
+
+        # Events from the pynput threads, as `(keycode, amount)`
+        # For keys and buttons, the amount is 1 if pressed or 0 if released
+        # For scrolling, the amount is the number of scroll events
+        self._pynput_events: deque[tuple[int | keycodes.KeyCode, int]] = deque()
+
+        # Record everything that gets sent so it can be replayed
+        self._recorder: InputRecorder | None = None
+        if CTX.record_input is not None:
+            print(f'[Tracking] Recording input to {CTX.record_input}')
+            self._recorder = InputRecorder(CTX.record_input)
 
         config = GlobalConfig()
         self.track_mouse = not CTX.disable_mouse and config.track_mouse
@@ -121,8 +124,15 @@ class Tracking(Component):
         self.track_gamepad = not CTX.disable_gamepad and config.track_gamepad
         self.track_network = not CTX.disable_network and config.track_network
 
+        # Poll at a multiple of the tick rate so that each tick is evenly split
+        self.polling_rate = max(1, math.ceil(config.polling_rate / UPDATES_PER_SECOND)) * UPDATES_PER_SECOND
+        self.idle_polling_rate = max(1, min(config.idle_polling_rate, self.polling_rate))
+        self.idle_polling_delay = config.idle_polling_delay
+        self._last_input = time.perf_counter()
+        self._scheduler = TickScheduler(UPDATES_PER_SECOND, self.polling_rate)
+
         # Setup pynput listeners
-        self._pynput_mouse_listener = pynput.mouse.Listener(on_move=None,  # Out of bounds values during movement, don't use
+        self._pynput_mouse_listener = pynput.mouse.Listener(on_move=self._pynput_mouse_move,
                                                             on_click=self._pynput_mouse_click,
                                                             on_scroll=self._pynput_mouse_scroll)
         self._pynput_keyboard_listener = pynput.keyboard.Listener(on_press=self._pynput_key_press,
@@ -163,8 +173,7 @@ class Tracking(Component):
 
                     # Profile has changed, so reset the data
                     if message.name != self.profile_name:
-                        self.data.tick_modified = self.data.tick_current
-                        self._calculate_inactivity()
+                        self._end_interval()
                         self.data.pynput_opcodes.clear()
                         self.data.pynput_quick_press.clear()
                         self.profile_name = message.name
@@ -218,10 +227,43 @@ class Tracking(Component):
                         self._monitor_listener = MonitorEventListener()
                         self._monitor_listener.start()
 
-    def _run_with_state(self) -> Iterator[tuple[int, DataState]]:
+    def send_data(self, message: ipc.Message) -> None:
+        """Send a message, or add it to the batch for the current tick.
+        Messages from other threads, such as errors from the pynput
+        listeners, are always sent immediately.
+
+        If a message can't be added to the batch, such as a click at a
+        different position, then the batch is sent first so that the
+        messages stay in order, and a new one is started for the rest
+        of the poll.
+        """
+        batch = self._batch
+        if batch is not None and threading.current_thread() is threading.main_thread():
+            if batch.add(message):
+                return
+            if not batch.is_empty:
+                self._send_batch()
+                self._batch = ipc.TickBatch(batch.tick, batch.timestamp, 0, batch.rate, batch.poll)
+                if self._batch.add(message):
+                    return
+        if self._recorder is not None:
+            self._recorder.write(message)
+        super().send_data(message)
+
+    def trace_histograms(self) -> dict[tuple[str, str], Histogram]:
+        """Include the timing of each tick in the tracing results."""
+        return {**super().trace_histograms(),
+                ('Tick', 'Jitter'): self._scheduler.jitter,
+                ('Tick', 'Overrun'): self._scheduler.overrun}
+
+    def _run_with_state(self) -> Iterator[tuple[int, int, DataState]]:
+        """Poll while tracking is running.
+        This yields the current tick, and the number of ticks since the
+        previous poll.
+        """
         previous_state = self.state
         started = False
-        for tick in ticks(UPDATES_PER_SECOND):
+        for tick in self._scheduler:
             self._receive_data()
 
             state_changed = previous_state != self.state
@@ -233,9 +275,16 @@ class Tracking(Component):
                     if state_changed:
                         print('[Tracking] Started.')
                         self.data = DataState(tick)
+                        if self._recorder is not None:
+                            self._recorder.write(ipc.MonitorsChanged(self.data.monitors))
+                        self._scheduler.reset_stats()
                         started = True
                         if self.track_network:
                             self.data.reset_byte_counter()
+                        self._unsent_ticks = 0
+                        ticks = 1
+                    else:
+                        ticks = tick - self.data.tick_current
 
                     self.data.tick_current = tick
 
@@ -246,26 +295,51 @@ class Tracking(Component):
                     # It's not a permanent desync, but it could possibly
                     # have a race condition on save, so this fix will
                     # prevent that from happening.
-                    if self.data.tick_modified == tick - 1:
-                        self.data.tick_modified += 1
+                    if ticks and self.data.tick_modified == tick - ticks:
+                        self.data.tick_modified = tick
 
-                    yield tick, self.data
+                    yield tick, ticks, self.data
 
                 # When tracking is paused then stop here
                 case ipc.TrackingState.Paused:
                     if state_changed and started:
-                        self.data.tick_modified = self.data.tick_current
-                        self._calculate_inactivity()
-                        print('[Tracking] Paused.')
+                        self._end_interval()
+                        self._pynput_events.clear()
+                        print(f'[Tracking] Paused ({self._scheduler.summary()}).')
 
                 # Exit the loop when tracking is stopped
                 case ipc.TrackingState.Stopped:
                     if started:
-                        self.data.tick_modified = self.data.tick_current
-                        self._calculate_inactivity()
+                        self._end_interval()
+                        print(f'[Tracking] Timing: {self._scheduler.summary()}')
                     print('[Tracking] Shut down.')
                     return
 
+    def _send_batch(self, force: bool = False) -> None:
+        """Send the batch for the current poll.
+        If there are no events, it is only sent periodically to keep
+        the elapsed time in sync.
+        """
+        batch, self._batch = self._batch, None
+        if batch is None:
+            return
+        if force or not batch.is_empty or self._unsent_ticks >= ELAPSED_SYNC_TICKS:
+            batch.ticks, self._unsent_ticks = self._unsent_ticks, 0
+            self.send_data(batch)
+
+    def _end_interval(self) -> None:
+        """Send everything that is waiting to be sent.
+        This must be done before pausing or changing profile, so that
+        the elapsed time matches the active and inactive time.
+        """
+        self._send_all_held()
+        if self._unsent_ticks:
+            self.send_data(ipc.Tick(self.data.tick_current, int(time.time()), self._unsent_ticks,
+                                    self._scheduler.rate, self._poll))
+            self._unsent_ticks = 0
+        self.data.tick_modified = self.data.tick_current
+        self._calculate_inactivity()
+
     def _calculate_inactivity(self) -> int:
         """Send the activity or inactivity ticks.
         This is required to keep the active and inactive time in sync
@@ -285,6 +359,23 @@ class Tracking(Component):
 
         return diff
 
+    def _end_idle(self) -> None:
+        """Go back to the full polling rate when input is detected."""
+        self._last_input = time.perf_counter()
+        if self._scheduler.rate != self.polling_rate:
+            self._scheduler.rate = self.polling_rate
+            self._scheduler.wake()
+
+    def _update_polling_rate(self, data: DataState) -> None:
+        """Reduce the polling rate if there's been no input recently.
+        Gamepads can't notify when they're used, so they must always be
+        polled at the full rate.
+        """
+        idle = (self.idle_polling_delay > 0 and not data.pynput_opcodes
+                and not (self.track_gamepad and any(data.gamepads_current))
+                and (data.mouse_inactive or time.perf_counter() - self._last_input > self.idle_polling_delay))
+        self._scheduler.rate = self.idle_polling_rate if idle else self.polling_rate
+
     def _check_monitor_data(self, pixel: tuple[int, int]) -> None:
         """Refresh the monitor data if the pixel is not valid.
 
@@ -314,7 +405,19 @@ class Tracking(Component):
         try:
             yield
         except Exception as e:  # pylint: disable=broad-exception-caught
-            self.send_data(ipc.Traceback(e, traceback.format_exc()))
+            self.send_data(ipc.Traceback(e, traceback.format_exc(), self.target))
+
+    def _pynput_mouse_move(self, x: int, y: int) -> None:
+        """Triggers on mouse movement.
+        The position is out of bounds during movement, so the cursor
+        position is polled instead, and this is only used to end idle
+        polling.
+        """
+        if self.state != ipc.TrackingState.Running or not self.track_mouse:
+            return
+
+        with self._exception_handler():
+            self._end_idle()
 
     def _pynput_mouse_click(self, x: int, y: int, button: pynput.mouse.Button, pressed: bool) -> None:
         """Triggers on mouse click."""
@@ -322,6 +425,7 @@ class Tracking(Component):
             return
 
         with self._exception_handler():
+            self._end_idle()
             try:
                 idx = ('left', 'middle', 'right', 'x1', 'x2').index(button.name)
 
@@ -329,10 +433,7 @@ class Tracking(Component):
             except ValueError:
                 return
 
-            if pressed:
-                self.data.pynput_opcodes[keycodes.MOUSE_CODES[idx]] = self.data.tick_current
-            elif keycodes.MOUSE_CODES[idx] in self.data.pynput_opcodes:
-                del self.data.pynput_opcodes[keycodes.MOUSE_CODES[idx]]
+            self._pynput_events.append((keycodes.MOUSE_CODES[idx], int(pressed)))
 
     def _pynput_mouse_scroll(self, x: int, y: int, dx: int, dy: int) -> None:
         """Triggers on mouse scroll.
@@ -343,18 +444,15 @@ class Tracking(Component):
             return
 
         with self._exception_handler():
+            self._end_idle()
             if dx > 0:
-                for _ in range(dx):
-                    self._key_press(keycodes.VK_SCROLL_RIGHT)
+                self._pynput_events.append((keycodes.VK_SCROLL_RIGHT, dx))
             elif dx < 0:
-                for _ in range(-dx):
-                    self._key_press(keycodes.VK_SCROLL_LEFT)
+                self._pynput_events.append((keycodes.VK_SCROLL_LEFT, -dx))
             if dy > 0:
-                for _ in range(dy):
-                    self._key_press(keycodes.VK_SCROLL_UP)
+                self._pynput_events.append((keycodes.VK_SCROLL_UP, dy))
             elif dy < 0:
-                for _ in range(-dy):
-                    self._key_press(keycodes.VK_SCROLL_DOWN)
+                self._pynput_events.append((keycodes.VK_SCROLL_DOWN, -dy))
 
     def _pynput_key_press(self, key: pynput.keyboard.KeyCode | pynput.keyboard.Key | None) -> None:
         """Handle when a key is pressed."""
@@ -362,8 +460,8 @@ class Tracking(Component):
             return
 
         with self._exception_handler():
-            vk = keycodes.KeyCode(key)
-            self.data.pynput_opcodes[vk] = self.data.tick_current
+            self._pynput_events.append((keycodes.KeyCode(key), 1))
+            self._end_idle()
 
     def _pynput_key_release(self, key: pynput.keyboard.KeyCode | pynput.keyboard.Key | None) -> None:
         """Handle when a key is released."""
@@ -371,53 +469,103 @@ class Tracking(Component):
             return
 
         with self._exception_handler():
-            vk = keycodes.KeyCode(key)
-            if vk in self.data.pynput_opcodes:
-                recorded_tick = self.data.pynput_opcodes.pop(vk)
+            self._pynput_events.append((keycodes.KeyCode(key), 0))
+
+    def _process_pynput_events(self) -> None:
+        """Apply the events from the pynput threads since the last tick.
+
+        The threads only ever append to the queue, so no locking is
+        needed. Only the events that were queued when this started are
+        processed, so that constant input can't block the tick.
+        """
+        scrolls: dict[int, int] = {}
+        for _ in range(len(self._pynput_events)):
+            keycode, amount = self._pynput_events.popleft()
+
+            if keycode in keycodes.SCROLL_CODES:
+                scrolls[keycode] = scrolls.get(keycode, 0) + amount
 
+            # Key repeats will send multiple presses, so keep the first one
+            elif amount:
+                self.data.pynput_opcodes.setdefault(keycode, self.data.tick_current)
+
+            elif keycode in self.data.pynput_opcodes:
                 # Some keyboard features may emit faster than a tick
                 # If so, queue them in a separate list
-                if recorded_tick == self.data.tick_current:
-                    self.data.pynput_quick_press.append(vk)
+                if self.data.pynput_opcodes.pop(keycode) == self.data.tick_current:
+                    self.data.pynput_quick_press.append(keycode)
+
+        # Scroll events are sent to the "held" array instead of "pressed"
+        # since the events will vastly outnumber individual key presses
+        for keycode, count in scrolls.items():
+            self.data.tick_modified = self.data.tick_current
+            self.send_data(ipc.KeyHeld(keycode, count))
 
     def _key_press(self, keycode: int | keycodes.KeyCode, quick_press: bool = False) -> None:
         """Handle key presses."""
         self.data.tick_modified = self.data.tick_current
-        press_start, press_latest = self.data.key_presses.get(keycode, (self.data.tick_current, 0))
+        # Default to the current tick so a first press is never seen as held
+        press_start, press_latest = self.data.key_presses.get(keycode, (self.data.tick_current,
+                                                                          self.data.tick_current))
 
         # Handle all standard keypresses
         if keycode <= 0xFF:
             # First press
             if quick_press or press_latest != self.data.tick_current - 1:
+                if keycode in self.data.key_held:
+                    self._send_key_held(keycode)
                 if keycode in keycodes.CLICK_CODES and self.data.mouse_position is not None:
                     self.send_data(ipc.MouseClick(int(keycode), self.data.mouse_position))
                 self.send_data(ipc.KeyPress(int(keycode)))
 
             # Being held
             else:
-                if keycode in keycodes.CLICK_CODES and self.data.mouse_position is not None:
-                    self.send_data(ipc.MouseHeld(int(keycode), self.data.mouse_position))
-                self.send_data(ipc.KeyHeld(int(keycode)))
+                position = self.data.mouse_position if keycode in keycodes.CLICK_CODES else None
+                ticks, held_position = self.data.key_held.get(keycode, (0, position))
 
-        # Special case for scroll events
-        # It is being sent to the "held" array instead of "pressed"
-        # since the events will vastly outnumber individual key presses
-        # Also note that multiple events may be sent per tick
-        elif keycode in keycodes.SCROLL_CODES:
-            self.send_data(ipc.KeyHeld(keycode))
+                # Split the hold if the mouse moves, so it gets recorded in the correct place
+                if ticks and held_position != position:
+                    self._send_key_held(keycode)
+                    ticks = 0
+
+                self.data.key_held[keycode] = (ticks + 1, position)
+                if ticks + 1 >= HELD_CHECKPOINT_TICKS:
+                    self._send_key_held(keycode)
 
         else:
             raise RuntimeError(f'unexpected keycode: {keycode}')
 
         self.data.key_presses[keycode] = (press_start, self.data.tick_current)
 
+    def _send_key_held(self, keycode: int) -> None:
+        """Send how long a key has been held since the last message."""
+        ticks, position = self.data.key_held.pop(keycode)
+        if position is not None:
+            self.send_data(ipc.MouseHeld(int(keycode), position, ticks))
+        self.send_data(ipc.KeyHeld(int(keycode), ticks))
+
+    def _send_button_held(self, gamepad: int, keycode: int) -> None:
+        """Send how long a gamepad button has been held since the last message."""
+        ticks = self.data.button_held.pop((gamepad, keycode))
+        self.send_data(ipc.ButtonHeld(gamepad, keycode, ticks))
+
+    def _send_all_held(self) -> None:
+        """Send how long everything currently pressed has been held."""
+        for keycode in tuple(self.data.key_held):
+            self._send_key_held(keycode)
+        for gamepad, keycode in tuple(self.data.button_held):
+            self._send_button_held(gamepad, keycode)
+
     def run(self) -> None:
         """Run the tracking."""
         print('[Tracking] Loaded.')
         self.send_data(ipc.ComponentLoaded(ipc.Target.Tracking))
 
-        for tick, data in self._run_with_state():
-            self.send_data(ipc.Tick(tick, int(time.time())))
+        for tick, ticks, data in self._run_with_state():
+            # Collect the events for this poll to send as a single message
+            self._poll += 1
+            self._unsent_ticks += ticks
+            self._batch = ipc.TickBatch(tick, int(time.time()), 0, self._scheduler.rate, self._poll)
 
             # Check for loaded applications
             if self.update_apps and self._application_listener.triggered:
@@ -449,13 +597,26 @@ class Tracking(Component):
                         self._check_monitor_data(mouse_position)
                         self.send_data(ipc.MouseMove(mouse_position))
 
+            # Everything else is only checked once per tick
+            if not ticks:
+                self._send_batch()
+                continue
+
             # Record key presses / mouse clicks
-            for opcode in tuple(self.data.pynput_opcodes):
+            self._process_pynput_events()
+            for opcode in self.data.pynput_opcodes:
                 self._key_press(opcode)
-            while self.data.pynput_quick_press:
-                self._key_press(self.data.pynput_quick_press.pop(), quick_press=True)
+            for opcode in self.data.pynput_quick_press:
+                self._key_press(opcode, quick_press=True)
+            self.data.pynput_quick_press.clear()
+
+            # Send the hold duration of any released keys
+            for keycode in tuple(data.key_held):
+                if keycode not in data.pynput_opcodes:
+                    self._send_key_held(keycode)
 
             # Determine which gamepads are connected
+            buttons_pressed: set[tuple[int, int]] = set()
             if self.track_gamepad and XInput is not None:
                 if self._controller_listener.triggered:
                     data.gamepads_current = XInput.get_connected()
@@ -490,12 +651,18 @@ class Tracking(Component):
                             button = f'BUTTON_{button}'
                         keycode = XINPUT_OPCODES[button]
 
-                        press_start, press_latest = data.button_presses.get(keycode, (0, 0))
+                        buttons_pressed.add((gamepad, keycode))
+                        press_start, press_latest = data.button_presses.get(keycode, (tick, tick))
                         if press_latest != tick - 1:
+                            if (gamepad, keycode) in data.button_held:
+                                self._send_button_held(gamepad, keycode)
                             self.send_data(ipc.ButtonPress(gamepad, keycode))
                             data.button_presses[keycode] = (tick, tick)
                         else:
-                            self.send_data(ipc.ButtonHeld(gamepad, keycode))
+                            held_ticks = data.button_held.get((gamepad, keycode), 0) + 1
+                            data.button_held[(gamepad, keycode)] = held_ticks
+                            if held_ticks >= HELD_CHECKPOINT_TICKS:
+                                self._send_button_held(gamepad, keycode)
                             data.button_presses[keycode] = (press_start, tick)
 
                     if stick_l != data.gamepad_stick_l_position.get(gamepad):
@@ -508,7 +675,12 @@ class Tracking(Component):
                         data.gamepad_stick_r_position[gamepad] = stick_r
                         self.send_data(ipc.ThumbstickMove(gamepad, ipc.ThumbstickMove.Thumbstick.Right, stick_r))
 
-            if self.track_network and not tick % UPDATES_PER_SECOND:
+            # Send the hold duration of any released buttons
+            for gamepad, keycode in tuple(data.button_held):
+                if (gamepad, keycode) not in buttons_pressed:
+                    self._send_button_held(gamepad, keycode)
+
+            if self.track_network and tick // UPDATES_PER_SECOND != (tick - ticks) // UPDATES_PER_SECOND:
                 for interface_name, counters in psutil.net_io_counters(pernic=True).items():
                     prev_sent = data.bytes_sent_previous.get(interface_name, 0)
                     prev_recv = data.bytes_recv_previous.get(interface_name, 0)
@@ -528,14 +700,25 @@ class Tracking(Component):
                         if mac_address is not None:
                             self.send_data(ipc.DataTransfer(mac_address, bytes_sent, bytes_recv))
 
+            if data.tick_modified is not None:
+                self._last_input = time.perf_counter()
             self._calculate_inactivity()
 
             # Save every 5 mins
-            if self.autosave and tick and not tick % int(UPDATES_PER_SECOND * GlobalConfig.save_frequency):
+            save_ticks = int(UPDATES_PER_SECOND * GlobalConfig.save_frequency)
+            save = self.autosave and tick > 0 and tick // save_ticks != (tick - ticks) // save_ticks
+
+            # Make sure the elapsed time is up to date before saving
+            self._send_batch(force=save)
+            if save:
                 self.send_data(ipc.Save())
 
+            self._update_polling_rate(data)
+
     def on_exit(self) -> None:
         """Close threads on exit."""
         self._pynput_mouse_listener.stop()
         self._pynput_keyboard_listener.stop()
         self._monitor_listener.stop()
+        if self._recorder is not None:
+            self._recorder.close()
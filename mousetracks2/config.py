@@ -26,8 +26,16 @@ class GlobalConfig:
         save_frequency: How often to autosave.
         max_loaded_profiles: Maximum amount of loaded profiles.
             This will only affect profiles without unsaved changes.
+        polling_rate: How many times per second to check for input.
+            This is rounded up to a multiple of the tick rate.
+        idle_polling_rate: How many times per second to check for input when idle.
+        idle_polling_delay: How long without input before the idle polling rate is used.
+            Set to 0 to always use the full polling rate.
         component_check_frequency: How often to check all components are running.
             This is used once per message received.
+        component_restart_delay: How long to wait before restarting a failed component.
+            This doubles each time it fails in a row.
+        component_restart_limit: How many times in a row a component can fail before shutting down.
         shutdown_timeout: How long to wait before shutting down automatically.
             This is to avoid blocking Windows from shutting down.
             The default `HungAppTimeout` is 5 seconds and `WaitToKillAppTimeout` is
@@ -44,7 +52,12 @@ class GlobalConfig:
     inactivity_time: float = 300.0
     save_frequency: float = 600.0
     max_loaded_profiles: int = 8
+    polling_rate: int = 60
+    idle_polling_rate: int = 5
+    idle_polling_delay: float = 1.0
     component_check_frequency: float = 1.0
+    component_restart_delay: float = 1.0
+    component_restart_limit: int = 5
     shutdown_timeout: float = 15.0
     export_notification_timeout: float = 7.0
     preview_frequency_multiplier: float = 1.0
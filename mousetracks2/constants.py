@@ -1,6 +1,10 @@
 DEFAULT_PROFILE_NAME = 'Desktop'
 
 UPDATES_PER_SECOND = 60
+"""Number of ticks per second.
+All stored tick counts use this as their unit, regardless of how often
+the input is polled.
+"""
 
 DOUBLE_CLICK_MS = 500
 """Maximum time in ms where a double click is valid."""
@@ -135,5 +135,10 @@ class Context:
         """Determine if running straight after being installed."""
         return self.cli.post_install
 
+    @property
+    def record_input(self) -> Path | None:
+        """Path to record the tracking data to."""
+        return self.cli.record_input
+
 
 CTX = Context()
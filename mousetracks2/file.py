@@ -248,7 +248,7 @@ class MovementMaps:
     distance: float = field(default=0.0)
     counter: int = field(default=0)
     ticks: int = field(default=0)
-    tick: int = field(default=0)  # TODO: Don't store here
+    poll: int = field(default=0)  # TODO: Don't store here
 
 
     def requires_compression(self, threshold: int = COMPRESSION_THRESHOLD) -> bool:
@@ -9,7 +9,7 @@ import time
 import webbrowser
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import cast, Any, Generic, Iterable, Iterator, TypeVar, TYPE_CHECKING
+from typing import cast, Any, Iterable, Iterator, TYPE_CHECKING
 
 import numpy as np
 from PIL import Image
@@ -21,6 +21,7 @@ from .ui import layout
 from .utils import format_distance, format_ticks, format_bytes, format_network_speed, ICON_PATH
 from .widgets import Pixel, AutoCloseMessageBox
 from ..components import ipc
+from ..components.tracing import export_csv, trace_handler
 from ..cli import CLI
 from ..config import GlobalConfig
 from ..constants import COMPRESSION_FACTOR, COMPRESSION_THRESHOLD, RADIAL_ARRAY_SIZE
@@ -29,12 +30,15 @@ from ..context import CTX
 from ..enums import BlendMode, Channel
 from ..file import PROFILE_DIR, get_profile_names, get_filename, sanitise_profile_name, TrackingProfile
 from ..gui.utils import should_minimise_on_start
+from ..layers import LAYER_PRESETS, LayerOption
 from ..legacy import colours
 from ..runtime import SYS_EXECUTABLE
 from ..types import Application
 from ..utils import keycodes
 from ..utils.input import get_cursor_pos
 from ..utils.math import calculate_distance
+from ..utils.histogram import Histogram
+from ..utils.shared_memory import SharedArray
 from ..utils.system import SUPPORTS_TRAY, set_autostart, remove_autostart, split_autostart
 from ..utils.update import is_latest_version, background_update
 
@@ -42,7 +46,13 @@ if TYPE_CHECKING:
     from ..components.gui import GUI
 
 
-T = TypeVar('T')
+_COMPONENT_NAMES = {
+    ipc.Target.Hub: 'Hub',
+    ipc.Target.Tracking: 'Tracking',
+    ipc.Target.Processing: 'Processing',
+    ipc.Target.GUI: 'GUI',
+    ipc.Target.AppDetection: 'AppDetection',
+}
 
 
 def _get_docs_folder() -> Path:
@@ -57,64 +67,6 @@ class MapData:
     counter: int = field(default=0)
 
 
-@dataclass
-class RenderOption(Generic[T]):
-    """Store different values per render type."""
-
-    movement: T
-    speed: T
-    heatmap: T
-    keyboard: T
-
-    def get(self, render_type: ipc.RenderType) -> T:
-        """Get the value for a render type."""
-        match render_type:
-            case (ipc.RenderType.MouseMovement | ipc.RenderType.ThumbstickMovement):
-                return self.movement
-            case ipc.RenderType.MouseSpeed | ipc.RenderType.ThumbstickSpeed:
-                return self.speed
-            case (ipc.RenderType.SingleClick | ipc.RenderType.DoubleClick | ipc.RenderType.HeldClick
-                  | ipc.RenderType.ThumbstickPosition | ipc.RenderType.MousePosition):
-                return self.heatmap
-            case ipc.RenderType.KeyboardHeatmap:
-                return self.keyboard
-            case _:
-                raise NotImplementedError(f'Unsupported render type: {render_type}')
-
-    def set(self, render_type: ipc.RenderType, value: T) -> None:
-        """Set the value for a render type."""
-        match render_type:
-            case (ipc.RenderType.MouseMovement | ipc.RenderType.ThumbstickMovement):
-                self.movement = value
-            case ipc.RenderType.MouseSpeed | ipc.RenderType.ThumbstickSpeed:
-                self.speed = value
-            case (ipc.RenderType.SingleClick | ipc.RenderType.DoubleClick | ipc.RenderType.HeldClick
-                  | ipc.RenderType.ThumbstickPosition | ipc.RenderType.MousePosition):
-                self.heatmap = value
-            case ipc.RenderType.KeyboardHeatmap:
-                self.keyboard = value
-            case _:
-                raise NotImplementedError(f'Unsupported render type: {render_type}')
-
-
-@dataclass
-class LayerOption:
-    render_type: ipc.RenderType
-    blend_mode: BlendMode = BlendMode.Normal
-    channels: Channel = Channel.RGBA
-    opacity: int = 100
-    render_colour: RenderOption = field(default_factory=lambda: RenderOption('Ice', 'Ice', 'Jet', 'Aqua'))
-    contrast: RenderOption = field(default_factory=lambda: RenderOption(1.0, 1.0, 1.0, 1.0))
-    padding: RenderOption = field(default_factory=lambda: RenderOption(0, 0, 0, 0))
-    clipping: RenderOption = field(default_factory=lambda: RenderOption(0.0, 0.0, 0.001, 0.0))
-    blur: RenderOption = field(default_factory=lambda: RenderOption(0.0, 0.0, 0.0125, 0.0))
-    linear: RenderOption = field(default_factory=lambda: RenderOption(False, True, True, False))
-    invert: RenderOption = field(default_factory=lambda: RenderOption(False, False, False, False))
-    show_left_clicks: bool = True
-    show_middle_clicks: bool = True
-    show_right_clicks: bool = True
-
-
 @dataclass
 class NetworkSpeedStats:
     """Store data for the "Current Upload/Download" stats."""
@@ -180,7 +132,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.config = GlobalConfig()
 
         # Set initial states
-        self.pause_redraw = 0
+        self.pause_redraw = False
         self.pause_colour_change = False
         self._pixel_redraw_queue: list[tuple[tuple[int, int] | None, tuple[int, int] | None, tuple[int, int] | None]] = []
         self._last_save_time = self._last_thumbnail_time = self._last_app_reload_time = int(time.time() * 10)
@@ -200,6 +152,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self._waiting_on_save = False
         self._last_save_message: ipc.SaveComplete | None
         self._thumbnail_redraw_required = False
+        self._render_request_id = 0
+        self._trace_export_path: str | None = None
+        self._trace_results: dict[str, dict[tuple[str, str], Histogram]] = {}
+        self._last_render_layers: list[ipc.RenderLayer] = []
         self._resolution_options: dict[tuple[int, int], bool] = {}
         self._is_updating_layer_options = False
         self._window_ready = False
@@ -389,6 +345,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui.prefs_track_network.triggered.connect(self.set_network_tracking_enabled)
         self.ui.debug_pause_app.triggered.connect(self.set_app_detection_disabled)
         self.ui.debug_pause_monitor.triggered.connect(self.set_monitor_check_disabled)
+        self.ui.debug_trace_messages.triggered.connect(self.set_message_tracing)
+        self.ui.debug_trace_export.triggered.connect(self.export_message_trace)
         self.ui.full_screen.triggered.connect(self.toggle_full_screen)
         self.ui.file_import.triggered.connect(self.import_profile)
         self.ui.export_mouse_stats.triggered.connect(self.export_mouse_stats)
@@ -1269,9 +1227,14 @@ class MainWindow(QtWidgets.QMainWindow):
         if not self.isVisible():
             return False
 
+        # Render progressively if anything other than the data has changed
+        layers = list(self.get_render_layer_data())
+        progressive = layers != self._last_render_layers
+
         # Prevent too many requests from queuing up
-        # This ensures there's at most 2
-        if self.pause_redraw:
+        # Changes to the render are still sent, as the processing
+        # component will drop the request it replaces
+        if self.pause_redraw and not progressive:
             self._thumbnail_redraw_required = True
             return True
 
@@ -1282,7 +1245,7 @@ class MainWindow(QtWidgets.QMainWindow):
             return False
 
         # Flag if drawing to prevent building up duplicate commands
-        self.pause_redraw += 1
+        self.pause_redraw = True
 
         # Account for collapsed splitters
         if not self.ui.horizontal_splitter.sizes()[1] and self.ui.horizontal_splitter.is_handle_visible():
@@ -1313,7 +1276,9 @@ class MainWindow(QtWidgets.QMainWindow):
         if use_custom_height:
             height = min(height, custom_height)
 
-        self.component.send_data(ipc.RenderLayerRequest(list(self.get_render_layer_data())))
+        self._last_render_layers = layers
+        self._render_request_id += 1
+        self.component.send_data(ipc.RenderLayerRequest(layers, self._render_request_id, progressive))
         return True
 
     def get_render_layer_data(self, file_path: str | None = None) -> Iterator[ipc.RenderLayer]:
@@ -1527,6 +1492,96 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.request_thumbnail():
             self.last_render = (self.render_type, count)
 
+    def _render_complete(self, array: np.ndarray, request: ipc.RenderRequest, progressive: bool = False) -> None:
+        """Display or save a completed render.
+        The array may be in shared memory, so no references to it must
+        be kept after this returns.
+        """
+        if array.any():
+            height, width, channels = array.shape
+        else:
+            height = width = channels = 0
+        failed = width == height == 0
+
+        # Progressive renders are scaled up to fit the requested resolution
+        if progressive:
+            target_height = request.height or height
+            target_width = request.width or width
+        else:
+            target_height = round(height / (request.sampling or 1))
+            target_width = round(width / (request.sampling or 1))
+
+        # Draw the new pixmap
+        if request.file_path is None:
+            self._timer_rendering.stop()
+            self.ui.thumbnail.hide_rendering_text()
+            self._last_thumbnail_time = int(time.time() * 10)
+
+            if failed:
+                self.ui.thumbnail.set_pixmap(QtGui.QPixmap())
+
+            else:
+                stride = channels * width
+
+                # Normalise down to 8 bit arrays
+                if array.dtype != np.uint8:
+                    match array.dtype:
+                        case np.uint16:
+                            array = array / 257
+                        case np.uint32:
+                            array = array / (65537 * 257)
+                        case np.uint64:
+                            array = array / (4294967297 * 65537 * 257)
+                        case _:
+                            raise NotImplementedError(array.dtype)
+                    array = array.round().astype(np.uint8)
+
+                match channels:
+                    case 1:
+                        image_format = QtGui.QImage.Format.Format_Grayscale8
+                    case 3:
+                        image_format = QtGui.QImage.Format.Format_RGB888
+                    case 4:
+                        image_format = QtGui.QImage.Format.Format_RGBA8888
+                    case _:
+                        raise NotImplementedError(channels)
+
+                image = QtGui.QImage(array.data, width, height, stride, image_format)
+
+                # Scale the QImage to fit the pixmap size
+                scaled_image = image.scaled(target_width, target_height, QtCore.Qt.AspectRatioMode.KeepAspectRatio, QtCore.Qt.TransformationMode.SmoothTransformation)
+
+                # Qt skips the scale if the size matches, so force a copy to detach from the array memory
+                if scaled_image.cacheKey() == image.cacheKey():
+                    scaled_image = image.copy()
+                self.ui.thumbnail.set_pixmap(scaled_image)
+
+            # Wait for the full render
+            if progressive:
+                return
+
+            self.pause_redraw = False
+
+            # Check if the flag was set that a new thumbnail was requested
+            if not self.pause_redraw and self._thumbnail_redraw_required:
+                self._request_thumbnail()
+                self._thumbnail_redraw_required = False
+
+        # Save a render
+        elif failed:
+            msg = QtWidgets.QMessageBox(self)
+            msg.setWindowTitle('Render Failed')
+            msg.setIcon(QtWidgets.QMessageBox.Icon.Critical)
+            msg.setText('No data is available for this render.')
+            msg.setStandardButtons(QtWidgets.QMessageBox.StandardButton.Ok)
+            msg.exec()
+
+        else:
+            im = Image.fromarray(array)
+            im = im.resize((target_width, target_height), Image.Resampling.LANCZOS)
+            im.save(request.file_path)
+            os.startfile(request.file_path)
+
     def process_message(self, message: ipc.Message) -> None:
         """Process messages and send back data if any exception occurs."""
         try:
@@ -1534,12 +1589,17 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception as e:
             self.exception_raised.emit(e)
 
+    @trace_handler
     def _process_message(self, message: ipc.Message) -> None:
         """Process messages."""
         match message:
+            case ipc.TickBatch():
+                for item in message:
+                    self._process_message(item)
+
             case ipc.Tick() if self.is_live:
                 self.tick_current = message.tick
-                self.elapsed_time += 1
+                self.elapsed_time += message.ticks
                 self.thumbnail_render_check()
 
             case ipc.Active() if self.is_live:
@@ -1584,81 +1644,24 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.component.set_monitor_data(message.data)
 
             case ipc.Render():
-                if message.array.any():
-                    height, width, channels = message.array.shape
-                else:
-                    height = width = channels = 0
-                failed = width == height == 0
-
-                target_height = round(height / (message.request.sampling or 1))
-                target_width = round(width / (message.request.sampling or 1))
-
-                # Draw the new pixmap
-                if message.request.file_path is None:
-                    self._timer_rendering.stop()
-                    self.ui.thumbnail.hide_rendering_text()
-                    self._last_thumbnail_time = int(time.time() * 10)
-
-                    if failed:
-                        self.ui.thumbnail.set_pixmap(QtGui.QPixmap())
-
-                    else:
-                        stride = channels * width
-                        array = message.array
-
-                        # Normalise down to 8 bit arrays
-                        if array.dtype != np.uint8:
-                            match message.array.dtype:
-                                case np.uint16:
-                                    array = message.array / 257
-                                case np.uint32:
-                                    array = message.array / (65537 * 257)
-                                case np.uint64:
-                                    array = message.array / (4294967297 * 65537 * 257)
-                                case _:
-                                    raise NotImplementedError(array.dtype)
-                            array = array.round().astype(np.uint8)
-
-                        match channels:
-                            case 1:
-                                image_format = QtGui.QImage.Format.Format_Grayscale8
-                            case 3:
-                                image_format = QtGui.QImage.Format.Format_RGB888
-                            case 4:
-                                image_format = QtGui.QImage.Format.Format_RGBA8888
-                            case _:
-                                raise NotImplementedError(channels)
-
-                        image = QtGui.QImage(array.data, width, height, stride, image_format)
-
-                        # Scale the QImage to fit the pixmap size
-                        scaled_image = image.scaled(target_width, target_height, QtCore.Qt.AspectRatioMode.KeepAspectRatio, QtCore.Qt.TransformationMode.SmoothTransformation)
-                        self.ui.thumbnail.set_pixmap(scaled_image)
-
-                    self.pause_redraw -= 1
-
-                    # Check if the flag was set that a new thumbnail was requested
-                    if not self.pause_redraw and self._thumbnail_redraw_required:
-                        self._request_thumbnail()
-                        self._thumbnail_redraw_required = False
-
-                # Save a render
-                elif failed:
-                    msg = QtWidgets.QMessageBox(self)
-                    msg.setWindowTitle('Render Failed')
-                    msg.setIcon(QtWidgets.QMessageBox.Icon.Critical)
-                    msg.setText('No data is available for this render.')
-                    msg.setStandardButtons(QtWidgets.QMessageBox.StandardButton.Ok)
-                    msg.exec()
+                # Discard the preview if a newer request has been sent
+                if message.request.file_path is None and message.request_id != self._render_request_id:
+                    if isinstance(message.array, SharedArray):
+                        self.component.send_data(ipc.RenderBufferRelease(message.array.name))
+
+                elif isinstance(message.array, SharedArray):
+                    # Release the buffer even if the render fails, or it will stay in use
+                    try:
+                        with message.array.attach() as array:
+                            self._render_complete(array, message.request, message.progressive)
+                    finally:
+                        self.component.send_data(ipc.RenderBufferRelease(message.array.name))
 
                 else:
-                    im = Image.fromarray(message.array)
-                    im = im.resize((target_width, target_height), Image.Resampling.LANCZOS)
-                    im.save(message.request.file_path)
-                    os.startfile(message.request.file_path)
+                    self._render_complete(message.array, message.request, message.progressive)
 
             case ipc.MouseHeld() if self.is_live and self.mouse_tracking_enabled and not self.component.app_resizing:
-                self.mouse_held_count += 1
+                self.mouse_held_count += message.ticks
 
             case ipc.MouseMove() if self.is_live and self.mouse_tracking_enabled:
                 if self.render_type == ipc.RenderType.MouseMovement and not self.component.app_resizing:
@@ -1706,7 +1709,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
             case ipc.KeyHeld() if self.is_live and self.ui.track_keyboard.isChecked():
                 if message.keycode in keycodes.SCROLL_CODES:
-                    self.mouse_scroll_count += 1
+                    self.mouse_scroll_count += message.ticks
 
             case ipc.ButtonPress() if self.is_live and self.ui.track_gamepad.isChecked():
                 self.button_press_count += 1
@@ -1854,14 +1857,15 @@ class MainWindow(QtWidgets.QMainWindow):
             # Update the GUI with the component statuses
             case ipc.QueueSize():
                 widget_values = {
-                    (self.ui.status_hub_state, self.ui.status_hub_queue): message.hub,
-                    (self.ui.status_tracking_state, self.ui.status_tracking_queue): message.tracking,
-                    (self.ui.status_processing_state, self.ui.status_processing_queue): message.processing,
-                    (self.ui.status_gui_state, self.ui.status_gui_queue): message.gui,
-                    (self.ui.status_app_state, self.ui.status_app_queue): message.app_detection,
+                    (self.ui.status_hub_state, self.ui.status_hub_queue): (message.hub, message.hub_bulk),
+                    (self.ui.status_tracking_state, self.ui.status_tracking_queue): (message.tracking, message.tracking_bulk),
+                    (self.ui.status_processing_state, self.ui.status_processing_queue): (message.processing, message.processing_bulk),
+                    (self.ui.status_gui_state, self.ui.status_gui_queue): (message.gui, message.gui_bulk),
+                    (self.ui.status_app_state, self.ui.status_app_queue): (message.app_detection, message.app_detection_bulk),
                 }
 
-                for (status_widget, queue_widget), value in widget_values.items():
+                for (status_widget, queue_widget), (control, bulk) in widget_values.items():
+                    value = control + bulk
                     match self.state:
                         case ipc.TrackingState.Running:
                             if value < 5:
@@ -1875,7 +1879,7 @@ class MainWindow(QtWidgets.QMainWindow):
                         case _:
                             state = 'Unknown'
                     status_widget.setText(state)
-                    queue_widget.setText(str(value))
+                    queue_widget.setText(f'{control} + {bulk}' if bulk else str(control))
 
             case ipc.InvalidConsole():
                 self.ui.prefs_console.setEnabled(False)
@@ -1931,9 +1935,20 @@ class MainWindow(QtWidgets.QMainWindow):
                     case ipc.Target.AppDetection:
                         self.ui.status_app_pid.setText(str(message.pid))
 
+            case ipc.DebugTraceStats():
+                if self._trace_export_path is not None:
+                    self._trace_results[_COMPONENT_NAMES[message.source]] = message.histograms
+                    export_csv(self._trace_export_path, self._trace_results)
+
             case ipc.AllComponentsLoaded():
                 self.on_app_ready()
 
+            # Any render in progress was lost, so request it again
+            case ipc.ComponentRestarted(component=ipc.Target.Processing):
+                self.pause_redraw = False
+                self._thumbnail_redraw_required = False
+                self.request_thumbnail()
+
             case ipc.ShowPopup():
                 self.notify(message.content)
 
@@ -2511,6 +2526,24 @@ class MainWindow(QtWidgets.QMainWindow):
     def set_monitor_check_disabled(self, value: bool) -> None:
         self.component.send_data(ipc.DebugDisableMonitorCheck(value))
 
+    @QtCore.Slot(bool)
+    def set_message_tracing(self, value: bool) -> None:
+        self.component.send_data(ipc.DebugSetTracing(value))
+
+    @QtCore.Slot()
+    def export_message_trace(self) -> None:
+        """Export the message tracing results.
+        Each component replies separately, so the file is rewritten
+        every time a result is received.
+        """
+        export_dir = _get_docs_folder() / 'Message Trace.csv'
+        file_path, accept = QtWidgets.QFileDialog.getSaveFileName(self, 'Save Message Trace', str(export_dir),
+                                                                  'CSV Files (*.csv)')
+        if accept:
+            self._trace_export_path = file_path
+            self._trace_results = {}
+            self.component.send_data(ipc.DebugRequestTraceStats())
+
     def mark_profiles_saved(self, *profile_names: str) -> None:
         """Mark profiles as saved."""
         for sanitised_profile_name, profile_name in self._profile_names.items():
@@ -2980,8 +3013,8 @@ class MainWindow(QtWidgets.QMainWindow):
     @QtCore.Slot(int)
     def layer_preset_chosen(self, idx: int) -> None:
         """Load in a layer preset.
-        This is hardcoded for now as the current system wouldn't work
-        well with loading from a file.
+        The presets are hardcoded in `layers.LAYER_PRESETS` for now, as
+        the current system wouldn't work well with loading from a file.
         """
         if not idx:
             return
@@ -2992,143 +3025,14 @@ class MainWindow(QtWidgets.QMainWindow):
                 layer_0 = self.add_render_layer()
                 layer_0.setCheckState(QtCore.Qt.CheckState.Checked)
 
-            case 'Heatmap Overlay':
-                self.ui.layer_list.clear()
-                layer_0 = self.add_render_layer()
-                layer_0.setCheckState(QtCore.Qt.CheckState.Checked)
-                layer_1 = self.add_render_layer()
-                layer_1.setCheckState(QtCore.Qt.CheckState.Checked)
-
-                self._selected_layer = layer_0.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.MouseMovement
-
-                self._selected_layer = layer_1.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.opacity = 50
-                self.selected_layer.render_type = ipc.RenderType.SingleClick
-                self.selected_layer.blend_mode = BlendMode.LuminanceMask
-                self.selected_layer.clipping.heatmap = 0.01
-                self.selected_layer.contrast.heatmap = 1.5
-
-            case 'Heatmap Tracks':
-                self.ui.layer_list.clear()
-                layer_0 = self.add_render_layer()
-                layer_0.setCheckState(QtCore.Qt.CheckState.Checked)
-                layer_1 = self.add_render_layer()
-                layer_1.setCheckState(QtCore.Qt.CheckState.Checked)
-
-                self._selected_layer = layer_0.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.MouseMovement
-                self.selected_layer.render_colour.movement = 'Chalk'
-
-                self._selected_layer = layer_1.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.blend_mode = BlendMode.Multiply
-                self.selected_layer.render_type = ipc.RenderType.MousePosition
-                self.selected_layer.render_colour.heatmap = 'Inferno'
-                self.selected_layer.blur.heatmap = 0.001
-
-            case 'Alpha Multiply':
-                self.ui.layer_list.clear()
-                layer_0 = self.add_render_layer()
-                layer_0.setCheckState(QtCore.Qt.CheckState.Checked)
-                layer_1 = self.add_render_layer()
-                layer_1.setCheckState(QtCore.Qt.CheckState.Checked)
-
-                self._selected_layer = layer_0.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.MouseMovement
-
-                self._selected_layer = layer_1.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.MousePosition
-                self.selected_layer.blend_mode = BlendMode.Multiply
-                self.selected_layer.channels = Channel.A
-                self.selected_layer.render_colour.heatmap = 'TransparentWhiteToWhite'
-                self.selected_layer.blur.heatmap = 0
-                self.selected_layer.clipping.heatmap = 0.85
-                self.selected_layer.contrast.heatmap = 0.5
-
-            case 'Urban Moss':
-                self.ui.layer_list.clear()
-                layer_0 = self.add_render_layer()
-                layer_0.setCheckState(QtCore.Qt.CheckState.Checked)
-                layer_1 = self.add_render_layer()
-                layer_1.setCheckState(QtCore.Qt.CheckState.Checked)
-
-                self._selected_layer = layer_0.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.MouseMovement
-                self.selected_layer.render_colour.movement = 'Chalk'
-
-                self._selected_layer = layer_1.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.MouseSpeed
-                self.selected_layer.render_colour.speed = 'TransparentBlackToBlackToGreen'
-
-            case 'Eraser':
+            case preset if preset in LAYER_PRESETS:
                 self.ui.layer_list.clear()
-                layer_0 = self.add_render_layer()
-                layer_0.setCheckState(QtCore.Qt.CheckState.Checked)
-                layer_1 = self.add_render_layer()
-                layer_1.setCheckState(QtCore.Qt.CheckState.Checked)
-
-                self._selected_layer = layer_0.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.MouseMovement
-                self.selected_layer.render_colour.movement = 'Graphite'
-
-                self._selected_layer = layer_1.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.SingleClick
-                self.selected_layer.blend_mode = BlendMode.Subtract
-                self.selected_layer.render_colour.heatmap = 'TransparentWhiteToWhite'
-                self.selected_layer.channels = Channel.A
-                self.selected_layer.clipping.heatmap = 0.2
-                self.selected_layer.contrast.heatmap = 1.5
-
-            case 'Plasma':
-                self.ui.layer_list.clear()
-                layer_0 = self.add_render_layer()
-                layer_0.setCheckState(QtCore.Qt.CheckState.Checked)
-                layer_1 = self.add_render_layer()
-                layer_1.setCheckState(QtCore.Qt.CheckState.Checked)
-
-                self._selected_layer = layer_0.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.MouseMovement
-                self.selected_layer.render_colour.movement = 'Demon'
-
-                self._selected_layer = layer_1.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.render_type = ipc.RenderType.SingleClick
-                self.selected_layer.blend_mode = BlendMode.HardLight
-                self.selected_layer.render_colour.heatmap = 'Riptide'
-                self.selected_layer.clipping.heatmap = 0.01
-                self.selected_layer.blur.heatmap = 0.02
-
-            case 'RGB Clicks':
-                self.ui.layer_list.clear()
-                layer_0 = self.add_render_layer()
-                layer_0.setCheckState(QtCore.Qt.CheckState.Checked)
-                layer_1 = self.add_render_layer()
-                layer_1.setCheckState(QtCore.Qt.CheckState.Checked)
-                layer_2 = self.add_render_layer()
-                layer_2.setCheckState(QtCore.Qt.CheckState.Checked)
-
-                self._selected_layer = layer_0.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.blend_mode = BlendMode.Screen
-                self.selected_layer.render_type = ipc.RenderType.SingleClick
-                self.selected_layer.render_colour.heatmap = 'Chalk'
-                self.selected_layer.show_middle_clicks = False
-                self.selected_layer.show_right_clicks = False
-                self.selected_layer.channels = Channel.R | Channel.A
-
-                self._selected_layer = layer_1.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.blend_mode = BlendMode.Screen
-                self.selected_layer.render_type = ipc.RenderType.SingleClick
-                self.selected_layer.render_colour.heatmap = 'Chalk'
-                self.selected_layer.show_left_clicks = False
-                self.selected_layer.show_right_clicks = False
-                self.selected_layer.channels = Channel.G | Channel.A
-
-                self._selected_layer = layer_2.data(QtCore.Qt.ItemDataRole.UserRole)
-                self.selected_layer.blend_mode = BlendMode.Screen
-                self.selected_layer.render_type = ipc.RenderType.SingleClick
-                self.selected_layer.render_colour.heatmap = 'Chalk'
-                self.selected_layer.show_left_clicks = False
-                self.selected_layer.show_middle_clicks = False
-                self.selected_layer.channels = Channel.B | Channel.A
+                for i, layer_option in enumerate(LAYER_PRESETS[preset]()):
+                    item = self.add_render_layer()
+                    item.setCheckState(QtCore.Qt.CheckState.Checked)
+                    self._layers[item.data(QtCore.Qt.ItemDataRole.UserRole)] = layer_option
+                    if not i:
+                        layer_0 = item
 
         self._selected_layer = 0
         self.ui.layer_presets.setCurrentIndex(0)
@@ -135,6 +135,11 @@ class Ui_MainWindow(object):
         self.debug_pause_monitor = QAction(MainWindow)
         self.debug_pause_monitor.setObjectName(u"debug_pause_monitor")
         self.debug_pause_monitor.setCheckable(True)
+        self.debug_trace_messages = QAction(MainWindow)
+        self.debug_trace_messages.setObjectName(u"debug_trace_messages")
+        self.debug_trace_messages.setCheckable(True)
+        self.debug_trace_export = QAction(MainWindow)
+        self.debug_trace_export.setObjectName(u"debug_trace_export")
         self.centralwidget = QWidget(MainWindow)
         self.centralwidget.setObjectName(u"centralwidget")
         self.main_layout = QVBoxLayout(self.centralwidget)
@@ -1401,6 +1406,8 @@ class Ui_MainWindow(object):
         self.menu_debug.addAction(self.menu_debug_raise.menuAction())
         self.menu_debug.addAction(self.debug_pause_app)
         self.menu_debug.addAction(self.debug_pause_monitor)
+        self.menu_debug.addAction(self.debug_trace_messages)
+        self.menu_debug.addAction(self.debug_trace_export)
         self.menu_debug_state.addAction(self.debug_state_running)
         self.menu_debug_state.addAction(self.debug_state_paused)
         self.menu_debug_state.addAction(self.debug_state_stopped)
@@ -1488,6 +1495,8 @@ class Ui_MainWindow(object):
         self.link_donate.setText(QCoreApplication.translate("MainWindow", u"Donate", None))
         self.debug_pause_app.setText(QCoreApplication.translate("MainWindow", u"Pause Application Detection", None))
         self.debug_pause_monitor.setText(QCoreApplication.translate("MainWindow", u"Pause Monitor Check", None))
+        self.debug_trace_messages.setText(QCoreApplication.translate("MainWindow", u"Trace Messages", None))
+        self.debug_trace_export.setText(QCoreApplication.translate("MainWindow", u"Export Message Trace", None))
 #if QT_CONFIG(tooltip)
         self.thumbnail.setToolTip(QCoreApplication.translate("MainWindow", u"Live preview of the render.\n"
 "\n"
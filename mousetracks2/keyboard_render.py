@@ -0,0 +1,339 @@
+"""Render keyboard heatmaps.
+
+This replaces the per pixel drawing of `legacy.keyboard.DrawKeyboard`.
+The layout only depends on the keyboard layout and size multiplier, so
+it is calculated once and stored as a label image, where each pixel is
+set to the index of the key it belongs to. Colouring the keys is then a
+single lookup through a colour table, and the text is pasted from a
+cache of pre-rendered glyphs.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+from PIL import Image, ImageDraw, ImageFont
+
+from .constants import UPDATES_PER_SECOND
+from .gui.utils import format_ticks
+from .legacy.colours import COLOUR_FILE, ColourRange, get_luminance, parse_colour_file, parse_colour_text, to_lower
+from .legacy.keyboard import FONT_LIB, GLOBALS, KeyboardButton, keyboard_layout, parse_keys
+from .legacy.keyboard import shorten_number, ticks_to_seconds
+
+
+DEFAULT_FONT = FONT_LIB / 'liberation-sans.regular.ttf'
+
+SHADOW_COLOUR = (64, 64, 64)
+
+
+@dataclass(frozen=True)
+class KeyGeometry:
+    """Store the position of a single key."""
+
+    name: str
+    """Name of the key in the layout, either a keycode or the text to display."""
+
+    display_name: str
+    """Text to write on the key."""
+
+    offset: tuple[int, int]
+    """Top left corner of the key."""
+
+    dimensions: tuple[float, float]
+    """Size of the key, where 1 is the size of a standard key."""
+
+    hide_background: bool
+    """If the key is not filled or outlined."""
+
+    @property
+    def keycode(self) -> int | None:
+        """Get the keycode if the key is linked to one."""
+        if self.name.isdigit():
+            return int(self.name)
+        return None
+
+
+@dataclass(frozen=True)
+class KeyboardGeometry:
+    """Store the pixels of every key for a keyboard layout."""
+
+    keys: tuple[KeyGeometry, ...]
+    """All keys in the layout."""
+
+    labels: npt.NDArray[np.int32]
+    """Image where each pixel is the index of its key plus one.
+    Any pixels set to 0 are part of the background.
+    """
+
+    outline: npt.NDArray[np.bool_]
+    """Mask of the key borders."""
+
+    shadow: npt.NDArray[np.bool_]
+    """Mask of the drop shadow."""
+
+    @property
+    def width(self) -> int:
+        """Get the width of the image."""
+        return self.labels.shape[1]
+
+    @property
+    def height(self) -> int:
+        """Get the height of the image."""
+        return self.labels.shape[0]
+
+
+@lru_cache(maxsize=8)
+def keyboard_geometry(multiplier: int, layout: str = 'en_US', extended: bool = True) -> KeyboardGeometry:
+    """Calculate the pixels of every key in a keyboard layout.
+    The result is cached, so must not be modified.
+    """
+    GLOBALS.multiplier = multiplier
+    key_names = dict(parse_keys())
+
+    keys: list[KeyGeometry] = []
+    fill_coordinates: list[list[tuple[int, int]]] = []
+    outline_coordinates: list[tuple[int, int]] = []
+    max_x = max_y = 0
+
+    y_offset = GLOBALS.image_padding
+    y_current = 0
+    for row in keyboard_layout(extended, layout=layout):
+        x_offset = GLOBALS.image_padding
+
+        for name, width, height in row:
+            x = round(GLOBALS.key_size * width + GLOBALS.key_padding * max(0.0, width - 1))
+            y = round(GLOBALS.key_size * height + GLOBALS.key_padding * max(0.0, height - 1))
+
+            if name is not None:
+                hide_background = name == '__STATS__'
+                display_name = key_names.get(int(name), name) if name.isdigit() else name
+                keys.append(KeyGeometry(name, display_name, (x_offset, y_offset), (width, height), hide_background))
+
+                button = KeyboardButton(x_offset, y_offset, x, y)
+                if hide_background:
+                    fill_coordinates.append([])
+                else:
+                    fill_coordinates.append(button.fill())
+                    outline_coordinates.extend(button.outline())
+
+            x_offset += GLOBALS.key_padding + x
+            y_current = max(y_current, GLOBALS.key_size, y - GLOBALS.key_padding)
+
+        # Decrease size of empty row
+        if row:
+            y_offset += GLOBALS.key_size + GLOBALS.key_padding
+        else:
+            y_offset += (GLOBALS.key_size + GLOBALS.key_padding) // 2
+
+        max_x = max(max_x, x_offset)
+        max_y = max(max_y, y_offset)
+        y_current -= GLOBALS.key_size
+
+    # Calculate total size of image
+    image_width = max_x + GLOBALS.image_padding - GLOBALS.key_padding + 1
+    image_height = max_y + GLOBALS.image_padding + y_current - GLOBALS.key_padding + GLOBALS.drop_shadow_y + 1
+
+    # Convert the coordinates to arrays
+    labels = np.zeros((image_height, image_width), dtype=np.int32)
+    for i, coordinates in enumerate(fill_coordinates):
+        if coordinates:
+            xs, ys = np.array(coordinates).T
+            labels[ys, xs] = i + 1
+
+    outline = np.zeros(labels.shape, dtype=np.bool_)
+    if outline_coordinates:
+        xs, ys = np.array(outline_coordinates).T
+        outline[ys, xs] = True
+
+    shadow = np.zeros(labels.shape, dtype=np.bool_)
+    dx, dy = GLOBALS.drop_shadow_x, GLOBALS.drop_shadow_y
+    shadow[dy:, dx:] = labels[:image_height - dy, :image_width - dx] != 0
+
+    for array in (labels, outline, shadow):
+        array.flags.writeable = False
+    return KeyboardGeometry(tuple(keys), labels, outline, shadow)
+
+
+@lru_cache(maxsize=1)
+def _colour_file() -> dict[str, Any]:
+    """Get the parsed colour file."""
+    return parse_colour_file(COLOUR_FILE)
+
+
+@lru_cache(maxsize=32)
+def _colour_map(colour_map: str) -> tuple[tuple[int, ...], ...]:
+    """Get the colours of a colour map.
+    If it is not valid, then it falls back to transparent.
+    """
+    maps = _colour_file()['Maps']
+    try:
+        return tuple(parse_colour_text(maps[to_lower(colour_map)]['Colour']))
+    except KeyError:
+        pass
+    try:
+        colours = parse_colour_text(colour_map)
+    # Old code, not worth fixing errors, just fallback to transparent
+    except Exception:  # pylint: disable=broad-exception-caught
+        colours = []
+    if len(colours) < 2:
+        return ((0, 0, 0, 0),)
+    return tuple(colours)
+
+
+@lru_cache(maxsize=32)
+def _font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    """Load a font."""
+    return ImageFont.truetype(path, size=size)
+
+
+@lru_cache(maxsize=2048)
+def _glyphs(text: str, font_path: str, size: int) -> tuple[Image.Image, tuple[int, int]]:
+    """Render text to a mask.
+    This is cached as most of the text is the same between renders.
+
+    Returns:
+        The mask, and the offset from the text position to paste it at.
+    """
+    font = _font(font_path, size)
+    bbox = ImageDraw.Draw(Image.new('L', (0, 0))).textbbox((0, 0), text, font=font)
+    left, top, right, bottom = map(int, bbox)
+    mask = Image.new('L', (max(1, right - left), max(1, bottom - top)))
+    ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+    return mask, (left, top)
+
+
+def _draw_text(image: Image.Image, position: tuple[int, int], text: str,
+               font_path: str, size: int, colour: tuple[int, ...]) -> None:
+    """Draw text to an image using the glyph cache."""
+    mask, (left, top) = _glyphs(text, font_path, size)
+    x = position[0] + left
+    y = position[1] + top
+    image.paste(colour[:3], (x, y, x + mask.width, y + mask.height), mask)
+
+
+def render_keyboard(profile_name: str, ticks: int, pressed_keys: dict[int, int], held_keys: dict[int, int],
+                    colour_map: str, data_set: str = 'count', multiplier: int = 1,
+                    font: Path | str = DEFAULT_FONT) -> Image.Image:
+    """Render a keyboard heatmap.
+
+    Parameters:
+        data_set: Either "count" or "time".
+            This is named after the text shown, so "count" will colour
+            the keys based on how long they were held for.
+    """
+    GLOBALS.multiplier = max(1, multiplier)
+    geometry = keyboard_geometry(GLOBALS.multiplier)
+
+    # Setup the colour range
+    if data_set == 'time':
+        data = pressed_keys.values()
+    elif data_set == 'count':
+        data = held_keys.values()
+    else:
+        raise ValueError('invalid dataset')
+
+    pools = sorted(set(data))
+    lookup = {v: i + 1 for i, v in enumerate(pools)}
+    lookup[0] = 0
+
+    colour_map_data = list(_colour_map(colour_map))
+    colour_range = ColourRange(0, len(pools) + 1, colour_map_data)
+
+    # Decide on background colour
+    parsed = _colour_file()
+    try:
+        background_text = parsed['Maps'][colour_map.lower()]['Background']['keyboard']
+    except KeyError:
+        background_text = None
+    if background_text is None:
+        background = colour_map_data[0]
+    else:
+        background = parse_colour_text(background_text)[0]
+    black = parsed['Colours']['black']['Colour']
+    white = parsed['Colours']['white']['Colour']
+
+    # Build the colour lookup table for each key
+    lut = np.empty((len(geometry.keys) + 1, 3), dtype=np.uint8)
+    lut[0] = background[:3]
+    text_colours: list[tuple[int, ...]] = []
+    for i, key in enumerate(geometry.keys):
+        keycode = key.keycode
+        if keycode is None:
+            key_count = 0
+        elif data_set == 'time':
+            key_count = pressed_keys.get(keycode, 0)
+        else:
+            key_count = held_keys.get(keycode, 0)
+
+        fill_colour = background if key.hide_background else colour_range[lookup[key_count]]
+        lut[i + 1] = fill_colour[:3]
+        text_colours.append(black if get_luminance(*fill_colour) > 128 else white)
+
+    # Colour everything in a single pass
+    array = lut[geometry.labels]
+    if (GLOBALS.drop_shadow_x or GLOBALS.drop_shadow_y) and tuple(background[:3]) == (255, 255, 255):
+        array[geometry.shadow & (geometry.labels == 0)] = SHADOW_COLOUR
+    array[geometry.outline] = [255 - i for i in background[:3]]
+    image = Image.fromarray(array)
+
+    # Generate stats
+    elapsed_time = ticks_to_seconds(ticks, 60)
+    stats = [f'Time elapsed: {elapsed_time}']
+    if data_set == 'count':
+        total_presses = shorten_number(sum(pressed_keys.values()), limit=25, decimal_units=False)
+        stats.append(f'Total key presses: {total_presses}')
+        stats.append('Colour based on how long keys were pressed for.')
+    else:
+        total_time = format_ticks(sum(pressed_keys.values()))
+        stats.append(f'Total press time: {total_time}')
+        stats.append('Colour based on number of key presses.')
+    stats_text = [f'{profile_name}:', '\n'.join(stats)]
+
+    # Write text to image
+    font_path = str(font)
+    size_main = GLOBALS.font_size_main
+    size_stats = GLOBALS.font_size_stats
+    for key, text_colour in zip(geometry.keys, text_colours):
+        x, y = key.offset
+        text = key.display_name
+
+        # Override for stats text
+        if text == '__STATS__':
+            _draw_text(image, (x, y), stats_text[0], font_path, size_main, text_colour)
+            y += size_main + GLOBALS.font_line_spacing
+            _draw_text(image, (x, y), stats_text[1], font_path, size_stats, text_colour)
+            continue
+
+        height_multiplier = max(0, key.dimensions[1] - 1)
+        x += GLOBALS.font_offset_x
+        if not height_multiplier:
+            y += GLOBALS.font_offset_y
+        y += round((GLOBALS.key_size - size_main + GLOBALS.font_offset_y) * height_multiplier)
+
+        # Ensure each key is at least at a constant height
+        text = text.replace('\\n', '\n')
+        if '\n' not in text:
+            text += '\n'
+
+        _draw_text(image, (x, y), text, font_path, size_main, text_colour)
+
+        # Correctly place count at bottom of key
+        if height_multiplier:
+            y = round(key.offset[1] + (GLOBALS.key_size + GLOBALS.key_padding) * height_multiplier + GLOBALS.font_offset_y)
+
+        y += (size_main + GLOBALS.font_line_spacing) * (1 + text.count('\n'))
+
+        keycode = key.keycode
+        if data_set == 'time':
+            amount = held_keys.get(keycode, 0) if keycode is not None else 0
+            text = format_ticks(amount, accuracy=(amount < UPDATES_PER_SECOND) + 1, length=1)
+        else:
+            amount = pressed_keys.get(keycode, 0) if keycode is not None else 0
+            max_width = int(10 * key.dimensions[0] - 3)
+            text = f'x{shorten_number(amount, limit=max_width, sig_figures=max_width - 1, decimal_units=False)}'
+        _draw_text(image, (x, y), text, font_path, size_stats, text_colour)
+
+    return image
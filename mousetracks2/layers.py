@@ -0,0 +1,172 @@
+"""Render layer options and presets.
+
+These are shared between the GUI and the command line renderer, so
+must not depend on Qt.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Generic, TypeVar
+
+from .components import ipc
+from .enums import BlendMode, Channel
+
+
+T = TypeVar('T')
+
+
+@dataclass
+class RenderOption(Generic[T]):
+    """Store different values per render type."""
+
+    movement: T
+    speed: T
+    heatmap: T
+    keyboard: T
+
+    def get(self, render_type: ipc.RenderType) -> T:
+        """Get the value for a render type."""
+        match render_type:
+            case (ipc.RenderType.MouseMovement | ipc.RenderType.ThumbstickMovement):
+                return self.movement
+            case ipc.RenderType.MouseSpeed | ipc.RenderType.ThumbstickSpeed:
+                return self.speed
+            case (ipc.RenderType.SingleClick | ipc.RenderType.DoubleClick | ipc.RenderType.HeldClick
+                  | ipc.RenderType.ThumbstickPosition | ipc.RenderType.MousePosition):
+                return self.heatmap
+            case ipc.RenderType.KeyboardHeatmap:
+                return self.keyboard
+            case _:
+                raise NotImplementedError(f'Unsupported render type: {render_type}')
+
+    def set(self, render_type: ipc.RenderType, value: T) -> None:
+        """Set the value for a render type."""
+        match render_type:
+            case (ipc.RenderType.MouseMovement | ipc.RenderType.ThumbstickMovement):
+                self.movement = value
+            case ipc.RenderType.MouseSpeed | ipc.RenderType.ThumbstickSpeed:
+                self.speed = value
+            case (ipc.RenderType.SingleClick | ipc.RenderType.DoubleClick | ipc.RenderType.HeldClick
+                  | ipc.RenderType.ThumbstickPosition | ipc.RenderType.MousePosition):
+                self.heatmap = value
+            case ipc.RenderType.KeyboardHeatmap:
+                self.keyboard = value
+            case _:
+                raise NotImplementedError(f'Unsupported render type: {render_type}')
+
+
+@dataclass
+class LayerOption:
+    render_type: ipc.RenderType
+    blend_mode: BlendMode = BlendMode.Normal
+    channels: Channel = Channel.RGBA
+    opacity: int = 100
+    render_colour: RenderOption = field(default_factory=lambda: RenderOption('Ice', 'Ice', 'Jet', 'Aqua'))
+    contrast: RenderOption = field(default_factory=lambda: RenderOption(1.0, 1.0, 1.0, 1.0))
+    padding: RenderOption = field(default_factory=lambda: RenderOption(0, 0, 0, 0))
+    clipping: RenderOption = field(default_factory=lambda: RenderOption(0.0, 0.0, 0.001, 0.0))
+    blur: RenderOption = field(default_factory=lambda: RenderOption(0.0, 0.0, 0.0125, 0.0))
+    linear: RenderOption = field(default_factory=lambda: RenderOption(False, True, True, False))
+    invert: RenderOption = field(default_factory=lambda: RenderOption(False, False, False, False))
+    show_left_clicks: bool = True
+    show_middle_clicks: bool = True
+    show_right_clicks: bool = True
+
+
+def _heatmap_overlay() -> list[LayerOption]:
+    layer_0 = LayerOption(ipc.RenderType.MouseMovement)
+
+    layer_1 = LayerOption(ipc.RenderType.SingleClick, BlendMode.LuminanceMask, opacity=50)
+    layer_1.clipping.heatmap = 0.01
+    layer_1.contrast.heatmap = 1.5
+
+    return [layer_0, layer_1]
+
+
+def _heatmap_tracks() -> list[LayerOption]:
+    layer_0 = LayerOption(ipc.RenderType.MouseMovement)
+    layer_0.render_colour.movement = 'Chalk'
+
+    layer_1 = LayerOption(ipc.RenderType.MousePosition, BlendMode.Multiply)
+    layer_1.render_colour.heatmap = 'Inferno'
+    layer_1.blur.heatmap = 0.001
+
+    return [layer_0, layer_1]
+
+
+def _alpha_multiply() -> list[LayerOption]:
+    layer_0 = LayerOption(ipc.RenderType.MouseMovement)
+
+    layer_1 = LayerOption(ipc.RenderType.MousePosition, BlendMode.Multiply, Channel.A)
+    layer_1.render_colour.heatmap = 'TransparentWhiteToWhite'
+    layer_1.blur.heatmap = 0
+    layer_1.clipping.heatmap = 0.85
+    layer_1.contrast.heatmap = 0.5
+
+    return [layer_0, layer_1]
+
+
+def _urban_moss() -> list[LayerOption]:
+    layer_0 = LayerOption(ipc.RenderType.MouseMovement)
+    layer_0.render_colour.movement = 'Chalk'
+
+    layer_1 = LayerOption(ipc.RenderType.MouseSpeed)
+    layer_1.render_colour.speed = 'TransparentBlackToBlackToGreen'
+
+    return [layer_0, layer_1]
+
+
+def _eraser() -> list[LayerOption]:
+    layer_0 = LayerOption(ipc.RenderType.MouseMovement)
+    layer_0.render_colour.movement = 'Graphite'
+
+    layer_1 = LayerOption(ipc.RenderType.SingleClick, BlendMode.Subtract, Channel.A)
+    layer_1.render_colour.heatmap = 'TransparentWhiteToWhite'
+    layer_1.clipping.heatmap = 0.2
+    layer_1.contrast.heatmap = 1.5
+
+    return [layer_0, layer_1]
+
+
+def _plasma() -> list[LayerOption]:
+    layer_0 = LayerOption(ipc.RenderType.MouseMovement)
+    layer_0.render_colour.movement = 'Demon'
+
+    layer_1 = LayerOption(ipc.RenderType.SingleClick, BlendMode.HardLight)
+    layer_1.render_colour.heatmap = 'Riptide'
+    layer_1.clipping.heatmap = 0.01
+    layer_1.blur.heatmap = 0.02
+
+    return [layer_0, layer_1]
+
+
+def _rgb_clicks() -> list[LayerOption]:
+    layer_0 = LayerOption(ipc.RenderType.SingleClick, BlendMode.Screen, Channel.R | Channel.A)
+    layer_0.render_colour.heatmap = 'Chalk'
+    layer_0.show_middle_clicks = False
+    layer_0.show_right_clicks = False
+
+    layer_1 = LayerOption(ipc.RenderType.SingleClick, BlendMode.Screen, Channel.G | Channel.A)
+    layer_1.render_colour.heatmap = 'Chalk'
+    layer_1.show_left_clicks = False
+    layer_1.show_right_clicks = False
+
+    layer_2 = LayerOption(ipc.RenderType.SingleClick, BlendMode.Screen, Channel.B | Channel.A)
+    layer_2.render_colour.heatmap = 'Chalk'
+    layer_2.show_left_clicks = False
+    layer_2.show_middle_clicks = False
+
+    return [layer_0, layer_1, layer_2]
+
+
+LAYER_PRESETS: dict[str, Callable[[], list[LayerOption]]] = {
+    'Heatmap Overlay': _heatmap_overlay,
+    'Heatmap Tracks': _heatmap_tracks,
+    'Alpha Multiply': _alpha_multiply,
+    'Urban Moss': _urban_moss,
+    'Eraser': _eraser,
+    'Plasma': _plasma,
+    'RGB Clicks': _rgb_clicks,
+}
+"""Hardcoded layer presets, ordered from the bottom layer to the top.
+A new list is generated on each call so the layers can be edited.
+"""
@@ -1,16 +1,11 @@
 """Partial rewrite of `mousetracks.image.keyboard`.
 It has been trimmed down and type checked, but a full rewrite is needed.
+The drawing has been replaced by `keyboard_render`.
 """
 
 from dataclasses import dataclass
-from pathlib import Path
-from typing import Any, Literal, Iterator
+from typing import Iterator
 
-from PIL import Image, ImageFont, ImageDraw
-
-from .colours import COLOUR_FILE, ColourRange, calculate_colour_map, get_luminance, parse_colour_file, parse_colour_text
-from ..constants import UPDATES_PER_SECOND
-from ..gui.utils import format_ticks
 from ..runtime import REPO_DIR
 from ..utils.math import calculate_circle
 
@@ -55,12 +50,12 @@ def parse_keys() -> Iterator[tuple[int, str]]:
             yield int(code), string.decode('utf-8')
 
 
-def keyboard_layout(extended: bool = True) -> list[list[tuple[str | None, float, float]]]:
+def keyboard_layout(extended: bool = True, layout: str = 'en_US') -> list[list[tuple[str | None, float, float]]]:
     """Generate the keyboard layout."""
     result: list[list[tuple[str | None, float, float]]] = []
 
     # Read lines from file
-    with (KEYBOARD_LAYOUT_FOLDER / 'en_US.txt').open('r', encoding='utf-8') as f:
+    with (KEYBOARD_LAYOUT_FOLDER / f'{layout}.txt').open('r', encoding='utf-8') as f:
         data = [line.strip() for line in f]
 
     try:
@@ -130,10 +125,6 @@ class _KeyboardGlobals:
 
     multiplier: int = 1
 
-    colour_map: str = 'Aqua'
-
-    data_set: str = 'count'  # 'time' or 'count'
-
     DROP_SHADOW_X = 1.25
 
     DROP_SHADOW_Y = 1.5
@@ -305,159 +296,6 @@ class KeyboardButton(object):
         return coordinates
 
 
-class KeyboardGrid(object):
-
-    FILL_COLOUR = (170, 170, 170)
-    OUTLINE_COLOUR = (0, 0, 0)
-
-    def __init__(self, pressed_keys: dict[int, int], held_keys: dict[int, int]) -> None:
-        self.grid: list[list[dict[str, Any]]] = []
-        self.pressed_keys = pressed_keys
-        self.held_keys = held_keys
-        parsed = parse_colour_file(COLOUR_FILE)
-        self.colours = parsed['Colours']
-        self.maps = parsed['Maps']
-
-    def new_row(self) -> None:
-        self.row: list[dict[str, Any]] = []  # pylint: disable=attribute-defined-outside-init
-        self.grid.append(self.row)
-
-    def add_key(self, name: str | None, width: float | None = None, height: float | None = None,
-                hide_border: bool = False, custom_colour: tuple[int, ...] | Literal[False] | None = None) -> None:
-        if width is None:
-            width = 1.0
-        if height is None:
-            height = 1.0
-        _width = round(GLOBALS.key_size * width + GLOBALS.key_padding * max(0.0, width - 1))
-        _height = round(GLOBALS.key_size * height + GLOBALS.key_padding * max(0.0, height - 1))
-        _values: dict[str, Any] = {'Dimensions': (_width, _height),
-                                   'DimensionMultipliers': (width, height),
-                                   'Name': name,
-                                   'CustomColour': custom_colour,
-                                   'HideBorder': hide_border}
-        self.row.append(_values)
-
-    def generate_coordinates(self) -> tuple[tuple[int, int], dict[str, Any]]:
-        image: dict[str, Any] = {'Fill': {}, 'Outline': [], 'Text': []}
-        max_offset: dict[str, int] = {'X': 0, 'Y': 0}
-
-        # Setup the colour range
-        if GLOBALS.data_set == 'time':
-            data = self.pressed_keys.values()
-        elif GLOBALS.data_set == 'count':
-            data = self.held_keys.values()
-        else:
-            raise ValueError('invalid dataset')
-
-        pools = sorted(set(data))
-        max_range = len(pools) + 1
-        lookup = {v: i + 1 for i, v in enumerate(pools)}
-        lookup[0] = 0
-
-        try:
-            colour_map_data = calculate_colour_map(GLOBALS.colour_map)
-        # Old code, not worth fixing errors, just fallback to transparent
-        except Exception:  # pylint: disable=broad-exception-caught
-            colour_map_data = [(0, 0, 0, 0)]
-        colour_range = ColourRange(0, max_range, colour_map_data)
-
-        # Decide on background colour
-        try:
-            colour_map = self.maps[GLOBALS.colour_map.lower()]['Background']['keyboard']
-        except KeyError:
-            colour_map = None
-        if colour_map is None:
-            image['Background'] = colour_map_data[0]
-        else:
-            image['Background'] = parse_colour_text(colour_map)[0]
-        image['Shadow'] = colour_map_data[-1]
-
-        y_offset = GLOBALS.image_padding
-        y_current = 0
-        keys = dict(parse_keys())
-        for row in self.grid:
-            x_offset = GLOBALS.image_padding
-
-            for values in row:
-
-                x, y = values['Dimensions']
-                hide_background = False
-
-                # Convert the key number to a name and get stats
-                if values['Name'] is not None:
-                    if values['Name'].isdigit():
-                        key_name = int(values['Name'])
-
-                        # Get press/time count
-                        count_time = self.held_keys.get(key_name, 0)
-                        count_press = self.pressed_keys.get(key_name, 0)
-                        if GLOBALS.data_set == 'time':
-                            key_count = count_press
-                        elif GLOBALS.data_set == 'count':
-                            key_count = count_time
-                        else:
-                            key_count = 0
-
-                    else:
-                        key_name = values['Name']
-                        key_count = 0
-
-                    # Get key name
-                    display_name = keys.get(key_name, key_name)
-                    button_coordinates = KeyboardButton(x_offset, y_offset, x, y)
-
-                    # Calculate colour for key
-                    fill_colour: tuple[int, ...]
-                    if values['CustomColour'] is None:
-                        fill_colour = colour_range[lookup[key_count]]
-                    else:
-                        if values['CustomColour'] is False:
-                            hide_background = True
-                            fill_colour = image['Background']
-                        else:
-                            fill_colour = values['CustomColour']
-
-                    # Calculate colour for border
-                    if get_luminance(*fill_colour) > 128:
-                        text_colour = self.colours['black']['Colour']
-                    else:
-                        text_colour = self.colours['white']['Colour']
-
-                    #S tore values
-                    _values = {'Offset': (x_offset, y_offset),
-                               'KeyName': display_name,
-                               'Counts': {'count': count_press, 'time': count_time},
-                               'Colour': text_colour,
-                               'Dimensions': values['DimensionMultipliers']}
-                    image['Text'].append(_values)
-
-                    if not values['HideBorder']:
-                        image['Outline'] += button_coordinates.outline()
-                    if not hide_background:
-                        try:
-                            image['Fill'][fill_colour] += button_coordinates.fill()
-                        except KeyError:
-                            image['Fill'][fill_colour] = button_coordinates.fill()
-
-                x_offset += GLOBALS.key_padding + x
-                y_current = max(y_current, GLOBALS.key_size, y - GLOBALS.key_padding)
-
-            # Decrease size of empty row
-            if row:
-                y_offset += GLOBALS.key_size + GLOBALS.key_padding
-            else:
-                y_offset += (GLOBALS.key_size + GLOBALS.key_padding) // 2
-
-            max_offset['X'] = max(max_offset['X'], x_offset)
-            max_offset['Y'] = max(max_offset['Y'], y_offset)
-            y_current -= GLOBALS.key_size
-
-        # Calculate total size of image
-        width = max_offset['X'] + GLOBALS.image_padding - GLOBALS.key_padding + 1
-        height = max_offset['Y'] + GLOBALS.image_padding + y_current - GLOBALS.key_padding + GLOBALS.drop_shadow_y + 1
-        return ((width, height), image)
-
-
 def shorten_number(n: float, limit: int = 5, sig_figures: int | None = None, decimal_units: bool = True) -> str:
     """Set a number over a certain length to something shorter.
     For example, 2000000 can be shortened to 2m.
@@ -548,128 +386,3 @@ def ticks_to_seconds(amount: float, tick_rate: int = 1, output_length: int = 2,
     if len(output) > 1:
         return ' and '.join((', '.join(output[:-1]), output[-1]))
     return output[-1]
-
-
-class DrawKeyboard(object):
-    def __init__(self, profile_name: str, ticks: int, pressed_keys: dict[int, int],
-                 held_keys: dict[int, int]) -> None:
-        self.name = profile_name
-
-        self.ticks = ticks
-        self.pressed_keys = pressed_keys
-        self.held_keys = held_keys
-
-        self.grid = self._create_grid()
-
-    def _create_grid(self) -> KeyboardGrid:
-        print('Building keyboard from layout...')
-        grid = KeyboardGrid(self.pressed_keys, self.held_keys)
-        for row in keyboard_layout():
-            grid.new_row()
-            for name, width, height in row:
-                custom_colour: Literal[False] | None
-                if name == '__STATS__':
-                    hide_border = True
-                    custom_colour = False
-                else:
-                    hide_border = False
-                    custom_colour = None
-                grid.add_key(name, width, height, hide_border=hide_border, custom_colour=custom_colour)
-        return grid
-
-    def calculate(self) -> dict[str, Any]:
-        print('Generating coordinates...')
-        (width, height), coordinate_dict = self.grid.generate_coordinates()
-        return {'Width': width,
-                'Height': height,
-                'Coordinates': coordinate_dict}
-
-    def draw_image(self, font: Path | str = FONT_LIB / 'liberation-sans.regular.ttf') -> Image.Image:
-        data = self.calculate()
-
-        # Create image object
-        image = Image.new('RGB', (data['Width'], data['Height']))
-        image.paste(data['Coordinates']['Background'], (0, 0, data['Width'], data['Height']))
-        pixels = image.load()
-        assert pixels is not None
-
-        # Add drop shadow
-        shadow = (64, 64, 64)
-        if (GLOBALS.drop_shadow_x or GLOBALS.drop_shadow_y) and data['Coordinates']['Background'][:3] == (255, 255, 255):
-            print('Adding drop shadow...')
-            for colour in data['Coordinates']['Fill']:
-                for x, y in data['Coordinates']['Fill'][colour]:
-                    pixels[GLOBALS.drop_shadow_x + x, GLOBALS.drop_shadow_y + y] = shadow
-
-        # Fill colours
-        print('Colouring keys...')
-        for colour in data['Coordinates']['Fill']:
-            for x, y in data['Coordinates']['Fill'][colour]:
-                pixels[x, y] = colour
-
-        # Draw border
-        print('Drawing outlines...')
-        border = tuple(255 - i for i in data['Coordinates']['Background'])
-        for x, y in data['Coordinates']['Outline']:
-            pixels[x, y] = border
-
-        # Draw text
-        print('Writing text...')
-        draw = ImageDraw.Draw(image)
-        font_key = ImageFont.truetype(font, size=GLOBALS.font_size_main)
-        font_amount = ImageFont.truetype(font, size=GLOBALS.font_size_stats)
-
-        # Generate stats
-        elapsed_time = ticks_to_seconds(self.ticks, 60)
-        stats = [f'Time elapsed: {elapsed_time}']
-        if GLOBALS.data_set == 'count':
-            total_presses = shorten_number(sum(self.pressed_keys.values()), limit=25, decimal_units=False)
-            stats.append(f'Total key presses: {total_presses}')
-            stats.append('Colour based on how long keys were pressed for.')
-        elif GLOBALS.data_set == 'time':
-            total_time = format_ticks(sum(self.pressed_keys.values()))
-            stats.append(f'Total press time: {total_time}')
-            stats.append('Colour based on number of key presses.')
-        stats_text = [f'{self.name}:', '\n'.join(stats)]
-
-        # Write text to image
-        for values in data['Coordinates']['Text']:
-            x, y = values['Offset']
-            text = values['KeyName']
-            text_colour = values['Colour']
-
-            # Override for stats text
-            if text == '__STATS__':
-                draw.text((x, y), stats_text[0], font=font_key, fill=text_colour)
-                y += GLOBALS.font_size_main + GLOBALS.font_line_spacing
-                draw.text((x, y), stats_text[1], font=font_amount, fill=text_colour)
-                continue
-
-            height_multiplier = max(0, values['Dimensions'][1] - 1)
-            x += GLOBALS.font_offset_x
-            if not height_multiplier:
-                y += GLOBALS.font_offset_y
-            y += (GLOBALS.key_size - GLOBALS.font_size_main + GLOBALS.font_offset_y) * height_multiplier
-
-            # Ensure each key is at least at a constant height
-            text = text.replace('\\n', '\n')
-            if '\n' not in text:
-                text += '\n'
-
-            draw.text((x, y), text, font=font_key, fill=text_colour)
-
-            # Correctly place count at bottom of key
-            if height_multiplier:
-                y = values['Offset'][1] + (GLOBALS.key_size + GLOBALS.key_padding) * height_multiplier + GLOBALS.font_offset_y
-
-            y += (GLOBALS.font_size_main + GLOBALS.font_line_spacing) * (1 + text.count('\n'))
-
-            amount = values['Counts'][GLOBALS.data_set]
-            if GLOBALS.data_set == 'time':
-                text = format_ticks(amount, accuracy=(amount < UPDATES_PER_SECOND) + 1, length=1)
-            else:
-                max_width = int(10 * values['Dimensions'][0] - 3)
-                text = f'x{shorten_number(amount, limit=max_width, sig_figures=max_width - 1, decimal_units=False)}'
-            draw.text((x, y), text, font=font_amount, fill=text_colour)
-
-        return image
@@ -0,0 +1,307 @@
+"""Render the data stored in a profile.
+
+This has no dependency on any running components, so it is used by
+both the processing component and the command line renderer.
+"""
+
+from collections import defaultdict
+from dataclasses import replace
+from typing import Callable, Hashable, Iterator, Literal
+
+import numpy as np
+import numpy.typing as npt
+
+from .components import ipc
+from .file import ArrayResolutionMap, TrackingProfile
+from .keyboard_render import render_keyboard
+from .render import colourise_array, render_normalised, EmptyRenderError, LayerBlend, RenderCancelledError
+from .utils import keycodes
+
+
+def downscale_layers(layers: list[ipc.RenderLayer], scale: int) -> list[ipc.RenderLayer]:
+    """Copy the layers with a lower resolution and no sampling.
+    This is used for a quick preview before the full render.
+    """
+    result = []
+    for layer in layers:
+        request = layer.request
+        width = None if request.width is None else max(1, request.width // scale)
+        height = None if request.height is None else max(1, request.height // scale)
+        result.append(replace(layer, request=replace(request, width=width, height=height, sampling=1)))
+    return result
+
+
+class ProfileRender:
+    """Handle the rendering of data for a profile."""
+
+    def __init__(self, profile: TrackingProfile) -> None:
+        self.profile = profile
+
+    def arrays(self, render_type: ipc.RenderType,
+               left_clicks: bool = True, middle_clicks: bool = True, right_clicks: bool = True,
+               ) -> dict[tuple[int, int], list[np.typing.ArrayLike]]:
+        """Get a list of arrays to use for a render."""
+        def get_arrays(array_map: ArrayResolutionMap) -> Iterator[np.typing.ArrayLike]:
+            for resolution, arrays in array_map.items():
+                if resolution not in self.profile.config.disabled_resolutions:
+                    yield arrays
+
+        arrays: dict[tuple[int, int], list[np.typing.ArrayLike]] = defaultdict(list)
+        match render_type:
+            case ipc.RenderType.MouseMovement:
+                arrays[0, 0].extend(get_arrays(self.profile.cursor_map.sequential_arrays))
+
+            case ipc.RenderType.MousePosition:
+                arrays[0, 0].extend(get_arrays(self.profile.cursor_map.density_arrays))
+
+            case ipc.RenderType.MouseSpeed:
+                arrays[0, 0].extend(get_arrays(self.profile.cursor_map.speed_arrays))
+
+            case ipc.RenderType.SingleClick:
+                for keycode, res_map in self.profile.mouse_single_clicks.items():
+                    if keycode == keycodes.VK_LBUTTON and not left_clicks:
+                        continue
+                    if keycode == keycodes.VK_MBUTTON and not middle_clicks:
+                        continue
+                    if keycode == keycodes.VK_RBUTTON and not right_clicks:
+                        continue
+                    arrays[0, 0].extend(get_arrays(res_map))
+
+            case ipc.RenderType.DoubleClick:
+                for keycode, res_map in self.profile.mouse_double_clicks.items():
+                    if keycode == keycodes.VK_LBUTTON and not left_clicks:
+                        continue
+                    if keycode == keycodes.VK_MBUTTON and not middle_clicks:
+                        continue
+                    if keycode == keycodes.VK_RBUTTON and not right_clicks:
+                        continue
+                    arrays[0, 0].extend(get_arrays(res_map))
+
+            case ipc.RenderType.HeldClick:
+                for keycode, res_map in self.profile.mouse_held_clicks.items():
+                    if keycode == keycodes.VK_LBUTTON and not left_clicks:
+                        continue
+                    if keycode == keycodes.VK_MBUTTON and not middle_clicks:
+                        continue
+                    if keycode == keycodes.VK_RBUTTON and not right_clicks:
+                        continue
+                    arrays[0, 0].extend(get_arrays(res_map))
+
+            case ipc.RenderType.ThumbstickMovement:
+                if left_clicks:
+                    for gamepad_maps in self.profile.thumbstick_l_map.values():
+                        resolution_map = gamepad_maps.sequential_arrays
+                        arrays[0, 0].extend(resolution_map.values())
+                if right_clicks:
+                    for gamepad_maps in self.profile.thumbstick_r_map.values():
+                        resolution_map = gamepad_maps.sequential_arrays
+                        arrays[int(left_clicks), 0].extend(resolution_map.values())
+
+            case ipc.RenderType.ThumbstickSpeed:
+                if left_clicks:
+                    for gamepad_maps in self.profile.thumbstick_l_map.values():
+                        resolution_map = gamepad_maps.speed_arrays
+                        arrays[0, 0].extend(resolution_map.values())
+                if right_clicks:
+                    for gamepad_maps in self.profile.thumbstick_r_map.values():
+                        resolution_map = gamepad_maps.speed_arrays
+                        arrays[int(left_clicks), 0].extend(resolution_map.values())
+
+            case ipc.RenderType.ThumbstickPosition:
+                if left_clicks:
+                    for gamepad_maps in self.profile.thumbstick_l_map.values():
+                        resolution_map = gamepad_maps.density_arrays
+                        arrays[0, 0].extend(resolution_map.values())
+                if right_clicks:
+                    for gamepad_maps in self.profile.thumbstick_r_map.values():
+                        resolution_map = gamepad_maps.density_arrays
+                        arrays[int(left_clicks), 0].extend(resolution_map.values())
+
+            case _:
+                raise NotImplementedError(render_type)
+
+        return arrays
+
+    def normalised_array(self, render_type: ipc.RenderType,
+                         width: int | None, height: int | None, sampling: int = 1,
+                         padding: int = 0, contrast: float = 1.0, lock_aspect: bool = True,
+                         clipping: float = 0.0, blur: float = 0.0, linear: bool = False,
+                         left_clicks: bool = True, middle_clicks: bool = True, right_clicks: bool = True,
+                         interpolation_order: Literal[0, 1, 2, 3, 4, 5] = 0,
+                         cancelled: Callable[[], bool] | None = None) -> npt.NDArray[np.float64] | None:
+        """Render a normalised array ready for colouring.
+        If there is no data to render, then `None` is returned.
+        See `render_normalised` for how `cancelled` is used.
+        """
+        # Get the arrays to render
+        positional_arrays = self.arrays(render_type, left_clicks=left_clicks,
+                                        middle_clicks=middle_clicks, right_clicks=right_clicks)
+
+        # Add extra padding
+        if padding:
+            for position, arrays in positional_arrays.items():
+                positional_arrays[position] = [np.pad(array, padding) for array in arrays]
+
+        # Adjust width/height if not locking the aspect ratio
+        if positional_arrays and not lock_aspect and width is not None and height is not None:
+            width_items = max(x for x, y in positional_arrays) - min(x for x, y in positional_arrays) + 1
+            height_items = max(y for x, y in positional_arrays) - min(y for x, y in positional_arrays) + 1
+            width = round(width / width_items)
+            height = round(height / height_items)
+
+        # Do the render
+        try:
+            return render_normalised(positional_arrays, width, height, sampling,
+                                     lock_aspect=lock_aspect, linear=linear,
+                                     blur=blur, contrast=contrast, clipping=clipping,
+                                     interpolation_order=interpolation_order, cancelled=cancelled)
+        except EmptyRenderError:
+            return None
+
+    def array(self, render_type: ipc.RenderType,
+              width: int | None, height: int | None, colour_map: str, sampling: int = 1,
+              padding: int = 0, contrast: float = 1.0, lock_aspect: bool = True,
+              clipping: float = 0.0, blur: float = 0.0, linear: bool = False, invert: bool = False,
+              left_clicks: bool = True, middle_clicks: bool = True, right_clicks: bool = True,
+              interpolation_order: Literal[0, 1, 2, 3, 4, 5] = 0) -> npt.NDArray[np.uint8]:
+        """Render an array (tracks / heatmaps)."""
+        normalised = self.normalised_array(render_type, width, height, sampling=sampling,
+                                           padding=padding, contrast=contrast, lock_aspect=lock_aspect,
+                                           clipping=clipping, blur=blur, linear=linear,
+                                           left_clicks=left_clicks, middle_clicks=middle_clicks,
+                                           right_clicks=right_clicks, interpolation_order=interpolation_order)
+        if normalised is None:
+            return np.ndarray([0, 0, 4], dtype=np.uint8)
+        return colourise_array(normalised, colour_map, invert=invert)
+
+    def layers(self, layers: list[ipc.RenderLayer],
+               cancelled: Callable[[], bool] | None = None) -> LayerBlend | None:
+        """Render and blend multiple layers together.
+
+        Layers often share the same data and only differ in how it is
+        coloured or blended, so the normalised arrays are grouped by
+        their data dependent parameters and only calculated once.
+        The resolution of every layer is taken from the first layer.
+
+        If `cancelled` returns True during the render, then
+        `RenderCancelledError` will be raised.
+        """
+        normalised_arrays: dict[tuple[Hashable, ...], npt.NDArray[np.float64] | None] = {}
+        layer_blend = None
+
+        # If no layers are visible, then the first layer is used for the resolution
+        any_visible = any(layer.request.layer_visible for layer in layers)
+
+        for i, layer in enumerate(layers):
+            request = layer.request
+
+            # Use the resolution of the first layer
+            if layer_blend is None:
+                width = request.width
+                height = request.height
+                lock_aspect = request.lock_aspect
+            # Reuse the same resolution
+            else:
+                height, width = layer_blend.image.shape[:2]
+                width //= max(1, request.sampling)
+                height //= max(1, request.sampling)
+                lock_aspect = False
+
+            # If not visible, skip here unless there aren't any other visible layers
+            if not request.layer_visible and (i or any_visible):
+                continue
+
+            if cancelled is not None and cancelled():
+                raise RenderCancelledError
+
+            # Render the normalised array for the layer, or reuse an existing one
+            key = (request.data_key(), width, height, lock_aspect)
+            if key not in normalised_arrays:
+                # If a single invisible layer, then do a quick render to get the resolution
+                if not request.layer_visible:
+                    normalised_arrays[key] = self.normalised_array(
+                        render_type=request.type,
+                        width=width,
+                        height=height,
+                        lock_aspect=lock_aspect,
+                        blur=0,
+                        left_clicks=False,
+                        middle_clicks=False,
+                        right_clicks=False,
+                    )
+
+                else:
+                    normalised_arrays[key] = self.normalised_array(
+                        render_type=request.type,
+                        width=width,
+                        height=height,
+                        lock_aspect=lock_aspect,
+                        sampling=request.sampling,
+                        padding=request.padding,
+                        contrast=request.contrast,
+                        clipping=request.clipping,
+                        blur=request.blur,
+                        linear=request.linear,
+                        left_clicks=request.show_left_clicks,
+                        middle_clicks=request.show_middle_clicks,
+                        right_clicks=request.show_right_clicks,
+                        interpolation_order=request.interpolation_order,
+                        cancelled=cancelled,
+                    )
+
+            # Colour the layer
+            normalised = normalised_arrays[key]
+            if normalised is None:
+                _image = np.ndarray([0, 0, 4], dtype=np.uint8)
+            elif request.layer_visible:
+                _image = colourise_array(normalised, request.colour_map, invert=request.invert)
+            else:
+                _image = colourise_array(normalised, 'BlackToWhite')
+            image = _image.astype(np.float64)
+            image /= 255
+
+            # Setup the base layer
+            if layer_blend is None:
+                layer_blend = LayerBlend(np.zeros(image.shape, dtype=np.float64))
+
+            # Add the new layer
+            if request.layer_visible:
+                # Ensure initial layer has alpha
+                if not i:
+                    layer.channels |= ipc.Channel.A
+                layer_blend.blend(layer.blend_mode, image, opacity=layer.opacity / 100.0, channels=layer.channels)
+
+        return layer_blend
+
+    def keyboard(self, colour_map: str, data_set: str, sampling: int = 1) -> np.ndarray:
+        """Render a keyboard image."""
+        pressed = {i: self.profile.key_presses[i] for i in map(int, keycodes.KEYBOARD_CODES)}
+        held = {i: self.profile.key_held[i] for i in map(int, keycodes.KEYBOARD_CODES)}
+
+        image = render_keyboard(self.profile.name, self.profile.active, pressed, held, colour_map, data_set, sampling)
+
+        # Convert back to array to send to GUI
+        return np.asarray(image)
+
+    def request(self, request: ipc.RenderRequest) -> npt.NDArray[np.uint8]:
+        """Render an image from a single render request."""
+        if request.type == ipc.RenderType.KeyboardHeatmap:
+            # Double the sampling, since the default render is too small
+            sampling = request.sampling
+            if request.file_path is not None:
+                sampling *= 2
+
+            assert request.show_count != request.show_time  # TODO: Remove mutually exclusive options
+            data_set = 'count' if request.show_count else 'time'
+
+            return self.keyboard(request.colour_map, data_set, sampling)
+
+        return self.array(request.type, request.width, request.height,
+                          request.colour_map, sampling=request.sampling,
+                          padding=request.padding, contrast=request.contrast,
+                          lock_aspect=request.lock_aspect, clipping=request.clipping,
+                          blur=request.blur, linear=request.linear, invert=request.invert,
+                          left_clicks=request.show_left_clicks,
+                          middle_clicks=request.show_middle_clicks,
+                          right_clicks=request.show_right_clicks,
+                          interpolation_order=request.interpolation_order)
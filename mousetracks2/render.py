@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import math
 from collections import defaultdict
-from functools import wraps
+from functools import lru_cache, wraps
 from typing import Callable, Literal, Self
 
 import numpy as np
@@ -24,6 +24,10 @@ class EmptyRenderError(ValueError):
         super().__init__('input arrays cannot be empty if size not defined')
 
 
+class RenderCancelledError(Exception):
+    """Raise when a render is no longer required."""
+
+
 def array_target_resolution(arrays: list[np.typing.ArrayLike], width: int | None = None,
                             height: int | None = None, lock_aspect: bool = False) -> tuple[int, int]:
     """Calculate a target resolution.
@@ -160,9 +164,32 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
            interpolation_order: Literal[0, 1, 2, 3, 4, 5] = 0, invert: bool = False) -> np.ndarray:
     """Combine a group of arrays into a single array for rendering.
 
+    This is a combination of `render_normalised` and `colourise_array`.
+    If the same data is to be rendered with multiple colour maps, then
+    call them separately to avoid repeating the normalisation.
+
     Parameters:
         colour_map: Must be either a predefined or manually defined map.
             See `config/colours.txt` for examples.
+        invert: Invert the values / colours.
+        See `render_normalised` for the other parameters.
+    """
+    normalised = render_normalised(positional_arrays, width, height, sampling, lock_aspect=lock_aspect,
+                                   linear=linear, blur=blur, contrast=contrast, clipping=clipping,
+                                   interpolation_order=interpolation_order)
+    return colourise_array(normalised, colour_map, invert=invert)
+
+
+def render_normalised(positional_arrays: dict[tuple[int, int], list[np.typing.ArrayLike]],
+                      width: int | None = None, height: int | None = None, sampling: int = 1,
+                      lock_aspect: bool = True, linear: bool = False, blur: float = 0.0,
+                      contrast: float = 1.0, clipping: float = 0.0,
+                      interpolation_order: Literal[0, 1, 2, 3, 4, 5] = 0,
+                      cancelled: Callable[[], bool] | None = None) -> npt.NDArray[np.float64]:
+    """Combine a group of arrays into a single normalised array.
+    The values will lie between 0 and 1, ready to be colourised.
+
+    Parameters:
         positional_arrays: Dict of draw position and list of arrays.
             For now it only supports (0, 0) and (0, 1) for left and
             right.
@@ -187,8 +214,14 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
         interpolation_order: The order of interpolation for upscaling.
             Recommended to leave at 0, otherwise the arrays will be
             interpolated before the colours are mapped.
-        invert: Invert the values / colours.
+        cancelled: Function to check if the render is still required.
+            It is checked between each stage, and will raise
+            `RenderCancelledError` if it returns True.
     """
+    def check_cancelled() -> None:
+        if cancelled is not None and cancelled():
+            raise RenderCancelledError
+
     # Calculate width / height
     all_arrays = []
     for arrays in positional_arrays.values():
@@ -205,17 +238,22 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
     combined_arrays: dict[tuple[int, int], np.ndarray] = {}
     for pos, arrays in positional_arrays.items():
         if arrays:
-            rescaled = [array_rescale(array, scale_width, scale_height, sampling, interpolation_order) for array in arrays]
+            rescaled = []
+            for array in arrays:
+                check_cancelled()
+                rescaled.append(array_rescale(array, scale_width, scale_height, sampling, interpolation_order))
             combined_arrays[pos] = np.maximum.reduce(rescaled)
         else:
             combined_arrays[pos] = np.zeros([scale_height, scale_width], dtype=np.uint8)
 
     # Convert to linear arrays
+    check_cancelled()
     if linear:
         combined_arrays = {pos: np.unique(array, return_inverse=True)[1]
                            for pos, array in combined_arrays.items()}
 
     # Apply gaussian blur
+    check_cancelled()
     if blur:
         combined_arrays = {pos: ndimage.gaussian_filter(array.astype(np.float64),
                                                         sigma=gaussian_size(scale_width, scale_height, blur))
@@ -232,6 +270,7 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
     combined_array = combine_array_grid(combined_arrays, scale_width, scale_height)
 
     # Clip the maximum values
+    check_cancelled()
     if clipping:
         sorted_values, linear_mapping = np.unique(combined_array, return_inverse=True)
         max_value = sorted_values[math.ceil(np.max(linear_mapping) * (1 - clipping))]
@@ -259,7 +298,14 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
 
         combined_array **= contrast
 
-    # Convert the array to 0-255 and map to a colour lookup table
+    return normalise_array(combined_array)
+
+
+@lru_cache(maxsize=32)
+def _colour_lut(colour_map: str, invert: bool, bits_per_channel: int) -> npt.NDArray[np.uint8]:
+    """Generate an integer colour lookup table for a colour map.
+    This is cached as the same maps are used for every preview render.
+    """
     try:
         colour_list = colours.calculate_colour_map(colour_map)
     # Old code, not worth fixing errors, just fallback to transparent
@@ -269,24 +315,39 @@ def render(colour_map: str, positional_arrays: dict[tuple[int, int], list[np.typ
     if invert:
         colour_list.reverse()
 
-    # Setup the output array settings
-    # This is hardcoded currently as PIL only supports writing 8 bit PNG images
-    bits_per_channel = 8
-    target_dtype = np.uint8
-
     gradient_steps = 1 << bits_per_channel
     bit_depth_peak = gradient_steps - 1
 
     # Generate a floating-point color lookup table (LUT) with values from 0.0 to 1.0
     colour_lut_float = generate_colour_lut(*colour_list, input_bit_depth=8, steps=gradient_steps)
 
-    # Normalize the high-precision input data
-    normalised_data_float = normalise_array(combined_array)
-    index_array_float = normalised_data_float * bit_depth_peak
+    # Convert the float LUT to the target integer type
+    colour_lut_int = (colour_lut_float * bit_depth_peak).round().astype(np.uint8)
+    colour_lut_int.setflags(write=False)
+    return colour_lut_int
 
-    # Convert the float LUT and the index array to the target integer type
-    colour_lut_int = (colour_lut_float * bit_depth_peak).round().astype(target_dtype)
-    index_array_int = index_array_float.round().astype(target_dtype)
+
+def colourise_array(normalised: npt.NDArray[np.float64], colour_map: str,
+                    invert: bool = False) -> npt.NDArray[np.uint8]:
+    """Map a normalised array to a colour lookup table.
+
+    Parameters:
+        normalised: Array with values between 0 and 1.
+        colour_map: Must be either a predefined or manually defined map.
+            See `config/colours.txt` for examples.
+        invert: Invert the values / colours.
+    """
+    # Setup the output array settings
+    # This is hardcoded currently as PIL only supports writing 8 bit PNG images
+    bits_per_channel = 8
+    target_dtype = np.uint8
+    bit_depth_peak = (1 << bits_per_channel) - 1
+
+    colour_lut_int = _colour_lut(colour_map, invert, bits_per_channel)
+
+    # Convert the index array to the target integer type
+    index_array_float = normalised * bit_depth_peak
+    index_array_int = np.rint(index_array_float, out=index_array_float).astype(target_dtype)
 
     # Use the LUT
     return colour_lut_int[index_array_int]
@@ -320,14 +381,40 @@ def combine_array_grid(positional_arrays: dict[tuple[int, int], np.ndarray],
 
 
 def alpha_blend(background: npt.NDArray[np.float64], foreground: npt.NDArray[np.float64],
-                alpha: npt.NDArray[np.float64] | float, index: tuple[slice | list[int], ...] = ()) -> npt.NDArray[np.float64]:
-    """Blend two images together."""
+                alpha: npt.NDArray[np.float64] | float) -> None:
+    """Blend the foreground onto the background in place.
+
+    The foreground is used as scratch space, so its values will be
+    overwritten.
+    """
     if isinstance(alpha, float):
         if alpha >= 1:
-            return foreground[index]
+            np.copyto(background, foreground)
+            return
         if alpha < 1e-6:
-            return background[index]
-    return np.add(foreground[index] * alpha, background[index] * (1 - alpha))
+            return
+
+    # Equivalent of `foreground * alpha + background * (1 - alpha)`
+    np.subtract(foreground, background, out=foreground)
+    foreground *= alpha
+    background += foreground
+
+
+@lru_cache(maxsize=4)
+def _checkerboard(height: int, width: int, square_size: int, light_colour: tuple[float, float, float],
+                  dark_colour: tuple[float, float, float]) -> npt.NDArray[np.float64]:
+    """Generate a read only checkerboard pattern.
+    This is cached as the preview is redrawn at the same size.
+    """
+    rows = (np.arange(height) // square_size) % 2
+    cols = (np.arange(width) // square_size) % 2
+    checkerboard_mask = rows[:, np.newaxis] != cols[np.newaxis, :]
+
+    background = np.where(checkerboard_mask[:, :, np.newaxis],
+                          np.array(light_colour, dtype=np.float64),
+                          np.array(dark_colour, dtype=np.float64))
+    background.setflags(write=False)
+    return background
 
 
 def apply_checkerboard_background(rgba_image: npt.NDArray[np.float64], square_size: int = 16,
@@ -350,62 +437,74 @@ def apply_checkerboard_background(rgba_image: npt.NDArray[np.float64], square_si
     if channels < 4:
         return rgba_image
 
-    background = np.zeros((height, width, 3), dtype=np.float64)
+    background = _checkerboard(height, width, square_size, light_colour, dark_colour)
+
+    # Perform alpha blending
+    result = np.subtract(rgba_image[:, :, :3], background)
+    result *= rgba_image[:, :, 3:]
+    result += background
+    return result
 
-    # Create the checkerboard pattern using modulo arithmetic
-    # This results in a 2D array of 0s and 1s
-    rows, cols = np.indices((height, width))
-    checkerboard_mask = ((rows // square_size) % 2) != ((cols // square_size) % 2)
 
-    # Use the mask to fill in the two colors
-    background[checkerboard_mask] = light_colour
-    background[~checkerboard_mask] = dark_colour
+_BlendFunction = Callable[['LayerBlend', npt.NDArray[np.float64], npt.NDArray[np.float64],
+                           npt.NDArray[np.float64]], None]
 
-    # Perform alpha blending
-    foreground_rgb = rgba_image[:, :, :3]
-    alpha = rgba_image[:, :, 3:]
+_AlphaFunction = Callable[['LayerBlend', npt.NDArray[np.float64], float, npt.NDArray[np.float64]], None]
 
-    return alpha_blend(background, foreground_rgb, alpha)
+_LayerFunction = Callable[['LayerBlend', npt.NDArray[np.float64], float, Channel], 'LayerBlend']
 
 
-def _simple_blend(fn: Callable[[LayerBlend, npt.NDArray[np.float64], float, Channel], npt.NDArray[np.float64]],
-                  ) -> Callable[[LayerBlend, npt.NDArray[np.float64], float, Channel], LayerBlend]:
+def _simple_blend(fn: _BlendFunction) -> _LayerFunction:
     """Wrap a layer blend to correctly apply the opacity.
     This works for non overlay modes.
+
+    The wrapped function is called once per selected channel, with the
+    base channel, the layer channel, and a buffer to write the result
+    into.
     """
     @wraps(fn)
     def wrapper(self: LayerBlend, image: npt.NDArray[np.float64],
                 opacity: float, channels: Channel) -> LayerBlend:
-        original_render = self.image.copy()
-        result = fn(self, image, opacity, channels)
+        # pylint: disable=protected-access
+        if opacity < 1e-6:
+            return self
 
-        idx: tuple[slice | list[int], ...] = (slice(None), slice(None), Channel.get_indices(channels))  # [:, :, indexes]
-        self.image[idx] = alpha_blend(original_render, result, opacity, idx)
+        result = self._result
+        for i in Channel.get_indices(channels):
+            base = self.image[:, :, i]
+            fn(self, base, image[:, :, i], result)
+            alpha_blend(base, result, opacity)
 
         return self
     return wrapper
 
 
-def _effective_alpha_blend(fn: Callable[[LayerBlend, npt.NDArray[np.float64], float, Channel], npt.NDArray[np.float64]],
-                           ) -> Callable[[LayerBlend, npt.NDArray[np.float64], float, Channel], LayerBlend]:
+def _effective_alpha_blend(fn: _AlphaFunction) -> _LayerFunction:
     """Wrap a layer blend to apply an effective alpha.
     This is done on the RGB channels and alpha channel separately.
+
+    The wrapped function writes the effective alpha into the buffer.
     """
     @wraps(fn)
     def wrapper(self: LayerBlend, image: npt.NDArray[np.float64],
                 opacity: float, channels: Channel) -> LayerBlend:
-        effective_alpha = fn(self, image, opacity, channels)
-        idx: tuple[slice | list[int], ...]
+        # pylint: disable=protected-access
+        effective_alpha = self._alpha
+        fn(self, image, opacity, effective_alpha)
+
+        result = self._result
+        for i in Channel.get_indices(channels):
+            base = self.image[:, :, i]
+
+            # Blend RGB channels
+            if i < 3:
+                np.copyto(result, image[:, :, i])
 
-        # Blend RGB channels
-        if channels & Channel.RGB:
-            idx = slice(None), slice(None), [i for i in Channel.get_indices(channels) if i < 3]  # [:, :, indexes]
-            self.image[idx] = alpha_blend(self.image, image, effective_alpha, idx)
+            # Blend Alpha channel
+            else:
+                result.fill(1.0)
 
-        # Blend Alpha channel
-        if channels & Channel.A:
-            idx = slice(None), slice(None), slice(3, None)  # [:, :, 3:]
-            self.image[idx] = alpha_blend(self.image, np.ones(self.image.shape), effective_alpha, idx)
+            alpha_blend(base, result, effective_alpha)
 
         return self
     return wrapper
@@ -414,11 +513,20 @@ def _effective_alpha_blend(fn: Callable[[LayerBlend, npt.NDArray[np.float64], fl
 class LayerBlend:
     """Composite multiple layers together with blending modes.
     Requires all arrays to be of the same shape.
+
+    The blending is done in place on the base layer, with a set of
+    single channel buffers being reused for every layer.
     """
 
     def __init__(self, base_layer: npt.NDArray[np.float64]):
         self.image = base_layer
 
+        shape = base_layer.shape[:2]
+        self._result = np.empty(shape, dtype=np.float64)
+        self._alpha = np.empty(shape, dtype=np.float64)
+        self._temp = np.empty(shape, dtype=np.float64)
+        self._mask = np.empty(shape, dtype=np.bool_)
+
     def blend(self, mode: BlendMode, image: npt.NDArray[np.float64],
               opacity: float, channels: Channel) -> Self:
         match mode:
@@ -458,97 +566,137 @@ class LayerBlend:
 
     @_effective_alpha_blend
     def normal(self, image: npt.NDArray[np.float64], opacity: float,
-               channels: Channel) -> npt.NDArray[np.float64]:
-        return np.multiply(image[:, :, 3:], opacity)
+               out: npt.NDArray[np.float64]) -> None:
+        np.multiply(image[:, :, 3], opacity, out=out)
 
     @_effective_alpha_blend
     def luminance_mask(self, image: npt.NDArray[np.float64], opacity: float,
-                       channels: Channel) -> npt.NDArray[np.float64]:
-        luminance_alpha = np.max(image[:, :, :3], axis=2, keepdims=True)
-        return luminance_alpha * opacity
+                       out: npt.NDArray[np.float64]) -> None:
+        np.max(image[:, :, :3], axis=2, out=out)
+        out *= opacity
 
     @_simple_blend
-    def replace(self, image: npt.NDArray[np.float64], opacity: float,
-                channels: Channel) -> npt.NDArray[np.float64]:
-        return image
+    def replace(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                out: npt.NDArray[np.float64]) -> None:
+        np.copyto(out, image)
 
     @_simple_blend
-    def add(self, image: npt.NDArray[np.float64], opacity: float,
-            channels: Channel) -> npt.NDArray[np.float64]:
-        return np.add(self.image, image)
+    def add(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+            out: npt.NDArray[np.float64]) -> None:
+        np.add(base, image, out=out)
 
     @_simple_blend
-    def subtract(self, image: npt.NDArray[np.float64], opacity: float,
-                 channels: Channel) -> npt.NDArray[np.float64]:
-        return np.subtract(self.image, image)
+    def subtract(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                 out: npt.NDArray[np.float64]) -> None:
+        np.subtract(base, image, out=out)
 
     @_simple_blend
-    def multiply(self, image: npt.NDArray[np.float64], opacity: float,
-                 channels: Channel) -> npt.NDArray[np.float64]:
-        return np.multiply(self.image, image)
+    def multiply(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                 out: npt.NDArray[np.float64]) -> None:
+        np.multiply(base, image, out=out)
 
     @_simple_blend
-    def divide(self, image: npt.NDArray[np.float64], opacity: float,
-               channels: Channel) -> npt.NDArray[np.float64]:
-        return np.divide(self.image, image, where=image > 1e-6)
+    def divide(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+               out: npt.NDArray[np.float64]) -> None:
+        np.greater(image, 1e-6, out=self._mask)
+        out.fill(1.0)
+        np.divide(base, image, out=out, where=self._mask)
 
     @_simple_blend
-    def maximum(self, image: npt.NDArray[np.float64], opacity: float,
-                channels: Channel) -> npt.NDArray[np.float64]:
-        return np.maximum(self.image, image)
+    def maximum(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                out: npt.NDArray[np.float64]) -> None:
+        np.maximum(base, image, out=out)
 
     @_simple_blend
-    def minimum(self, image: npt.NDArray[np.float64], opacity: float,
-                channels: Channel) -> npt.NDArray[np.float64]:
-        return np.minimum(self.image, image)
+    def minimum(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                out: npt.NDArray[np.float64]) -> None:
+        np.minimum(base, image, out=out)
 
     @_simple_blend
-    def screen(self, image: npt.NDArray[np.float64], opacity: float,
-               channels: Channel) -> npt.NDArray[np.float64]:
-        return np.subtract(1, (1 - self.image) * (1 - image))
+    def screen(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+               out: npt.NDArray[np.float64]) -> None:
+        # 1 - (1 - base) * (1 - image)
+        np.subtract(1, base, out=out)
+        np.subtract(1, image, out=self._temp)
+        out *= self._temp
+        np.subtract(1, out, out=out)
 
     @_simple_blend
-    def difference(self, image: npt.NDArray[np.float64], opacity: float,
-                   channels: Channel) -> npt.NDArray[np.float64]:
-        return np.abs(self.image - image)
+    def difference(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                   out: npt.NDArray[np.float64]) -> None:
+        np.subtract(base, image, out=out)
+        np.abs(out, out=out)
+
+    def _overlay(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                 out: npt.NDArray[np.float64]) -> None:
+        """Shared implementation for overlay and hard light."""
+        # 1 - 2 * (1 - base) * (1 - image)
+        np.subtract(1, base, out=out)
+        np.subtract(1, image, out=self._temp)
+        out *= self._temp
+        out *= 2
+        np.subtract(1, out, out=out)
+
+        # 2 * base * image where base <= 0.5
+        np.multiply(base, image, out=self._temp)
+        self._temp *= 2
+        np.less_equal(base, 0.5, out=self._mask)
+        np.copyto(out, self._temp, where=self._mask)
 
     @_simple_blend
-    def overlay(self, image: npt.NDArray[np.float64], opacity: float,
-                channels: Channel) -> npt.NDArray[np.float64]:
-        return np.where(self.image <= 0.5,
-                        2 * self.image * image,
-                        1 - 2 * (1 - self.image) * (1 - image))
+    def overlay(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                out: npt.NDArray[np.float64]) -> None:
+        self._overlay(base, image, out)
 
     @_simple_blend
-    def soft_light(self, image: npt.NDArray[np.float64], opacity: float,
-                   channels: Channel) -> npt.NDArray[np.float64]:
-        return np.where(image <= 0.5,
-                        self.image - (1 - 2 * image) * self.image * (1 - self.image),
-                        self.image + (2 * image - 1) * (np.sqrt(self.image) - self.image))
+    def soft_light(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                   out: npt.NDArray[np.float64]) -> None:
+        # Both cases are `base + (2 * image - 1) * x`
+        # If image <= 0.5: x = base * (1 - base)
+        # If image > 0.5: x = sqrt(base) - base
+        np.sqrt(base, out=out)
+        out -= base
+        np.subtract(1, base, out=self._temp)
+        self._temp *= base
+        np.less_equal(image, 0.5, out=self._mask)
+        np.copyto(out, self._temp, where=self._mask)
+
+        np.multiply(image, 2, out=self._temp)
+        self._temp -= 1
+        out *= self._temp
+        out += base
 
     @_simple_blend
-    def hard_light(self, image: npt.NDArray[np.float64], opacity: float,
-                   channels: Channel) -> npt.NDArray[np.float64]:
-        return np.where(self.image <= 0.5,
-                        2 * self.image * image,
-                        1 - 2 * (1 - self.image) * (1 - image))
+    def hard_light(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                   out: npt.NDArray[np.float64]) -> None:
+        self._overlay(base, image, out)
 
     @_simple_blend
-    def colour_dodge(self, image: npt.NDArray[np.float64], opacity: float,
-                     channels: Channel) -> npt.NDArray[np.float64]:
-        return np.divide(self.image, 1 - image, where=(1 - image) > 1e-6)
+    def colour_dodge(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                     out: npt.NDArray[np.float64]) -> None:
+        # base / (1 - image)
+        np.subtract(1, image, out=self._temp)
+        np.greater(self._temp, 1e-6, out=self._mask)
+        out.fill(1.0)
+        np.divide(base, self._temp, out=out, where=self._mask)
 
     @_simple_blend
-    def colour_burn(self, image: npt.NDArray[np.float64], opacity: float,
-                    channels: Channel) -> npt.NDArray[np.float64]:
-        return np.subtract(1, np.divide(1 - self.image, image, where=image > 1e-6))
-
-    def add_checkerbox(self) -> Self:
+    def colour_burn(self, base: npt.NDArray[np.float64], image: npt.NDArray[np.float64],
+                    out: npt.NDArray[np.float64]) -> None:
+        # 1 - (1 - base) / image
+        np.subtract(1, base, out=self._temp)
+        np.greater(image, 1e-6, out=self._mask)
+        out.fill(1.0)
+        np.divide(self._temp, image, out=out, where=self._mask)
+        np.subtract(1, out, out=out)
+
+    def add_checkerbox(self, square_size: int = 16) -> Self:
         """Apply the checkerbox background."""
-        self.image = apply_checkerboard_background(self.image)
+        self.image = apply_checkerboard_background(self.image, square_size)
         return self
 
     def to_uint8(self) -> npt.NDArray[np.uint8]:
         """Convert the float array to uint8."""
-        clipped = np.clip(self.image, 0, 1) * 255
-        return clipped.round().astype(np.uint8)
+        clipped = np.clip(self.image, 0, 1)
+        clipped *= 255
+        return np.rint(clipped, out=clipped).astype(np.uint8)
@@ -0,0 +1,60 @@
+"""Fixed size histograms for recording durations."""
+
+from dataclasses import dataclass, field
+
+
+BUCKET_COUNT = 24
+"""Number of buckets in a histogram.
+Each bucket doubles in size, so the last one holds anything over 4
+seconds.
+"""
+
+
+def bucket_limit(index: int) -> float:
+    """Get the upper limit of a bucket in seconds."""
+    return 2 ** index / 1000000
+
+
+@dataclass
+class Histogram:
+    """Record the distribution of durations.
+
+    Bucket `i` holds anything under `2 ** i` microseconds, so the size
+    stays the same regardless of how many values are added.
+    """
+
+    counts: list[int] = field(default_factory=lambda: [0] * BUCKET_COUNT)
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        """Add a duration to the histogram."""
+        microseconds = int(seconds * 1000000)
+        index = min(microseconds.bit_length(), BUCKET_COUNT - 1) if microseconds > 0 else 0
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    @property
+    def mean(self) -> float:
+        """Get the mean duration."""
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+    def percentile(self, percent: float) -> float:
+        """Get an estimate of a percentile.
+        This is the upper limit of the bucket containing it, so it will
+        never be lower than the actual value.
+        """
+        if not self.count:
+            return 0.0
+        remaining = self.count * percent / 100
+        for i, count in enumerate(self.counts):
+            remaining -= count
+            if remaining <= 0:
+                return min(bucket_limit(i), self.maximum)
+        return self.maximum
@@ -1,13 +1,22 @@
-import pynput
+import os
+from functools import cache
+
+from .system import CursorPosition, base
+
+
+@cache
+def _cursor_position(pid: int) -> base.CursorPosition:
+    """Get the cursor position backend for a process.
+    Any connection must not be shared with a forked process, so a new
+    one is created for each process ID.
+    """
+    return CursorPosition()
 
 
 def get_cursor_pos() -> tuple[int, int] | None:
     """Get the current cursor position.
 
-    This is only used for switching profiles, as the mouse move listener
-    can handle all other events.
+    This is called every tick, so the backend is only created once per
+    process.
     """
-    pos = pynput.mouse.Controller().position
-    if pos is None:
-        return None
-    return int(pos[0]), int(pos[1])
+    return _cursor_position(os.getpid()).get()
@@ -49,13 +49,16 @@ def calculate_monitor_index(pos: tuple[int, int],
 
 @dataclass
 class MonitorData:
-    """Store the logical and physical monitor locations."""
+    """Store the logical and physical monitor locations.
+    The current layout is loaded unless one is given.
+    """
 
     logical: RectList = field(default_factory=RectList)
     physical: RectList = field(default_factory=RectList)
 
     def __post_init__(self) -> None:
-        self.reload()
+        if not self.logical and not self.physical:
+            self.reload()
 
     def reload(self) -> None:
         """Reload the monitor data."""
@@ -0,0 +1,123 @@
+"""Run code at a constant rate without drifting."""
+
+import threading
+import time
+from typing import Iterator
+
+from .histogram import Histogram
+
+
+SPIN_TIME = 0.001
+"""Number of seconds before a tick to stop sleeping and start polling.
+The OS may sleep for longer than requested, so the final part of the
+wait is done by repeatedly checking the time instead.
+"""
+
+
+class TickScheduler:
+    """Count up at a constant speed.
+
+    The ticks always count at `ups` per second, but the scheduler can
+    run at a different rate. Running faster will yield the same tick
+    multiple times, and running slower will skip ticks. The rate may be
+    changed at any time, and `wake` may be called from another thread
+    to run immediately instead of waiting.
+
+    Each run is scheduled from a fixed start time, so any delay in one
+    run doesn't push back the following ones.
+
+    If a run is late, it will happen immediately to catch up. If it is
+    late by more than a whole tick, the missed ticks are dropped and it
+    will resume from the previous tick. For example, if a PC gets put to
+    sleep, then waking it up should resume from the tick it was put to
+    sleep at.
+
+    The timing uses `time.perf_counter`, which is not affected by any
+    changes to the system clock.
+    """
+
+    def __init__(self, ups: int, rate: int | None = None, spin_time: float = SPIN_TIME) -> None:
+        self.ups = ups
+        self.rate = ups if rate is None else rate
+        """Number of times per second to run."""
+        self.spin_time = spin_time
+        self.dropped = 0
+        """Number of ticks that were dropped."""
+        self.jitter = Histogram()
+        """How late each run started."""
+        self.overrun = Histogram()
+        """How much longer each run took than the interval."""
+        self._wake = threading.Event()
+
+    def reset_stats(self) -> None:
+        """Reset the timing statistics."""
+        self.dropped = 0
+        self.jitter = Histogram()
+        self.overrun = Histogram()
+
+    def wake(self) -> None:
+        """Stop waiting and run immediately.
+        This only has an effect when running slower than the tick rate.
+        """
+        self._wake.set()
+
+    def _wait_until(self, deadline: float) -> bool:
+        """Sleep until shortly before the deadline, then poll.
+        Returns False if woken up early.
+        """
+        remaining = deadline - time.perf_counter()
+
+        # Only long waits can be woken, as the timeout is less accurate
+        if remaining > 1 / self.ups:
+            if self._wake.wait(remaining - self.spin_time):
+                self._wake.clear()
+                return False
+        elif remaining > self.spin_time:
+            time.sleep(remaining - self.spin_time)
+
+        while time.perf_counter() < deadline:
+            time.sleep(0)
+        return True
+
+    def __iter__(self) -> Iterator[int]:
+        start = anchor = deadline = time.perf_counter()
+        rate = self.rate
+        runs = skipped = 0
+        self._wake.clear()
+
+        while True:
+            run_start = time.perf_counter()
+
+            # Drop any ticks that were completely missed
+            lateness = run_start - deadline
+            if lateness >= 1 / self.ups:
+                missed_ticks = int(lateness * self.ups)
+                skipped += missed_ticks
+                self.dropped += missed_ticks
+                lateness -= missed_ticks / self.ups
+                anchor += missed_ticks / self.ups
+                deadline += missed_ticks / self.ups
+            self.jitter.add(max(0.0, lateness))
+
+            yield int((deadline - start) * self.ups + 1e-6) - skipped
+
+            run_end = time.perf_counter()
+            self.overrun.add(max(0.0, run_end - run_start - 1 / rate))
+
+            # Continue from the current deadline if the rate changed
+            if rate != self.rate:
+                rate = self.rate
+                anchor = deadline
+                runs = 0
+
+            runs += 1
+            deadline = anchor + runs / rate
+            if run_end < deadline and not self._wait_until(deadline):
+                anchor = deadline = time.perf_counter()
+                runs = 0
+
+    def summary(self) -> str:
+        """Get a summary of the timing statistics."""
+        return (f'{self.jitter.count} runs, {self.dropped} ticks dropped, '
+                f'jitter p99 {self.jitter.percentile(99) * 1000:.2f} ms, '
+                f'overrun max {self.overrun.maximum * 1000:.2f} ms')
@@ -0,0 +1,511 @@
+"""Send data between processes through shared memory.
+
+Sending an array through a queue requires it to be pickled, copied
+through a pipe and unpickled again. For large arrays such as renders,
+it's much cheaper to copy it once into a shared buffer and only send a
+reference to that buffer.
+
+For small and frequent messages, a ring buffer avoids the feeder
+thread and pipe that a queue requires.
+"""
+
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import zlib
+from multiprocessing.connection import Connection
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator
+
+import numpy as np
+import numpy.typing as npt
+
+
+def _open_untracked(name: str) -> SharedMemory:
+    """Open an existing buffer without tracking it.
+
+    Before Python 3.13, opening shared memory on POSIX registers it with
+    the resource tracker, which deletes it when the process exits, even
+    though it is owned by a different process.
+
+    Child processes share the resource tracker of their parent, where
+    the buffer is already registered by its owner, so unregistering it
+    would cause an error once the owner unlinks it. This is only true
+    if the tracker was running before the child was started, which is
+    what `start_resource_tracker` is for.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name, track=False)  # pylint: disable=unexpected-keyword-arg
+
+    shm = SharedMemory(name)
+    if os.name == 'posix' and multiprocessing.parent_process() is None:
+        resource_tracker.unregister(shm._name, 'shared_memory')  # type: ignore[attr-defined]  # pylint: disable=protected-access
+    return shm
+
+
+def start_resource_tracker() -> None:
+    """Start the resource tracker if it isn't already running.
+
+    This must be called before starting any process that uses shared
+    memory. A forked process only shares the tracker if it's already
+    running, otherwise it starts its own the first time it opens a
+    buffer, which would then delete the buffer when the process exits.
+    """
+    if os.name == 'posix':
+        resource_tracker.ensure_running()
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """Reference to an array stored in shared memory."""
+
+    name: str
+    """Name of the shared memory buffer."""
+
+    shape: tuple[int, ...]
+    """Shape of the array."""
+
+    dtype: str
+    """Data type of the array."""
+
+    @contextmanager
+    def attach(self) -> Iterator[npt.NDArray]:
+        """Access the array from another process.
+
+        The array points directly at the shared buffer, so it is only
+        valid within the context. Any objects referencing its memory
+        must be deleted before the context exits.
+        """
+        shm = _open_untracked(self.name)
+        try:
+            yield np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+        finally:
+            shm.close()
+
+
+class SharedArrayPool:
+    """Store arrays in a small pool of reusable shared memory buffers.
+
+    A buffer is marked as in use once an array is stored, and must be
+    released by the receiving process once it has finished with it.
+    If every buffer is in use, then the array should be sent normally.
+    """
+
+    def __init__(self, max_buffers: int = 3, min_size: int = 0x10000) -> None:
+        """Setup the pool.
+
+        Parameters:
+            max_buffers: Maximum number of buffers to allocate.
+            min_size: Arrays smaller than this many bytes aren't worth
+                the overhead of shared memory.
+        """
+        self.max_buffers = max_buffers
+        self.min_size = min_size
+        self._buffers: dict[str, SharedMemory] = {}
+        self._in_use: set[str] = set()
+
+    def _allocate(self, size: int) -> SharedMemory | None:
+        """Get a free buffer that can hold a number of bytes.
+        If none are available, then a new one will be allocated.
+        """
+        free = [shm for name, shm in self._buffers.items() if name not in self._in_use]
+
+        # Reuse the smallest buffer that fits
+        large_enough = [shm for shm in free if shm.size >= size]
+        if large_enough:
+            return min(large_enough, key=lambda shm: shm.size)
+
+        # Replace a free buffer if the pool is full
+        if len(self._buffers) >= self.max_buffers:
+            if not free:
+                return None
+            self._remove(max(free, key=lambda shm: shm.size).name)
+
+        shm = SharedMemory(create=True, size=size)
+        self._buffers[shm.name] = shm
+        return shm
+
+    def _remove(self, name: str) -> None:
+        """Delete a buffer."""
+        shm = self._buffers.pop(name)
+        self._in_use.discard(name)
+        shm.close()
+        shm.unlink()
+
+    def store(self, array: npt.NDArray) -> SharedArray | None:
+        """Copy an array to a shared buffer.
+        Returns `None` if shared memory shouldn't be used.
+        """
+        if array.nbytes < self.min_size:
+            return None
+
+        shm = self._allocate(array.nbytes)
+        if shm is None:
+            return None
+
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        self._in_use.add(shm.name)
+        return SharedArray(shm.name, array.shape, array.dtype.str)
+
+    def release(self, name: str) -> None:
+        """Mark a buffer as free to reuse."""
+        self._in_use.discard(name)
+
+    def close(self) -> None:
+        """Delete all buffers."""
+        for name in list(self._buffers):
+            self._remove(name)
+
+
+_RING_WRITE_POS = 0
+"""Header index of the end of the last complete record."""
+
+_RING_WRITE_RESERVED = 1
+"""Header index of the end of the record currently being written."""
+
+_RING_WRITE_COUNT = 2
+"""Header index of the total number of records written."""
+
+_RING_SIZE = 3
+"""Header index of the number of bytes to store records in.
+This is needed as some platforms round up the size when attaching.
+"""
+
+_RING_READER_START = 8
+"""Header index of the first reader.
+Each reader has its position, number of records read, a flag to show
+if it's waiting to be woken up, and the position and number of records
+read at its last checkpoint.
+"""
+
+_RING_READER_SIZE = 6
+
+_RING_MAX_READERS = 8
+
+_RING_HEADER_SIZE = (_RING_READER_START + _RING_MAX_READERS * _RING_READER_SIZE) * 8
+
+_RING_RECORD = struct.Struct('<III')
+"""Length, tag and checksum of each record.
+The checksum is a CRC32 of the data, starting from the record number,
+so that a reader can tell if what it copied is complete.
+"""
+
+RING_WAIT_LIMIT = 0.1
+"""Maximum number of seconds for a reader to wait before checking for
+records again, in case the writer missed that it was waiting.
+"""
+
+
+class RingBuffer:
+    """Broadcast records from one process to others.
+
+    There is a single writer, and each reader has its own cursor.
+    Every record is written with a tag of bit flags, and readers are
+    identified by a single bit, so that they only read records that
+    are tagged for them.
+
+    The writer never waits for readers, so if one falls more than the
+    size of the buffer behind, then the records it missed are dropped
+    and it continues from the latest record.
+
+    Readers can wait for new records without polling. Before waiting,
+    a reader sets a flag in the buffer, and the writer will send a byte
+    through a pipe to wake it up. The pipes are created when a reader
+    is reset, so the buffer must be passed to other processes after
+    that.
+
+    Positions are stored as a total number of bytes written, which
+    only ever increase, so a reader can tell if the data it just read
+    was overwritten during the copy. The cursors of every reader are
+    stored in the buffer so that their lag can be checked from any
+    process.
+
+    Python has no memory fences, so the order that other processes see
+    the writes in is up to the CPU:
+        - On x86 and x86-64, stores are seen in the order they were
+          made, so a record is always complete once the position
+          includes it.
+        - On ARM, stores may be seen in any order. Each record has a
+          checksum, and if it doesn't match, then the reader stops and
+          tries again later, instead of reading a partial record.
+        - On every platform, a store can be delayed past a later load.
+          The writer may then miss that a reader just started waiting,
+          and the reader may miss the new record, so readers should not
+          wait for longer than `RING_WAIT_LIMIT` at a time.
+    """
+
+    def __init__(self, name: str | None = None, size: int = 0x100000) -> None:
+        """Create or attach to a ring buffer.
+
+        Parameters:
+            name: Name of an existing buffer to attach to.
+                If not set, then a new buffer will be created.
+                Readers attached by name cannot be woken up.
+            size: Number of bytes to store records in.
+        """
+        if name is None:
+            self._shm = SharedMemory(create=True, size=_RING_HEADER_SIZE + size)
+            self._owner_pid = os.getpid()
+        else:
+            self._shm = _open_untracked(name)
+            self._owner_pid = 0
+        self._wake: dict[int, tuple[Connection, Connection]] = {}
+        self._setup()
+        if self._owner_pid:
+            self._buf[:_RING_HEADER_SIZE] = bytes(_RING_HEADER_SIZE)
+            self._set(_RING_SIZE, size)
+        self.size = self._get(_RING_SIZE)
+
+    def _setup(self) -> None:
+        """Setup the attributes that are not shared between processes."""
+        assert self._shm.buf is not None
+        self._buf: memoryview = self._shm.buf
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> tuple[str, dict[int, tuple[Connection, Connection]]]:
+        """Attach to the buffer by name when sent to a new process."""
+        return self._shm.name, self._wake
+
+    def __setstate__(self, state: tuple[str, dict[int, tuple[Connection, Connection]]]) -> None:
+        """Attach to the buffer in the new process."""
+        name, self._wake = state
+        self._shm = _open_untracked(name)
+        self._owner_pid = 0
+        self._setup()
+        self.size = self._get(_RING_SIZE)
+
+    @property
+    def name(self) -> str:
+        """Get the name of the shared memory buffer."""
+        return self._shm.name
+
+    def _get(self, index: int) -> int:
+        """Get a value from the header."""
+        return struct.unpack_from('<Q', self._buf, index * 8)[0]
+
+    def _set(self, index: int, value: int) -> None:
+        """Set a value in the header."""
+        struct.pack_into('<Q', self._buf, index * 8, value)
+
+    def _copy_to(self, position: int, data: bytes) -> None:
+        """Copy data into the buffer, wrapping around the end."""
+        start = position % self.size
+        split = self.size - start
+        if len(data) <= split:
+            self._buf[_RING_HEADER_SIZE + start:_RING_HEADER_SIZE + start + len(data)] = data
+        else:
+            self._buf[_RING_HEADER_SIZE + start:] = data[:split]
+            self._buf[_RING_HEADER_SIZE:_RING_HEADER_SIZE + len(data) - split] = data[split:]
+
+    def _copy_from(self, position: int, length: int) -> bytes:
+        """Copy data out of the buffer, wrapping around the end."""
+        start = position % self.size
+        split = self.size - start
+        if length <= split:
+            return bytes(self._buf[_RING_HEADER_SIZE + start:_RING_HEADER_SIZE + start + length])
+        return (bytes(self._buf[_RING_HEADER_SIZE + start:])
+                + bytes(self._buf[_RING_HEADER_SIZE:_RING_HEADER_SIZE + length - split]))
+
+    def write(self, data: bytes, tag: int = 0) -> None:
+        """Add a record to the buffer.
+
+        Parameters:
+            data: Contents of the record.
+            tag: Bit flags of the readers to receive the record.
+        """
+        length = _RING_RECORD.size + len(data)
+        if length > self.size:
+            raise ValueError(f'record of {len(data)} bytes is larger than the buffer')
+
+        # The lock is only for threads within the writing process
+        with self._lock:
+            position = self._get(_RING_WRITE_POS)
+            end = position + length
+            self._set(_RING_WRITE_RESERVED, end)
+            count = self._get(_RING_WRITE_COUNT)
+            checksum = zlib.crc32(data, count & 0xFFFFFFFF)
+            self._copy_to(position, _RING_RECORD.pack(len(data), tag, checksum) + data)
+            self._set(_RING_WRITE_COUNT, count + 1)
+            self._set(_RING_WRITE_POS, end)
+
+            # Wake up any readers that are waiting
+            for reader, (_, wake_send) in self._wake.items():
+                if tag & reader:
+                    index = self._reader_index(reader) + 2
+                    if self._get(index):
+                        self._set(index, 0)
+                        wake_send.send_bytes(b'')
+
+    def _reader_index(self, reader: int) -> int:
+        """Get the header index of the cursor for a reader."""
+        slot = reader.bit_length() - 1
+        if reader != 1 << slot or slot >= _RING_MAX_READERS:
+            raise ValueError(f'reader must be a single bit below {1 << _RING_MAX_READERS}')
+        return _RING_READER_START + slot * _RING_READER_SIZE
+
+    def reset_reader(self, reader: int) -> None:
+        """Move a reader to the end of the buffer.
+        This must be done before a new reader process starts.
+        """
+        index = self._reader_index(reader)
+        position = self._get(_RING_WRITE_POS)
+        count = self._get(_RING_WRITE_COUNT)
+        self._set(index, position)
+        self._set(index + 1, count)
+        self._set(index + 2, 0)
+        self._set(index + 3, position)
+        self._set(index + 4, count)
+        if reader not in self._wake:
+            self._wake[reader] = multiprocessing.Pipe(duplex=False)
+
+    def rewind_reader(self, reader: int) -> int | None:
+        """Move a reader back to its last checkpoint.
+        This must be done before a new reader process starts.
+
+        Returns the number of records to read again, or `None` if they
+        have already been overwritten, in which case the reader is moved
+        to the end of the buffer instead.
+        """
+        index = self._reader_index(reader)
+        position = self._get(index + 3)
+        if self._get(_RING_WRITE_RESERVED) > position + self.size:
+            self.reset_reader(reader)
+            return None
+
+        count = self._get(index + 4)
+        self._set(index, position)
+        self._set(index + 1, count)
+        self._set(index + 2, 0)
+        return self._get(_RING_WRITE_COUNT) - count
+
+    @property
+    def count(self) -> int:
+        """Get the total number of records written."""
+        return self._get(_RING_WRITE_COUNT)
+
+    def lag(self, reader: int) -> int:
+        """Get how many records a reader has yet to read."""
+        return self._get(_RING_WRITE_COUNT) - self._get(self._reader_index(reader) + 1)
+
+    def reader(self, reader: int) -> 'RingBufferReader':
+        """Get a reader to read records tagged with a bit."""
+        return RingBufferReader(self, reader)
+
+    def close(self) -> None:
+        """Close the buffer, deleting it if it was created here."""
+        self._shm.close()
+        if self._owner_pid == os.getpid():
+            self._shm.unlink()
+            for wake_recv, wake_send in self._wake.values():
+                wake_recv.close()
+                wake_send.close()
+
+
+class RingBufferReader:
+    """Read records from a ring buffer with a separate cursor."""
+
+    def __init__(self, buffer: RingBuffer, reader: int) -> None:
+        self.buffer = buffer
+        self.reader = reader
+        self.dropped = 0
+        """Total number of records that were overwritten before being read."""
+        self._position_index = buffer._reader_index(reader)  # pylint: disable=protected-access
+        self._count_index = self._position_index + 1
+        self._waiting_index = self._position_index + 2
+        self._checkpoint_index = self._position_index + 3
+        wake = buffer._wake.get(reader)  # pylint: disable=protected-access
+        self.wake_connection = None if wake is None else wake[0]
+        """Connection that receives data when the reader is woken up."""
+
+    @property
+    def lag(self) -> int:
+        """Get how many records are yet to be read."""
+        return self.buffer._get(_RING_WRITE_COUNT) - self.buffer._get(self._count_index)  # pylint: disable=protected-access
+
+    @property
+    def unsaved(self) -> int:
+        """Get how many bytes have been written since the last checkpoint.
+        Once this exceeds the buffer size, the reader can no longer be
+        rewound.
+        """
+        return self.buffer._get(_RING_WRITE_POS) - self.buffer._get(self._checkpoint_index)  # pylint: disable=protected-access
+
+    def checkpoint(self) -> None:
+        """Mark every record read so far as no longer needed.
+        If the reader process is restarted, `RingBuffer.rewind_reader`
+        can then be used to read everything after this point again.
+        """
+        buffer = self.buffer
+        # pylint: disable=protected-access
+        buffer._set(self._checkpoint_index, buffer._get(self._position_index))
+        buffer._set(self._checkpoint_index + 1, buffer._get(self._count_index))
+
+    def prepare_wait(self) -> bool:
+        """Request to be woken up once a record is written.
+        Returns `False` if there are already records to read.
+        """
+        buffer = self.buffer
+        # pylint: disable=protected-access
+        if self.wake_connection is None:
+            return False
+        buffer._set(self._waiting_index, 1)
+        if buffer._get(self._position_index) < buffer._get(_RING_WRITE_POS):
+            buffer._set(self._waiting_index, 0)
+            return False
+        return True
+
+    def finish_wait(self) -> None:
+        """Stop waiting after being woken up or timing out."""
+        self.buffer._set(self._waiting_index, 0)  # pylint: disable=protected-access
+        if self.wake_connection is not None:
+            while self.wake_connection.poll():
+                self.wake_connection.recv_bytes()
+
+    def _skip_to_end(self) -> None:
+        """Skip every remaining record after an overflow."""
+        buffer = self.buffer
+        count = buffer._get(_RING_WRITE_COUNT)  # pylint: disable=protected-access
+        self.dropped += count - buffer._get(self._count_index)  # pylint: disable=protected-access
+        buffer._set(self._position_index, buffer._get(_RING_WRITE_POS))  # pylint: disable=protected-access
+        buffer._set(self._count_index, count)  # pylint: disable=protected-access
+
+    def read(self, limit: int | None = None) -> Iterator[bytes]:
+        """Read all available records.
+        If `limit` is set, then stop once that many records have been
+        read in total, which is comparable with `RingBuffer.count`.
+        """
+        buffer = self.buffer
+        # pylint: disable=protected-access
+        while True:
+            position = buffer._get(self._position_index)
+            if position >= buffer._get(_RING_WRITE_POS):
+                return
+            if limit is not None and buffer._get(self._count_index) >= limit:
+                return
+
+            # Check the record is not being overwritten
+            if buffer._get(_RING_WRITE_RESERVED) > position + buffer.size:
+                self._skip_to_end()
+                continue
+            count = buffer._get(self._count_index)
+            length, tag, checksum = _RING_RECORD.unpack(buffer._copy_from(position, _RING_RECORD.size))
+            data = buffer._copy_from(position + _RING_RECORD.size, min(length, buffer.size))
+
+            # Check the record was not overwritten during the copy
+            if buffer._get(_RING_WRITE_RESERVED) > position + buffer.size:
+                self._skip_to_end()
+                continue
+
+            # Wait for the rest of the record if only part of it can be seen
+            if zlib.crc32(data, count & 0xFFFFFFFF) != checksum:
+                return
+
+            buffer._set(self._position_index, position + _RING_RECORD.size + length)
+            buffer._set(self._count_index, count + 1)
+            if tag & self.reader:
+                yield data
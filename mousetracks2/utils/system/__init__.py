@@ -9,6 +9,7 @@ from ...runtime import IS_BUILT_EXE
 
 if TYPE_CHECKING:
     Window: Type[base.Window]
+    CursorPosition: Type[base.CursorPosition]
     MonitorEventListener: Type[base.EventListener]
     ControllerEventListener: Type[base.EventListener]
     ForegroundAppListener: Type[base.EventListener]
@@ -20,10 +21,10 @@ match sys.platform:
         from .windows import monitor_locations
         from .windows import get_autostart, set_autostart, remove_autostart
         from .windows import is_elevated, relaunch_as_elevated
-        from .windows import Window
+        from .windows import Window, CursorPosition
         from .windows import MonitorEventListener, ControllerEventListener
         from .windows import ForegroundAppListener, UserResizeAppListener
-        from .base import hide_child_process
+        from .base import hide_child_process, notify_on_parent_exit
         from .windows import prepare_application_icon
         from .windows import update_installer_version_number
         from .windows import force_physical_dpi_awareness
@@ -34,9 +35,11 @@ match sys.platform:
         from .macos import get_autostart, set_autostart, remove_autostart
         from .base import is_elevated, relaunch_as_elevated
         from .macos import Window
+        from .base import CursorPosition
         from .base import MonitorEventListener, ControllerEventListener
         from .base import ForegroundAppListener, UserResizeAppListener
         from .macos import hide_child_process, prepare_application_icon
+        from .base import notify_on_parent_exit
         from .base import update_installer_version_number
         from .base import force_physical_dpi_awareness
 
@@ -45,10 +48,11 @@ match sys.platform:
         from .base import monitor_locations
         from .linux import get_autostart, set_autostart, remove_autostart
         from .base import is_elevated, relaunch_as_elevated
-        from .linux import Window
+        from .linux import Window, CursorPosition
         from .base import MonitorEventListener, ControllerEventListener
         from .base import ForegroundAppListener, UserResizeAppListener
         from .base import hide_child_process, prepare_application_icon
+        from .linux import notify_on_parent_exit
         from .base import update_installer_version_number
         from .base import force_physical_dpi_awareness
 
@@ -57,10 +61,11 @@ __all__ = [
     'monitor_locations',
     'get_autostart', 'set_autostart', 'remove_autostart', 'remap_autostart',
     'is_elevated', 'relaunch_as_elevated',
-    'Window',
+    'Window', 'CursorPosition',
     'MonitorEventListener', 'ControllerEventListener',
     'ForegroundAppListener', 'UserResizeAppListener',
     'hide_child_process', 'prepare_application_icon',
+    'notify_on_parent_exit',
     'update_installer_version_number',
     'force_physical_dpi_awareness',
 ]
@@ -6,13 +6,16 @@ import queue
 import threading
 import time
 from pathlib import Path
-from typing import Any, Self
+from typing import TYPE_CHECKING, Any, Callable, Self
 
 from screeninfo import get_monitors as _get_monitors
 
 from ...types import Rect, RectList
 from ...version import VERSION
 
+if TYPE_CHECKING:
+    import pynput
+
 
 SUPPORTS_TRAY = True
 
@@ -88,6 +91,30 @@ class Window:
         return (0, 0)
 
 
+class CursorPosition:
+    """Get the cursor position.
+
+    The backend is kept open between calls, as creating it may be slow.
+    Each process must have its own instance.
+    """
+
+    def __init__(self) -> None:
+        self._controller: 'pynput.mouse.Controller | None' = None
+
+    def get(self) -> tuple[int, int] | None:
+        """Get the current cursor position.
+        Returns `None` if the cursor can't be found.
+        """
+        if self._controller is None:
+            # Import here as pynput requires a display when imported
+            import pynput  # pylint: disable=import-outside-toplevel
+            self._controller = pynput.mouse.Controller()
+        pos = self._controller.position
+        if pos is None:
+            return None
+        return int(pos[0]), int(pos[1])
+
+
 class EventListener(threading.Thread):
     """Base class to listen for events.
 
@@ -147,6 +174,13 @@ class UserResizeAppListener(EventListener):
         return False
 
 
+def notify_on_parent_exit(callback: Callable[[], None]) -> bool:
+    """Run a callback as soon as the parent process exits.
+    Returns `False` if this is not supported.
+    """
+    return False
+
+
 def hide_child_process() -> None:
     """This is here to allow macOS to hide the child processes."""
 
@@ -40,13 +40,17 @@ Ubuntu:
 
 from __future__ import annotations
 
+import ctypes
 import os
 import shlex
+import signal
+import time
 from contextlib import suppress
 from pathlib import Path
-from typing import Any, Self
+from typing import Any, Callable, Self
 
 import Xlib.display
+import Xlib.error
 import Xlib.xobject
 
 from . import base
@@ -60,6 +64,16 @@ AUTOSTART_DIR = Path.home() / '.config' / 'autostart'
 
 AUTOSTART_FILE_PATH = AUTOSTART_DIR / f'{AUTOSTART_NAME.lower()}.desktop'
 
+PR_SET_PDEATHSIG = 1
+
+DISPLAY_RETRY_DELAY = 0.1
+"""Number of seconds to wait before reconnecting to a lost display.
+This doubles after each failed attempt.
+"""
+
+MAX_DISPLAY_RETRY_DELAY = 5.0
+"""Maximum number of seconds to wait between attempts to reconnect."""
+
 DESKTOP_FILE_CONTENT = f"""[Desktop Entry]
 Type=Application
 Name={AUTOSTART_NAME}
@@ -94,6 +108,38 @@ def get_focused_window(display: Xlib.display.Display) -> Xlib.xobject.drawable.W
     return _get_top_level_window(root, focus)
 
 
+class CursorPosition(base.CursorPosition):
+    """Get the cursor position with `XQueryPointer`.
+
+    If the display connection is lost, it will be reopened. Connecting
+    is slow, so while the display is unavailable, the attempts are
+    spaced out with an increasing delay, and `None` is returned in the
+    meantime.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._root: Xlib.xobject.drawable.Window | None = None
+        self._retry_time = 0.0
+        self._retry_delay = DISPLAY_RETRY_DELAY
+
+    def get(self) -> tuple[int, int] | None:
+        try:
+            if self._root is None:
+                now = time.monotonic()
+                if now < self._retry_time:
+                    return None
+                self._retry_time = now + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, MAX_DISPLAY_RETRY_DELAY)
+                self._root = Xlib.display.Display().screen().root
+                self._retry_delay = DISPLAY_RETRY_DELAY
+            pointer = self._root.query_pointer()
+        except (Xlib.error.DisplayError, Xlib.error.ConnectionClosedError, OSError):
+            self._root = None
+            return None
+        return pointer.root_x, pointer.root_y
+
+
 class Window(base.Window):
     def __init__(self, display: Xlib.display.Display, window: Xlib.xobject.drawable.Window, **kwargs: Any) -> None:
         self._display = display
@@ -198,3 +244,21 @@ def remove_autostart() -> None:
     """Stop an executable running on startup."""
     with suppress(FileNotFoundError):
         AUTOSTART_FILE_PATH.unlink()
+
+
+def notify_on_parent_exit(callback: Callable[[], None]) -> bool:
+    """Run a callback as soon as the parent process exits.
+
+    The kernel is asked to send `SIGUSR1` when the parent exits, so
+    this must be called from the main thread. The callback will run
+    in the main thread the next time it executes Python code.
+    """
+    prctl = getattr(ctypes.CDLL(None, use_errno=True), 'prctl', None)
+    if prctl is None:
+        return False
+
+    signal.signal(signal.SIGUSR1, lambda signum, frame: callback())
+    if prctl(PR_SET_PDEATHSIG, signal.SIGUSR1) != 0:
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        return False
+    return True
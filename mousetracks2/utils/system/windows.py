@@ -444,6 +444,21 @@ def relaunch_as_elevated() -> None:
     sys.exit()
 
 
+class CursorPosition(base.CursorPosition):
+    """Get the cursor position with `GetCursorPos`."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._point = ctypes.wintypes.POINT()
+        self._point_ref = ctypes.byref(self._point)
+
+    def get(self) -> tuple[int, int] | None:
+        # This fails if the desktop is not available, such as when locked
+        if not user32.GetCursorPos(self._point_ref):
+            return None
+        return self._point.x, self._point.y
+
+
 class Window(base.Window):
     def __init__(self, hwnd: int) -> None:
         self._hwnd = hwnd